@@ -0,0 +1,14 @@
+"""
+Benchmarks for the flattened file generator.
+
+- synthetic_project: generates synthetic source trees of any size
+- run_benchmarks: times (and measures peak memory of) each phase of the generator
+- scaling: fails when a phase grows super-linearly with the number of modules
+- execution: cold start and execution of a generated script vs its sources, in fresh interpreters
+
+Run from the src folder, e.g.:
+    python -m benchmarks.run_benchmarks --modules 1000
+    python -m benchmarks.scaling
+    python -m benchmarks.execution --flattened ../sample_project/workato_prod_main.py \
+        --entryFile ../sample_project/main.py --inputs inputs.json
+"""
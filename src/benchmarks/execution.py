@@ -0,0 +1,203 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# Runs inside a fresh interpreter: reads its job as JSON on stdin, writes one JSON report line
+# (prefixed by REPORT_MARKER) on stdout. Everything main() prints is captured as its output.
+DRIVER = r'''
+import contextlib, inspect, io, json, sys, time
+job = json.loads(sys.stdin.read())
+sys.path[:0] = job["sys_path"]
+real_stdout = sys.stdout
+
+
+def call(main, takes_input, payload):
+    captured = io.StringIO()
+    with contextlib.redirect_stdout(captured):
+        result = main(payload) if takes_input else main()
+    return {"result": json.loads(json.dumps(result, default=repr, sort_keys=True)), "stdout": captured.getvalue()}
+
+
+with open(job["path"], encoding="utf-8") as f:
+    source = f.read()
+start = time.perf_counter()
+code = compile(source, job["path"], "exec")
+compile_seconds = time.perf_counter() - start
+
+namespace = {"__name__": "__workato__", "__file__": job["path"]}
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    exec(code, namespace)
+import_seconds = time.perf_counter() - start
+
+main = namespace["main"]
+takes_input = bool(inspect.signature(main).parameters)
+inputs = job["inputs"]
+
+start = time.perf_counter()
+outputs = [call(main, takes_input, inputs[0])]
+first_call_seconds = time.perf_counter() - start
+outputs += [call(main, takes_input, payload) for payload in inputs[1:]]
+
+with contextlib.redirect_stdout(io.StringIO()):
+    start = time.perf_counter()
+    for index in range(job["calls"]):
+        main(inputs[index % len(inputs)]) if takes_input else main()
+    steady_seconds = time.perf_counter() - start
+
+real_stdout.write(job["marker"] + json.dumps({
+    "compile_seconds": compile_seconds,
+    "import_seconds": import_seconds,
+    "first_call_seconds": first_call_seconds,
+    "calls_per_second": job["calls"] / steady_seconds if steady_seconds else None,
+    "outputs": outputs,
+}) + "\n")
+'''
+
+REPORT_MARKER = "@@execution-report@@"
+
+# Measures compared against a baseline: (name, higher is better)
+MEASURES = [
+    ("compile_seconds", False),
+    ("import_seconds", False),
+    ("first_call_seconds", False),
+    ("calls_per_second", True),
+]
+
+
+def run_in_fresh_interpreter(script_path: Path, inputs: list, calls: int = 1000, sys_path: list = ()) -> dict:
+    """
+    Run the main() of a script in a new Python interpreter, the way the Workato action runs it.
+
+    The script is compiled then executed as a module, then main is called once per recorded input
+    (with the input when main takes a parameter), then `calls` more times to measure throughput.
+
+    Args:
+        script_path (Path): The script defining main().
+        inputs (list): Recorded inputs, at least one (ignored when main takes no parameter).
+        calls (int): Number of calls of the steady-state throughput measure.
+        sys_path (list): Folders prepended to sys.path (the project root for the unflattened sources).
+
+    Returns:
+        dict: {"compile_seconds", "import_seconds", "first_call_seconds", "calls_per_second", "outputs"},
+            outputs holding the {"result", "stdout"} of main for each input.
+
+    Example:
+        report = run_in_fresh_interpreter(Path("workato_prod_main.py"), [{"name": "Julien"}])
+    """
+    job = {
+        "path": str(Path(script_path).resolve()),
+        "sys_path": [str(Path(folder).resolve()) for folder in sys_path],
+        "inputs": inputs or [None],
+        "calls": calls,
+        "marker": REPORT_MARKER,
+    }
+    completed = subprocess.run([sys.executable, "-B", "-c", DRIVER], input=json.dumps(job),
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"🚨 Running {script_path} failed:\n{completed.stderr}")
+    report_line = next(line for line in completed.stdout.splitlines() if line.startswith(REPORT_MARKER))
+    return json.loads(report_line[len(REPORT_MARKER):])
+
+
+def measure(script_path: Path, inputs: list, repeat: int = 5, calls: int = 1000, sys_path: list = ()) -> dict:
+    """
+    Run a script in `repeat` fresh interpreters and keep the median of each measure.
+
+    Returns:
+        dict: Same keys as run_in_fresh_interpreter, outputs being the ones of the first run.
+    """
+    runs = [run_in_fresh_interpreter(script_path, inputs, calls, sys_path) for _ in range(repeat)]
+    report = {name: statistics.median(run[name] for run in runs if run[name] is not None) for name, _ in MEASURES}
+    report["outputs"] = runs[0]["outputs"]
+    return report
+
+
+def compare_outputs(flattened: dict, original: dict) -> list[str]:
+    """Return a message for each input whose output differs between the flattened script and the sources."""
+    mismatches = []
+    for index, (got, expected) in enumerate(zip(flattened["outputs"], original["outputs"])):
+        if got != expected:
+            mismatches.append(f"input #{index}: flattened returned {got!r}, sources returned {expected!r}")
+    return mismatches
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float = 0.2) -> list[str]:
+    """
+    Compare the measures of a report with a saved baseline report.
+
+    Args:
+        report (dict): The current measures of the flattened script.
+        baseline (dict): Measures saved by a previous run (--saveReport).
+        tolerance (float): Allowed relative slowdown before reporting a regression.
+
+    Returns:
+        list[str]: Regression messages (empty when nothing got slower than the tolerance).
+    """
+    regressions = []
+    for name, higher_is_better in MEASURES:
+        current, previous = report.get(name), baseline.get(name)
+        if not current or not previous:
+            continue
+        slowdown = previous / current - 1 if higher_is_better else current / previous - 1
+        if slowdown > tolerance:
+            regressions.append(f"{name} regressed by {slowdown:.0%} ({previous:.6g} -> {current:.6g})")
+    return regressions
+
+
+def format_report(label: str, report: dict) -> str:
+    """Format the measures of a report as a one-line summary."""
+    throughput = f"{report['calls_per_second']:.0f}/s" if report["calls_per_second"] else "n/a"
+    return (f"{label:>10}  compile={report['compile_seconds'] * 1000:.2f}ms  "
+            f"import={report['import_seconds'] * 1000:.2f}ms  "
+            f"first_call={report['first_call_seconds'] * 1000:.2f}ms  throughput={throughput}")
+
+
+def load_inputs(inputs_path: Path) -> list:
+    """Load recorded inputs from a JSON list or a JSON-lines file."""
+    text = Path(inputs_path).read_text(encoding="utf-8")
+    try:
+        inputs = json.loads(text)
+        return inputs if isinstance(inputs, list) else [inputs]
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Measure the cold start and execution of a flattened script against its sources")
+    parser.add_argument('--flattened', type=Path, required=True, help='The generated workato_prod_main.py')
+    parser.add_argument('--entryFile', type=Path, required=True, help='The original entry point (main.py)')
+    parser.add_argument('--projectRoot', type=Path,
+                        help='Folder added to sys.path for the sources (default: the entry file folder)')
+    parser.add_argument('--inputs', type=Path, help='Recorded inputs, as a JSON list or JSON lines')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of fresh interpreters per script')
+    parser.add_argument('--calls', type=int, default=1000, help='Number of calls of the throughput measure')
+    parser.add_argument('--baseline', type=Path, help='Report of a previous run to check for regressions')
+    parser.add_argument('--saveReport', type=Path, help='Where to save the measures of the flattened script')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown vs the baseline')
+    args = parser.parse_args()
+
+    inputs = load_inputs(args.inputs) if args.inputs else [None]
+    project_root = args.projectRoot or args.entryFile.parent
+    original = measure(args.entryFile, inputs, args.repeat, args.calls,
+                       sys_path=[project_root, args.entryFile.parent])
+    flattened = measure(args.flattened, inputs, args.repeat, args.calls)
+    print(format_report("sources", original))
+    print(format_report("flattened", flattened))
+
+    failures = [f"output mismatch on {mismatch}" for mismatch in compare_outputs(flattened, original)]
+    if args.baseline:
+        failures += find_regressions(flattened, json.loads(args.baseline.read_text()), args.tolerance)
+    if args.saveReport:
+        saved = {name: flattened[name] for name, _ in MEASURES}
+        args.saveReport.write_text(json.dumps(saved, indent=2) + "\n")
+
+    for failure in failures:
+        print(f"🚨 {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"[✅] Outputs match on {len(inputs)} input(s)")
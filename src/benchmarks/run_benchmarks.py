@@ -0,0 +1,169 @@
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import flatten_file
+from benchmarks.synthetic_project import generate_project
+
+PHASES = ["parse", "resolve", "collect", "write", "import_cleanup"]
+
+
+def use_project(root: Path):
+    """
+    Point the generator globals at another project.
+
+    Args:
+        root (Path): Root of the project sources.
+    """
+    root = Path(root).resolve()
+    flatten_file.PROJECT_ROOT = root
+    flatten_file.SRC_DIR = root
+    flatten_file.MAIN_ENTRY_POINTS = [root / "main.py"]
+    flatten_file.module_index = None
+    flatten_file.parse_cache = None
+    flatten_file.shared_summaries = {}
+
+
+def run_phases(root: Path, output_path: Path, autoflake: bool = False) -> dict:
+    """
+    Run every phase of the generator once on a project and return the time spent in each.
+
+    Phases:
+        - parse: analyze every file of the project (no cache)
+        - resolve: build the module index and resolve every import
+        - collect: collect_dependencies from main.py, cold
+        - write: write_flattened_script without import cleanup
+        - import_cleanup: the builtin unused variables/imports pass (autoflake when asked to)
+
+    Args:
+        root (Path): Root of the project (with a main.py entry point).
+        output_path (Path): Where to write the flattened script.
+        autoflake (bool): Time the autoflake CLI instead of the builtin cleanup.
+
+    Returns:
+        dict: Mapping from phase name to seconds.
+    """
+    use_project(root)
+    files = sorted(p for p in Path(root).rglob("*.py"))
+    timings = {}
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        summaries = {path: flatten_file.analyze_file(path) for path in files}
+        timings["parse"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        flatten_file.module_index = None
+        for path, summary in summaries.items():
+            flatten_file.resolve_import_paths(summary["imports"], path)
+        timings["resolve"] = time.perf_counter() - start
+
+        flatten_file.module_index = None
+        start = time.perf_counter()
+        imports, defs, global_vars = flatten_file.collect_dependencies(root / "main.py")
+        timings["collect"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        flatten_file.write_flattened_script(imports, defs, output_path, global_vars=global_vars,
+                                            import_cleanup="none")
+        timings["write"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if autoflake:
+            flatten_file.remove_unused_imports(output_path)
+        else:
+            nodes = [flatten_file.prune_dead_assignments(node) for node, _ in defs.values()]
+            used_names = set()
+            for node in nodes + global_vars:
+                used_names.update(flatten_file.find_used_names(node))
+            flatten_file.prune_unused_imports(flatten_file.collect_non_source_imports(imports), used_names)
+        timings["import_cleanup"] = time.perf_counter() - start
+
+    return timings
+
+
+def measure_peak_memory(root: Path, output_path: Path) -> int:
+    """
+    Return the peak traced memory (bytes) of a full run of the phases.
+
+    Measured separately from the timings since tracemalloc slows everything down.
+    """
+    tracemalloc.start()
+    try:
+        run_phases(root, output_path)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(modules: int, repeat: int = 3, memory: bool = True, autoflake: bool = False, **project_options) -> dict:
+    """
+    Generate a synthetic project and benchmark the generator on it.
+
+    Args:
+        modules (int): Number of modules of the synthetic project.
+        repeat (int): Number of runs, the fastest one is kept for each phase.
+        memory (bool): Also measure the peak memory.
+        autoflake (bool): Time the autoflake CLI as import cleanup.
+        **project_options: Forwarded to generate_project (defs_per_module, fan_out, depth, ...).
+
+    Returns:
+        dict: {"modules": int, "seconds": {phase: float}, "total_seconds": float, "peak_bytes": int or None}
+
+    Example:
+        result = benchmark(1000, fan_out=4)
+    """
+    work_dir = Path(tempfile.mkdtemp(prefix="flatten_bench_"))
+    try:
+        root = work_dir / "project"
+        output_path = work_dir / "workato_prod_main.py"
+        generate_project(root, modules=modules, **project_options)
+
+        best = {}
+        for _ in range(repeat):
+            for phase, seconds in run_phases(root, output_path, autoflake).items():
+                best[phase] = min(seconds, best.get(phase, seconds))
+
+        return {
+            "modules": modules,
+            "seconds": best,
+            "total_seconds": sum(best.values()),
+            "peak_bytes": measure_peak_memory(root, output_path) if memory else None,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def format_result(result: dict) -> str:
+    """Format a benchmark result as a one-line summary."""
+    phases = "  ".join(f"{phase}={result['seconds'][phase] * 1000:.1f}ms" for phase in PHASES)
+    memory = f"  peak={result['peak_bytes'] / 1024 / 1024:.1f}MiB" if result["peak_bytes"] is not None else ""
+    return f"{result['modules']:>6} modules  total={result['total_seconds'] * 1000:.1f}ms  {phases}{memory}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time each phase of the flattener on synthetic projects")
+    parser.add_argument('--modules', type=int, nargs='*', default=[100, 1000])
+    parser.add_argument('--defsPerModule', type=int, default=3)
+    parser.add_argument('--fanOut', type=int, default=3)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--packageDepth', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--noMemory', action='store_true', help='Skip the peak memory measurement')
+    parser.add_argument('--autoflake', action='store_true', help='Time the autoflake CLI as import cleanup')
+    args = parser.parse_args()
+
+    if args.autoflake and not shutil.which("autoflake"):
+        raise SystemExit("🚨 autoflake is not installed")
+
+    for module_count in args.modules:
+        print(format_result(benchmark(
+            module_count, repeat=args.repeat, memory=not args.noMemory, autoflake=args.autoflake,
+            defs_per_module=args.defsPerModule, fan_out=args.fanOut, depth=args.depth,
+            package_depth=args.packageDepth,
+        )))
@@ -0,0 +1,64 @@
+import argparse
+import sys
+
+from benchmarks.run_benchmarks import PHASES, benchmark, format_result
+
+# Times below this floor are treated as equal to it, so that timer noise on tiny projects can't fail the check
+MIN_SECONDS = 0.01
+MIN_BYTES = 1024 * 1024
+
+
+def check_scaling(results: list[dict], tolerance: float = 2.0) -> list[str]:
+    """
+    Check that runtime and peak memory grow at most linearly with the number of modules.
+
+    Between two consecutive sizes n1 < n2, a measure m may grow by at most
+    tolerance * (n2 / n1); anything above is reported as super-linear.
+
+    Args:
+        results (list[dict]): Benchmark results (see run_benchmarks.benchmark), by increasing size.
+        tolerance (float): Allowed factor on top of linear growth.
+
+    Returns:
+        list[str]: Failure messages (empty when everything scales linearly).
+
+    Example:
+        failures = check_scaling([benchmark(100), benchmark(1000)])
+    """
+    failures = []
+    for small, large in zip(results, results[1:]):
+        size_ratio = large["modules"] / small["modules"]
+        measures = [(phase, small["seconds"][phase], large["seconds"][phase], MIN_SECONDS) for phase in PHASES]
+        measures.append(("total", small["total_seconds"], large["total_seconds"], MIN_SECONDS))
+        if small["peak_bytes"] is not None and large["peak_bytes"] is not None:
+            measures.append(("peak memory", small["peak_bytes"], large["peak_bytes"], MIN_BYTES))
+
+        for name, small_value, large_value, floor in measures:
+            growth = max(large_value, floor) / max(small_value, floor)
+            if growth > tolerance * size_ratio:
+                failures.append(
+                    f"{name} grew x{growth:.1f} from {small['modules']} to {large['modules']} modules "
+                    f"(limit x{tolerance * size_ratio:.1f})"
+                )
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fail when the flattener scales super-linearly")
+    parser.add_argument('--modules', type=int, nargs='*', default=[100, 1000, 10000])
+    parser.add_argument('--tolerance', type=float, default=2.0,
+                        help='Allowed growth factor on top of linear growth between two sizes')
+    parser.add_argument('--repeat', type=int, default=2)
+    args = parser.parse_args()
+
+    scaling_results = []
+    for module_count in sorted(args.modules):
+        scaling_results.append(benchmark(module_count, repeat=args.repeat))
+        print(format_result(scaling_results[-1]))
+
+    scaling_failures = check_scaling(scaling_results, args.tolerance)
+    for failure in scaling_failures:
+        print(f"🚨 {failure}")
+    if scaling_failures:
+        sys.exit(1)
+    print("[✅] Every phase scales linearly")
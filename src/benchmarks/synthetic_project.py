@@ -0,0 +1,125 @@
+import argparse
+import random
+import shutil
+from pathlib import Path
+
+STDLIB_IMPORTS = ["json", "os", "re", "collections", "datetime"]
+
+
+def module_name(index: int, package_depth: int) -> str:
+    """
+    Return the dotted name of the synthetic module number `index`.
+
+    Modules are spread over nested packages: with package_depth=2, module 7 lives in pkg_1/sub_1/mod_7
+    (directory names are taken modulo a small number so that packages hold several modules).
+
+    Args:
+        index (int): The module number.
+        package_depth (int): Number of nested package levels.
+
+    Returns:
+        str: The dotted module name.
+
+    Example:
+        module_name(7, 2)  # 'pkg_1.sub_1.mod_7'
+    """
+    parts = []
+    for level in range(package_depth):
+        parts.append(f"{'pkg' if level == 0 else 'sub'}_{(index // (4 ** level)) % (3 + level)}")
+    parts.append(f"mod_{index}")
+    return ".".join(parts)
+
+
+def generate_project(root: Path, modules: int = 100, defs_per_module: int = 3, fan_out: int = 3, depth: int = 5,
+                     package_depth: int = 1, seed: int = 0) -> Path:
+    """
+    Generate a synthetic project and return the path of its entry point.
+
+    Modules are arranged in `depth` layers; each module imports `fan_out` functions from modules
+    of the next layer (every module of a layer is imported by the previous one), and its first
+    function calls them, so the whole tree is reachable from main().
+    Every module also imports a few stdlib modules and holds a global assignment and a class.
+
+    Args:
+        root (Path): Directory to generate into (emptied first).
+        modules (int): Number of modules.
+        defs_per_module (int): Number of functions per module (plus one class).
+        fan_out (int): Number of project imports per module.
+        depth (int): Depth of the import graph (number of layers).
+        package_depth (int): Number of nested package levels.
+        seed (int): Random seed, the same arguments always generate the same project.
+
+    Returns:
+        Path: The entry point (root / "main.py").
+
+    Example:
+        entry = generate_project(Path("/tmp/synthetic"), modules=1000, fan_out=4)
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    if root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+
+    depth = max(1, min(depth, modules))
+    layers = [list(range(modules))[layer::depth] for layer in range(depth)]
+
+    for layer_index, layer in enumerate(layers):
+        next_layer = layers[layer_index + 1] if layer_index + 1 < depth else []
+        for position, index in enumerate(layer):
+            name = module_name(index, package_depth)
+            path = root.joinpath(*name.split(".")).with_suffix(".py")
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            targets = []
+            if next_layer:
+                targets = list(dict.fromkeys(next_layer[(position * fan_out + k) % len(next_layer)]
+                                             for k in range(fan_out)))
+            lines = [f"import {module}" for module in rng.sample(STDLIB_IMPORTS, 2)]
+            lines += [f"from {module_name(target, package_depth)} import func_{target}_0" for target in targets]
+            lines += ["", f"CONSTANT_{index} = {index}", ""]
+
+            calls = " + ".join(f"func_{target}_0()" for target in targets) or "0"
+            for def_index in range(defs_per_module):
+                body = calls if def_index == 0 else f"CONSTANT_{index} * {def_index}"
+                lines += [
+                    "",
+                    f"def func_{index}_{def_index}():",
+                    f'    """Synthetic function {def_index} of module {index}."""',
+                    f"    unused = {def_index}",
+                    f"    return {body}",
+                    "",
+                ]
+            lines += [
+                "",
+                f"class Model{index}:",
+                f'    """Synthetic class of module {index}."""',
+                "",
+                "    def value(self):",
+                f"        return CONSTANT_{index}",
+                "",
+            ]
+            path.write_text("\n".join(lines))
+
+    entry_lines = [f"from {module_name(index, package_depth)} import func_{index}_0" for index in layers[0]]
+    calls = ", ".join(f"func_{index}_0()" for index in layers[0])
+    entry_lines += ["", "", "def main():", f"    return sum([{calls}])", ""]
+    entry = root / "main.py"
+    entry.write_text("\n".join(entry_lines))
+    return entry
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic project for the flattener benchmarks")
+    parser.add_argument('root', help='Directory to generate the project into')
+    parser.add_argument('--modules', type=int, default=100)
+    parser.add_argument('--defsPerModule', type=int, default=3)
+    parser.add_argument('--fanOut', type=int, default=3)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--packageDepth', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    entry_path = generate_project(Path(args.root), args.modules, args.defsPerModule, args.fanOut, args.depth,
+                                  args.packageDepth, args.seed)
+    print(f"[✅] Synthetic project written, entry point: {entry_path}")
@@ -1,23 +1,39 @@
 import argparse
 import ast
+import base64
+import builtins
+import contextlib
+import copy
+import io
+import hashlib
+import json
+import linecache
+import marshal
+import os
+import pickle
+import re
+import socketserver
 import sys
-import importlib.util
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 import subprocess
-
-PROJECT_ROOT = Path(__file__).resolve().parent
-PROJECT_ROOT = Path(str(PROJECT_ROOT).replace('src', 'sample_project'))  # remove this if you work within src folder
-# PROJECT_ROOT = Path('/Users/ovila.lugard/PycharmProjects/workato-flattened-file-generator/sample_project')
-print(f"Project source: {PROJECT_ROOT}")
+import threading
+import time
+import tokenize
+import tracemalloc
+import weakref
+import zlib
+
+# Default project: the sample project next to the src folder (use --projectRoot or Flattener for another one)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent / "sample_project"
 SRC_DIR = PROJECT_ROOT
 
 ENTRYPOINT_1 = SRC_DIR / "main.py"
 MAIN_ENTRY_POINTS = [ENTRYPOINT_1]
 
-sys.path.insert(0, str(SRC_DIR))
-
 BUILTIN_MODULES = set(sys.builtin_module_names)
+STDLIB_MODULES = set(getattr(sys, "stdlib_module_names", ()))
 
 # use this if you need to set up global variable manually of if you want to call any specific statements
 HARDCODED_STATEMENTS = """
@@ -37,10 +53,100 @@ THEN YOU ARE GOOD TO GO, GOOD LUCK BUD
 \"\"\"
 """
 
+# On-disk cache of per-file analysis results (imports, defs, globals, used names), keyed by content hash,
+# in this directory of the project sources by default
+CACHE_DIR_NAME = ".flatten_cache"
+CACHE_VERSION = 2
+CACHE_MAX_ENTRIES = 4096
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
 ignore_imports = []
 
 main_function_ast = None
 
+# ast.unparse results of definitions, kept as long as the node lives (warm across daemon requests)
+unparse_cache = weakref.WeakKeyDictionary()
+
+# Per-node results of the output pass, kept as long as the node lives, so that a warm rebuild only
+# redoes the definitions of the changed modules: pruned copies (None when nothing was pruned, see
+# prune_dead_assignments), used names (see cached_used_names) and load-time names (see Symbol)
+pruned_cache = weakref.WeakKeyDictionary()
+used_names_cache = weakref.WeakKeyDictionary()
+load_names_cache = weakref.WeakKeyDictionary()
+
+# File content digests, reused while the size and modification time of the file are unchanged
+digest_cache = {}
+
+# Manifest paths of files relative to SRC_DIR, keyed by (SRC_DIR, path), see relative_source_path
+relative_paths = {}
+
+# Files of the dependency closure of the last collected entry point (see collect_dependencies)
+dependency_files = []
+
+# Where the generator writes its messages (see log), None for the current sys.stdout
+log_stream = None
+
+# Build manifests written next to each output, to skip regenerations when nothing changed
+BUILD_MANIFEST_VERSION = 1
+
+parse_cache = None
+
+module_index = None
+
+# Active Profiler when --profile is given
+profiler = None
+
+# How unused imports/variables are removed from the output: "builtin", "autoflake" or "none"
+import_cleanup_mode = "builtin"
+
+# Only emit the definitions reachable from the 'main' function
+tree_shake_enabled = True
+
+# Number of processes parsing the dependency graph (1 = serial)
+parse_workers = 1
+
+# How definitions are written: "source" (original source spans) or "unparse" (ast.unparse)
+emit_mode = "source"
+
+# Defer third-party imports of the output until they are used, except for these modules
+lazy_imports_enabled = False
+eager_modules = []
+
+# Report the size, origin and inclusion reason of every emitted part (see analyze_bundle)
+analyze_enabled = False
+analyze_sort = "size"
+
+# Wrap every emitted function with a timer and print a timing table after main (see instrument_definition)
+instrument_enabled = False
+
+# Packed output: "none", "auto", "zlib" or "marshal", and the size above which "auto" packs (see pack_output)
+pack_mode = "none"
+pack_threshold = 256 * 1024
+
+# Emit rarely used functions as source strings compiled on first call (see is_deferrable), and the
+# size in bytes above which functions are deferred without a marker (0 = marked functions only)
+defer_enabled = False
+defer_threshold = 0
+
+# Hoist constant regex compilations and read-only container literals to module level (see ConstantHoister)
+hoist_enabled = False
+
+# Globals fixed at generation time (--define NAME=value): name -> value source (see fold_definitions)
+defines = {}
+
+# Bundle report of the last analyzed script
+bundle_report = None
+
+# Collect in bounded memory, re-reading emitted definitions from disk (see stream_flatten)
+streaming_enabled = False
+
+# Minify the output (and optionally shorten local names)
+minify_enabled = False
+minify_names_enabled = False
+
+# File summaries analyzed once up front and shared by every entry point of a batch run
+shared_summaries = {}
+
 
 def find_main_function(tree):
     """
@@ -78,15 +184,7 @@ def is_builtin_import(module_name: str) -> bool:
         is_builtin_import("os")  # True
         is_builtin_import("my_custom_module")  # False
     """
-    if module_name in BUILTIN_MODULES:
-        return True
-    try:
-        spec = importlib.util.find_spec(module_name)
-        if spec and spec.origin == 'built-in':
-            return True
-    except ModuleNotFoundError:
-        return False
-    return False
+    return module_name in BUILTIN_MODULES
 
 
 def parse_file(filepath: Path) -> ast.Module:
@@ -174,6 +272,9 @@ def find_used_names(tree: ast.AST):
                 node = node.value
             if isinstance(node, ast.Name):
                 self.names.add(node.id)
+            else:
+                # The chain starts with an expression (e.g. 'Model().run'): collect its names too
+                self.visit(node)
 
         def visit_FunctionDef(self, node):
             # Add decorators
@@ -206,6 +307,14 @@ def find_used_names(tree: ast.AST):
     return visitor.names
 
 
+def cached_used_names(node) -> frozenset:
+    """Return find_used_names(node), computed once per node (see used_names_cache)."""
+    names = used_names_cache.get(node)
+    if names is None:
+        names = used_names_cache[node] = frozenset(find_used_names(node))
+    return names
+
+
 def remove_docstrings(node):
     """
     Recursively remove docstrings from the given AST node (function, class, or module).
@@ -222,11 +331,610 @@ def remove_docstrings(node):
         if (node.body and isinstance(node.body[0], ast.Expr) and isinstance(node.body[0].value,
                                                                             ast.Constant) and isinstance(
                 node.body[0].value.value, str)):
-            node.body = node.body[1:]
+            node.body = node.body[1:] or [ast.Pass()]
     for child in ast.iter_child_nodes(node):
         remove_docstrings(child)
 
 
+def log(*values):
+    """Print a progress message or warning of the generator to log_stream (stdout by default)."""
+    print(*values, file=log_stream or sys.stdout)
+
+
+class FlattenError(Exception):
+    """A source file of the project could not be analyzed (the command line reports it and exits)."""
+
+
+class ParseCache:
+    """
+    Content-hash keyed on-disk cache of per-file analysis results.
+
+    Each entry holds what process_file needs from a file (imports, docstring-stripped
+    definitions, global assignments, used names and the main function), so unchanged
+    files are never re-parsed. A small stat index (mtime, size -> digest) avoids even
+    re-reading files that did not change. Entries are invalidated when CACHE_VERSION or
+    the interpreter version changes, and the oldest entries are evicted once the cache
+    grows past max_entries or max_bytes.
+
+    Args:
+        cache_dir (Path): Directory holding the cache (created on demand).
+        max_entries (int): Maximum number of entries kept after eviction.
+        max_bytes (int): Maximum total size in bytes kept after eviction.
+
+    Example:
+        cache = ParseCache(SRC_DIR / CACHE_DIR_NAME)
+        summary = analyze_file(Path("main.py"), cache)
+        cache.flush()
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.entries_dir = self.cache_dir / "entries"
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = f"{CACHE_VERSION}-py{sys.version_info[0]}.{sys.version_info[1]}"
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._stat_index = {}
+        self._load()
+
+    def _load(self):
+        meta_path = self.cache_dir / "meta.json"
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            meta = {}
+        if meta.get("version") != self.version:
+            # Stale layout or interpreter: drop every entry and start over
+            self.clear()
+            return
+        self._stat_index = meta.get("files", {})
+
+    def clear(self):
+        """Remove every cached entry and reset the stat index."""
+        if self.entries_dir.is_dir():
+            for entry in self.entries_dir.iterdir():
+                entry.unlink(missing_ok=True)
+        self._stat_index = {}
+        self._dirty = True
+
+    def digest(self, file_path: Path, source: bytes = None) -> str:
+        """
+        Return the content hash of a file, using the stat index when the file is unchanged.
+
+        Args:
+            file_path (Path): The file to hash.
+            source (bytes, optional): File content if already read.
+
+        Returns:
+            str: Hex sha256 digest of the file content.
+        """
+        stat = file_path.stat()
+        key = str(file_path)
+        known = self._stat_index.get(key)
+        if source is None and known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        if source is None:
+            source = file_path.read_bytes()
+        digest = hashlib.sha256(source).hexdigest()
+        self.remember(file_path, digest)
+        return digest
+
+    def remember(self, file_path: Path, digest: str):
+        """Record the digest of a file hashed elsewhere (e.g. in a worker process) in the stat index."""
+        stat = file_path.stat()
+        self._stat_index[str(file_path)] = [stat.st_mtime_ns, stat.st_size, digest]
+        self._dirty = True
+
+    def get(self, digest: str):
+        """
+        Load a cached summary by digest.
+
+        Returns:
+            dict or None: The cached summary, or None on a miss.
+        """
+        entry_path = self.entries_dir / f"{digest}.pickle"
+        try:
+            with open(entry_path, 'rb') as f:
+                summary = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            self.misses += 1
+            return None
+        # Bump mtime so eviction drops the least recently used entries first
+        os.utime(entry_path)
+        self.hits += 1
+        return summary
+
+    def put(self, digest: str, summary: dict):
+        """Store a summary under its content digest (atomic write)."""
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        entry_path = self.entries_dir / f"{digest}.pickle"
+        tmp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(summary, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+        self._dirty = True
+
+    def evict(self):
+        """Drop the least recently used entries until the cache fits max_entries and max_bytes."""
+        if not self.entries_dir.is_dir():
+            return
+        entries = []
+        for entry in self.entries_dir.iterdir():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+        entries.sort(reverse=True)  # Most recently used first
+        total_bytes = 0
+        for index, (_, size, entry) in enumerate(entries):
+            total_bytes += size
+            if index >= self.max_entries or total_bytes > self.max_bytes:
+                entry.unlink(missing_ok=True)
+
+    def flush(self):
+        """Persist the stat index and apply size-bounded eviction."""
+        if not self._dirty:
+            return
+        self.evict()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        meta_path = self.cache_dir / "meta.json"
+        tmp_path = meta_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({"version": self.version, "files": self._stat_index}))
+        os.replace(tmp_path, meta_path)
+        self._dirty = False
+
+
+class Profiler:
+    """
+    Records wall time and peak memory of each generator phase, plus a few counters.
+
+    Phases are recorded with `with profile_phase(name):` and may be nested (process_file runs
+    inside collect_dependencies); the peak memory of a phase includes its nested phases.
+    Memory is traced with tracemalloc while the profiler is active.
+
+    Example:
+        profiler = Profiler()
+        with profiler.phase("collect_dependencies"):
+            ...
+        print(profiler.summary())
+        profiler.stop()
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.files = {}
+        self.counters = defaultdict(int)
+        self.parse_cache = None  # The cache of the running Flattener, else the module one
+        self._peaks = []
+        self._owns_tracing = not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, file_path: Path = None):
+        """Time a phase (accumulated per name, and per file when file_path is given)."""
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+
+            stats = self.phases.setdefault(name, {"calls": 0, "seconds": 0.0, "peak_bytes": 0})
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+            stats["peak_bytes"] = max(stats["peak_bytes"], peak)
+            if file_path is not None:
+                self.files[str(file_path)] = self.files.get(str(file_path), 0.0) + elapsed
+
+    def count(self, name: str, amount: int = 1):
+        """Increment a counter."""
+        self.counters[name] += amount
+
+    def report(self) -> dict:
+        """Return the profile as a JSON-serializable dict."""
+        counters = dict(self.counters)
+        cache = self.parse_cache or parse_cache
+        if cache:
+            counters["cache_hits"] = cache.hits
+            counters["cache_misses"] = cache.misses
+        return {
+            "total_seconds": time.perf_counter() - self._start,
+            "phases": self.phases,
+            "counters": counters,
+            "files": dict(sorted(self.files.items(), key=lambda item: item[1], reverse=True)),
+        }
+
+    def summary(self, slowest_files: int = 5) -> str:
+        """Return a short human-readable summary of the profile."""
+        report = self.report()
+        lines = [f"⏱️ Generated in {report['total_seconds'] * 1000:.1f} ms"]
+        for name, stats in report["phases"].items():
+            lines.append(f"  {name:<24} {stats['seconds'] * 1000:>9.1f} ms  x{stats['calls']:<5} "
+                         f"peak {stats['peak_bytes'] / 1024 / 1024:.1f} MiB")
+        lines.append("  " + ", ".join(f"{name}={value}" for name, value in report["counters"].items()))
+        for file_path, seconds in list(report["files"].items())[:slowest_files]:
+            lines.append(f"  🐢 {seconds * 1000:.1f} ms  {file_path}")
+        return "\n".join(lines)
+
+    def stop(self):
+        """Stop tracing memory (if this profiler started it)."""
+        if self._owns_tracing:
+            tracemalloc.stop()
+
+
+def profile_phase(name: str, file_path: Path = None):
+    """
+    Return a context manager recording a phase in the active profiler (no-op when not profiling).
+
+    Example:
+        with profile_phase("write_flattened_script"):
+            write_flattened_script(...)
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.phase(name, file_path)
+
+
+def profile_count(name: str, amount: int = 1):
+    """Increment a counter of the active profiler (no-op when not profiling)."""
+    if profiler is not None:
+        profiler.count(name, amount)
+
+
+def is_docstring(node) -> bool:
+    """Check whether a statement is a docstring expression."""
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+
+def _line_offset(line: str, byte_col: int) -> int:
+    # AST column offsets count UTF-8 bytes
+    return len(line.encode("utf-8")[:byte_col].decode("utf-8", errors="ignore"))
+
+
+def definition_source_ranges(node, lines: list[str], line_starts: list[int]):
+    """
+    Compute the source ranges of a top-level function or class, with every docstring cut out.
+
+    Docstrings are removed by whole lines; a body left empty gets a `pass` line instead.
+
+    Args:
+        node (ast.AST): A top-level function or class definition (docstrings not removed yet).
+        lines (list[str]): Source lines (with line endings).
+        line_starts (list[int]): Offset of each line in the source (plus the end offset).
+
+    Returns:
+        list or None: (start, end) offsets and literal strings to write in order, or None when
+            a docstring shares its lines with other code (the node is then unparsed instead).
+    """
+    docstrings = []
+    for child in ast.walk(node):
+        if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if not child.body or not is_docstring(child.body[0]):
+            continue
+        doc = child.body[0]
+        before = lines[doc.lineno - 1][:_line_offset(lines[doc.lineno - 1], doc.col_offset)]
+        after = lines[doc.end_lineno - 1][_line_offset(lines[doc.end_lineno - 1], doc.end_col_offset):].strip()
+        if before.strip() or (after and not after.startswith("#")):
+            return None
+        replacement = before + "pass\n" if len(child.body) == 1 else None
+        if replacement and doc.end_lineno == node.end_lineno:
+            replacement = replacement[:-1]  # The definition ends here: no line ending, like other spans
+        docstrings.append((doc.lineno, doc.end_lineno, replacement))
+    docstrings.sort()
+
+    first_line = min([decorator.lineno for decorator in node.decorator_list] + [node.lineno])
+    ranges = []
+    cursor = line_starts[first_line - 1]
+    for start_line, end_line, replacement in docstrings:
+        ranges.append((cursor, line_starts[start_line - 1]))
+        if replacement:
+            ranges.append(replacement)
+        cursor = line_starts[end_line]
+    end = line_starts[node.end_lineno] - (1 if lines[node.end_lineno - 1].endswith("\n") else 0)
+    ranges.append((cursor, end))
+    return [item for item in ranges if isinstance(item, str) or item[0] < item[1]]
+
+
+def statement_source_ranges(node, lines: list[str], line_starts: list[int]):
+    """
+    Compute the source range of a top-level simple statement (e.g. a global assignment).
+
+    Returns:
+        list or None: A single (start, end) range, or None when other code shares its lines.
+    """
+    after = lines[node.end_lineno - 1][_line_offset(lines[node.end_lineno - 1], node.end_col_offset):].strip()
+    if node.col_offset != 0 or (after and not after.startswith("#")):
+        return None
+    end = line_starts[node.end_lineno - 1] + _line_offset(lines[node.end_lineno - 1], node.end_col_offset)
+    return [(line_starts[node.lineno - 1], end)]
+
+
+def attach_source_spans(tree: ast.Module, source: str):
+    """
+    Record on each top-level definition and global assignment the exact source to emit for it.
+
+    The spans are stored on the node as `flatten_source = (source, ranges)` and must be computed
+    before docstrings are removed from the AST. Passes that rewrite a node must drop them
+    (see forget_source_span) so the node is unparsed instead.
+
+    Args:
+        tree (ast.Module): The parsed module.
+        source (str): The source the module was parsed from.
+
+    Example:
+        tree = ast.parse(source)
+        attach_source_spans(tree, source)
+    """
+    source = source.replace("\r\n", "\n").replace("\r", "\n")
+    lines = source.split("\n")
+    lines = [line + "\n" for line in lines[:-1]] + [lines[-1]]
+    line_starts = [0]
+    for line in lines:
+        line_starts.append(line_starts[-1] + len(line))
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            ranges = definition_source_ranges(node, lines, line_starts)
+        elif isinstance(node, ast.Assign):
+            ranges = statement_source_ranges(node, lines, line_starts)
+        else:
+            continue
+        if ranges is not None:
+            node.flatten_source = (source, ranges)
+
+
+def forget_source_span(node):
+    """Drop the source span of a rewritten node so that it is emitted with ast.unparse."""
+    node.__dict__.pop("flatten_source", None)
+    return node
+
+
+def write_node(out, node, emit_mode: str = "source"):
+    """
+    Write a definition or statement to the output, streaming its original source span when
+    available (emit_mode "source") and falling back to ast.unparse otherwise.
+
+    Args:
+        out (file-like): Output to write to.
+        node (ast.AST): The node to write.
+        emit_mode (str, optional): "source" (default) or "unparse".
+
+    Example:
+        write_node(out, node)
+    """
+    span = getattr(node, "flatten_source", None) if emit_mode == "source" else None
+    if span is None:
+        text = unparse_cache.get(node)
+        if text is None:
+            text = unparse_cache[node] = ast.unparse(node)
+        out.write(text)
+        return
+    source, ranges = span
+    for item in ranges:
+        out.write(item if isinstance(item, str) else source[item[0]:item[1]])
+
+
+def node_source(node, emit_mode: str = "source") -> str:
+    """Return the text write_node would write for a node."""
+    out = io.StringIO()
+    write_node(out, node, emit_mode)
+    return out.getvalue()
+
+
+def summarize_tree(tree: ast.Module, source: str = None) -> dict:
+    """
+    Extract everything process_file needs from a parsed module.
+
+    Args:
+        tree (ast.Module): The parsed module.
+        source (str, optional): The module source. When given, definitions and globals keep
+            their original source span for emission (see attach_source_spans).
+
+    Returns:
+        dict: Summary with keys
+            - imports: list of ast.Import / ast.ImportFrom nodes
+            - defs: list of docstring-stripped function/class nodes
+            - globals: list of global ast.Assign nodes (one entry per Name target)
+            - used_names: set of names used in the module
+            - main: the docstring-stripped 'main' function node, or None
+
+    Example:
+        summary = summarize_tree(parse_file(Path("main.py")))
+    """
+    if source is not None:
+        attach_source_spans(tree, source)
+    used_names = find_used_names(tree)
+    main_node = find_main_function(tree)
+
+    defs = []
+    global_vars = []
+    for node in extract_all_defs(tree):
+        if isinstance(node, ast.Assign):  # Global variable assignment
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    global_vars.append(node)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.AsyncFunctionDef)):
+            remove_docstrings(node)
+            defs.append(node)
+
+    return {
+        "imports": extract_imports(tree),
+        "defs": defs,
+        "globals": global_vars,
+        "used_names": used_names,
+        "main": main_node,
+    }
+
+
+def analyze_file(file_path: Path, cache: ParseCache = None) -> dict:
+    """
+    Return the summary of a file (see summarize_tree), served from the cache when the
+    file content did not change since it was last analyzed.
+
+    Args:
+        file_path (Path): The file to analyze.
+        cache (ParseCache, optional): Cache to read from and populate.
+
+    Returns:
+        dict: The file summary.
+
+    Example:
+        summary = analyze_file(Path("main.py"), ParseCache(SRC_DIR / CACHE_DIR_NAME))
+    """
+    if cache is None:
+        source = file_path.read_bytes()
+        return summarize_tree(ast.parse(source, filename=str(file_path)), decode_source(source))
+
+    digest = cache.digest(file_path)
+    summary = cache.get(digest)
+    if summary is not None:
+        return summary
+
+    source = file_path.read_bytes()
+    # The file may have changed since it was hashed: re-hash the bytes we actually parse
+    digest = cache.digest(file_path, source)
+    summary = summarize_tree(ast.parse(source, filename=str(file_path)), decode_source(source))
+    cache.put(digest, summary)
+    return summary
+
+
+def decode_source(source: bytes):
+    """Decode a source file for span emission (None if it is not UTF-8, spans are then skipped)."""
+    try:
+        return source.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def _summarize_path(file_path: Path):
+    # Runs in a worker process: only the extracted summary travels back, not the module AST
+    source = file_path.read_bytes()
+    summary = summarize_tree(ast.parse(source, filename=str(file_path)), decode_source(source))
+    return hashlib.sha256(source).hexdigest(), summary
+
+
+class ModuleIndex:
+    """
+    Module name -> file index of SRC_DIR, built with a single filesystem scan.
+
+    Replaces repeated importlib.util.find_spec calls: every resolution is a dict lookup,
+    and module classification (project / stdlib / third-party) is memoized. Packages are
+    indexed under their name ("pkg" -> pkg/__init__.py), and directories without an
+    __init__.py are remembered as namespace packages of the project.
+
+    Args:
+        src_dir (Path): Root of the project sources.
+
+    Example:
+        index = ModuleIndex(SRC_DIR)
+        index.module_path("helpers.math_tools")  # .../helpers/math_tools.py
+        index.classify("pandas")  # "third-party"
+    """
+
+    def __init__(self, src_dir: Path):
+        self.src_dir = Path(src_dir)
+        self.modules = {}
+        self.packages = set()
+        self._classified = {}
+        self.scan()
+
+    def scan(self):
+        """(Re)build the index from the files currently under src_dir."""
+        self.modules = {}
+        self.packages = set()
+        self._classified = {}
+        for path in self.src_dir.rglob("*.py"):
+            parts = path.relative_to(self.src_dir).with_suffix("").parts
+            if any(part.startswith(".") or part == "__pycache__" for part in parts):
+                continue
+            for depth in range(1, len(parts)):
+                self.packages.add(".".join(parts[:depth]))
+            if parts[-1] == "__init__":
+                if len(parts) > 1:
+                    self.modules[".".join(parts[:-1])] = path
+            else:
+                self.modules.setdefault(".".join(parts), path)
+
+    def module_path(self, module_name: str):
+        """Return the file of a project module, or None if it is not part of the project."""
+        return self.modules.get(module_name)
+
+    def module_name(self, file_path: Path):
+        """Return the dotted module name of a project file, or None if it is outside src_dir."""
+        try:
+            parts = Path(file_path).relative_to(self.src_dir).with_suffix("").parts
+        except ValueError:
+            return None
+        if parts and parts[-1] == "__init__":
+            parts = parts[:-1]
+        return ".".join(parts)
+
+    def resolve_relative(self, file_path: Path, module: str, level: int):
+        """
+        Turn a relative import (`from ..pkg import x` in file_path) into an absolute module name.
+
+        Returns:
+            str or None: The absolute module name, or None if it can't be resolved.
+        """
+        name = self.module_name(file_path)
+        if name is None:
+            return None
+        package = name.split(".") if name else []
+        if Path(file_path).name != "__init__.py":
+            package = package[:-1]
+        if level - 1 > len(package):
+            return None
+        base = package[:len(package) - (level - 1)]
+        return ".".join(base + ([module] if module else []))
+
+    def classify(self, module_name: str) -> str:
+        """
+        Classify a module as "project", "stdlib" or "third-party" (memoized).
+
+        Example:
+            index.classify("utils")  # "project"
+        """
+        kind = self._classified.get(module_name)
+        if kind is None:
+            top_level = module_name.split(".")[0]
+            if top_level in BUILTIN_MODULES:
+                kind = "stdlib"
+            elif module_name in self.modules or module_name in self.packages or top_level in self.packages \
+                    or top_level in self.modules:
+                kind = "project"
+            elif top_level in STDLIB_MODULES:
+                kind = "stdlib"
+            else:
+                kind = "third-party"
+            self._classified[module_name] = kind
+        return kind
+
+
+def get_module_index() -> ModuleIndex:
+    """
+    Return the ModuleIndex of SRC_DIR, scanning the directory on first use.
+
+    Example:
+        get_module_index().module_path("utils")
+    """
+    global module_index
+    if module_index is None:
+        module_index = ModuleIndex(SRC_DIR)
+    return module_index
+
+
 def get_module_path(module_name: str) -> Path:
     """
     Get the file path of a module within the source directory, if available.
@@ -240,22 +948,18 @@ def get_module_path(module_name: str) -> Path:
     Example:
         path = get_module_path("utils")
     """
-    try:
-        spec = importlib.util.find_spec(module_name)
-        if spec and spec.origin and SRC_DIR in Path(spec.origin).parents:
-            return Path(spec.origin)
-    except Exception:
-        return None
-    return None
+    return get_module_index().module_path(module_name)
 
 
-def collect_dependencies(entry_path: Path, preload_paths: list[Path] = None):
+def collect_dependencies(entry_path: Path, preload_paths: list[Path] = None, workers: int = 1):
     """
     Collect all imports and definitions needed for an entry point, including dependencies.
 
     Args:
         entry_path (Path): The path of the main entry file.
         preload_paths (list[Path], optional): List of additional files to preload.
+        workers (int, optional): Number of parser processes. With more than one, files are
+            parsed up front frontier by frontier (see preanalyze_files); the result is the same.
 
     Returns:
         tuple: (all_imports, collected_defs, global_vars)
@@ -266,7 +970,7 @@ def collect_dependencies(entry_path: Path, preload_paths: list[Path] = None):
     Example:
         all_imports, defs, globals = collect_dependencies(Path("main.py"), [Path("utils.py")])
     """
-    global main_function_ast
+    global dependency_files
     preload_paths = preload_paths or []
 
     # Initialize queues and tracking sets
@@ -278,31 +982,35 @@ def collect_dependencies(entry_path: Path, preload_paths: list[Path] = None):
         original_queue.append(entry_path)
 
     seen_files = set()
-    pending_files = set()  # Track files we've discovered but not processed
+    pending_files = deque()  # Files discovered but not processed, in discovery order (same order as DependencyState)
     collected_defs = {}
     global_vars = []
     all_imports = set()
 
+    # Parse the whole dependency graph concurrently first, if asked to
+    summaries = preanalyze_files(original_queue, workers) if workers > 1 else None
+
     # First process all files in specified order
     for current_path in original_queue:
         # Process the entire file and its dependencies
         process_file(current_path, seen_files, pending_files, collected_defs,
-                     global_vars, all_imports)
+                     global_vars, all_imports, summaries)
 
     # Then process any pending files discovered during first phase
     while pending_files:
-        current_path = pending_files.pop()
+        current_path = pending_files.popleft()
         if current_path in seen_files:
             continue
 
         process_file(current_path, seen_files, pending_files, collected_defs,
-                     global_vars, all_imports)
+                     global_vars, all_imports, summaries)
 
+    dependency_files = sorted(seen_files)
     return all_imports, collected_defs, global_vars
 
 
-def process_file(file_path: Path, seen_files: set, pending_files: set,
-                 collected_defs: dict, global_vars: list, all_imports: set):
+def process_file(file_path: Path, seen_files: set, pending_files: deque,
+                 collected_defs: dict, global_vars: list, all_imports: set, summaries: dict = None):
     """
     Parse and analyze a file, collecting its definitions, global variables, and imports.
     Updates the provided sets/dicts with discovered items.
@@ -310,13 +1018,14 @@ def process_file(file_path: Path, seen_files: set, pending_files: set,
     Args:
         file_path (Path): The file to process.
         seen_files (set): Set of already processed files.
-        pending_files (set): Set to add discovered but unprocessed files.
+        pending_files (deque): Queue of discovered but unprocessed files.
         collected_defs (dict): Collected definitions (name -> (node, file_path)).
         global_vars (list): List of AST assignment nodes.
         all_imports (set): Set of all AST import nodes.
+        summaries (dict, optional): Summaries already analyzed (file path -> summary).
 
     Example:
-        process_file(Path("main.py"), set(), set(), {}, [], set())
+        process_file(Path("main.py"), set(), deque(), {}, [], set())
     """
     global main_function_ast
 
@@ -325,54 +1034,322 @@ def process_file(file_path: Path, seen_files: set, pending_files: set,
 
     seen_files.add(file_path)
 
-    # Parse the file
-    try:
-        tree = parse_file(file_path)
-    except Exception as e:
-        print(f"🚨 Error parsing {file_path}: {e}")
-        exit(f"🚨 Error parsing {file_path}: {e}")
+    with profile_phase("process_file", file_path):
+        # Parse the file (or load its analysis from the shared summaries / cache when unchanged)
+        try:
+            summary = (summaries or shared_summaries).get(file_path) or analyze_file(file_path, parse_cache)
+        except Exception as e:
+            raise FlattenError(f"Error parsing {file_path}: {e}") from e
 
-    # Process imports and register dependencies
-    file_imports = extract_imports(tree)
-    all_imports.update(file_imports)
+        # Process imports and register dependencies
+        file_imports = summary["imports"]
+        all_imports.update(file_imports)
 
-    # Find all references and used names
-    used_names = find_used_names(tree)
+        # Check if this is the entry point
+        if file_path in MAIN_ENTRY_POINTS:
+            main_function_ast = summary["main"]
 
-    # Check if this is the entry point
-    if file_path in MAIN_ENTRY_POINTS:
-        main_function_ast = find_main_function(tree)
+        # Process all definitions in this file (functions, classes, global vars)
+        global_vars.extend(tag_origin(summary["globals"], file_path))
 
-    # Process all definitions in this file (functions, classes, global vars)
-    file_defs = {}
-    for node in extract_all_defs(tree):
-        node_name = getattr(node, 'name', None)
-        if isinstance(node, ast.Assign):  # Global variable assignment
-            for target in node.targets:
-                if isinstance(target, ast.Name):
-                    global_vars.append(node)
-        elif isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.AsyncFunctionDef)):
-            remove_docstrings(node)
-            file_defs[node_name] = (node, file_path)
+        # Add all definitions from this file to the collected definitions
+        add_definitions(collected_defs, summary["defs"], file_path)
+
+        profile_count("files")
+        profile_count("defs", len(summary["defs"]))
+        profile_count("imports", len(file_imports))
+
+        # Process imports to discover new files
+        with profile_phase("module_resolution"):
+            module_paths = resolve_import_paths(file_imports, file_path)
+        for module_path in module_paths:
+            if module_path not in seen_files:
+                pending_files.append(module_path)
+
+
+def tag_origin(nodes: list, file_path: Path) -> list:
+    """Record on global assignment nodes the file they come from (reported by the bundle analyzer)."""
+    for node in nodes:
+        node.flatten_file = file_path
+    return nodes
+
+
+def add_definitions(collected_defs: dict, nodes: list, file_path: Path):
+    """
+    Add the definitions of a file to the collected definitions, reporting the names that
+    were already defined (the flattened script can only keep one of them: the latter).
+
+    Args:
+        collected_defs (dict): Collected definitions (name -> (node, file_path)).
+        nodes (list): Function/class nodes defined in file_path.
+        file_path (Path): The file defining them.
+
+    Example:
+        add_definitions(collected_defs, summary["defs"], Path("utils.py"))
+    """
+    for node in nodes:
+        previous = collected_defs.get(node.name)
+        if previous is not None and previous[0] is not node:
+            log(f"⚠️ Name collision: '{node.name}' is defined in {previous[1]} and {file_path}, "
+                  f"keeping the one from {file_path}")
+        collected_defs[node.name] = (node, file_path)
+
+
+def resolve_import_paths(imports, file_path: Path = None) -> list[Path]:
+    """
+    Resolve import nodes to the project files they refer to (modules outside SRC_DIR are skipped).
 
-    # Add all definitions from this file to the collected definitions
-    collected_defs.update(file_defs)
+    `from pkg import module` resolves to pkg/module.py when module is a submodule, and relative
+    imports (`from . import x`, `from ..pkg import y`) are resolved against file_path.
 
-    # Process imports to discover new files
-    for imp in file_imports:
+    Args:
+        imports (list): List of ast.Import / ast.ImportFrom nodes.
+        file_path (Path, optional): The file containing the imports, needed for relative imports.
+
+    Returns:
+        list[Path]: Paths of the imported project modules, in import order, without duplicates.
+
+    Example:
+        paths = resolve_import_paths(extract_imports(tree), Path("main.py"))
+    """
+    index = get_module_index()
+    module_paths = {}  # Ordered set
+
+    def add(module):
+        module_path = index.module_path(module)
+        if module_path:
+            module_paths[module_path] = None
+
+    for imp in imports:
         if isinstance(imp, ast.ImportFrom):
             module = imp.module
-            if module and not is_builtin_import(module.split('.')[0]):
-                module_path = get_module_path(module)
-                if module_path and module_path not in seen_files:
-                    pending_files.add(module_path)
-        elif isinstance(imp, ast.Import):
+            if imp.level:
+                module = index.resolve_relative(file_path, imp.module, imp.level) if file_path else None
+                if module is None:
+                    continue
+            if module and is_builtin_import(module.split('.')[0]):
+                continue
+            if module:
+                add(module)
+            for alias in imp.names:
+                # The imported name may itself be a submodule of the package
+                add(f"{module}.{alias.name}" if module else alias.name)
+        else:
             for alias in imp.names:
-                mod = alias.name
-                if mod and not is_builtin_import(mod.split('.')[0]):
-                    module_path = get_module_path(mod)
-                    if module_path and module_path not in seen_files:
-                        pending_files.add(module_path)
+                if not is_builtin_import(alias.name.split('.')[0]):
+                    add(alias.name)
+    return list(module_paths)
+
+
+class DependencyState:
+    """
+    In-memory dependency state of an entry point, kept alive between rebuilds in watch mode.
+
+    Holds the summary and the resolved project imports of every reachable file so that a
+    change only re-analyzes the changed file and re-resolves the imports of the files that
+    depend on it, instead of walking the whole project again.
+
+    Args:
+        entry_path (Path): The path of the main entry file.
+        preload_paths (list[Path], optional): List of additional files to preload.
+
+    Example:
+        state = DependencyState(Path("main.py"))
+        state.build()
+        imports, defs, global_vars = state.merged()
+    """
+
+    def __init__(self, entry_path: Path, preload_paths: list[Path] = None):
+        self.roots = []
+        for path in (preload_paths or []) + [entry_path]:
+            if path not in self.roots:
+                self.roots.append(path)
+        self.summaries = {}
+        self.dependencies = {}
+        self.order = []
+
+    def _load(self, file_path: Path):
+        with profile_phase("process_file", file_path):
+            try:
+                summary = shared_summaries.get(file_path) or analyze_file(file_path, parse_cache)
+            except Exception as e:
+                raise FlattenError(f"Error parsing {file_path}: {e}") from e
+            self.summaries[file_path] = summary
+            profile_count("files")
+            profile_count("defs", len(summary["defs"]))
+            profile_count("imports", len(summary["imports"]))
+            with profile_phase("module_resolution"):
+                self.dependencies[file_path] = resolve_import_paths(summary["imports"], file_path)
+
+    def _expand(self):
+        # Walk from the roots (roots first, in order), loading newly reachable files
+        # and forgetting the ones that are no longer imported
+        order = []
+        seen = set()
+        queue = deque(self.roots)
+        while queue:
+            file_path = queue.popleft()
+            if file_path in seen or not file_path.exists():
+                continue
+            seen.add(file_path)
+            if file_path not in self.summaries:
+                self._load(file_path)
+            order.append(file_path)
+            queue.extend(self.dependencies[file_path])
+
+        for file_path in list(self.summaries):
+            if file_path not in seen:
+                del self.summaries[file_path]
+                del self.dependencies[file_path]
+        self.order = order
+
+    def build(self):
+        """Analyze every file reachable from the roots."""
+        self._expand()
+
+    def dependents(self, file_path: Path) -> set:
+        """Return the known files importing file_path."""
+        return {path for path, deps in self.dependencies.items() if file_path in deps}
+
+    def update(self, changed_paths) -> set:
+        """
+        Refresh the state after files changed on disk.
+
+        Args:
+            changed_paths (iterable[Path]): Files that were modified, created or deleted.
+
+        Returns:
+            set: Files that were re-analyzed or had their imports re-resolved.
+        """
+        changed_paths = set(changed_paths)
+        index = get_module_index()
+        indexed_files = set(index.modules.values())
+        if any(path.exists() != (path in indexed_files) for path in changed_paths):
+            index.scan()  # Modules were created or deleted
+        if any(path.exists() and path not in indexed_files for path in changed_paths):
+            # A new module may satisfy an import that did not resolve before
+            to_resolve = set(self.summaries)
+        else:
+            to_resolve = set()
+            for path in changed_paths:
+                to_resolve.update(self.dependents(path))
+
+        to_analyze = {path for path in changed_paths if path in self.summaries}
+        for path in to_analyze:
+            if path.exists():
+                self._load(path)
+            else:
+                del self.summaries[path]
+                del self.dependencies[path]
+        for path in to_resolve - to_analyze:
+            if path in self.summaries:
+                self.dependencies[path] = resolve_import_paths(self.summaries[path]["imports"], path)
+
+        self._expand()
+        return to_analyze | to_resolve
+
+    def merged(self):
+        """
+        Merge the per-file summaries the same way collect_dependencies does.
+
+        Returns:
+            tuple: (all_imports, collected_defs, global_vars), see collect_dependencies.
+        """
+        global main_function_ast
+
+        all_imports = set()
+        collected_defs = {}
+        global_vars = []
+        for file_path in self.order:
+            summary = self.summaries[file_path]
+            all_imports.update(summary["imports"])
+            global_vars.extend(tag_origin(summary["globals"], file_path))
+            if file_path in MAIN_ENTRY_POINTS:
+                main_function_ast = summary["main"]
+            add_definitions(collected_defs, summary["defs"], file_path)
+        return all_imports, collected_defs, global_vars
+
+
+def scan_source_files(exclude=()) -> dict:
+    """
+    Snapshot the modification time of every Python file under SRC_DIR.
+
+    Args:
+        exclude (iterable[Path]): Files to leave out (e.g. the generated output).
+
+    Returns:
+        dict: Mapping from file path to st_mtime_ns.
+    """
+    snapshot = {}
+    for path in SRC_DIR.rglob("*.py"):
+        if path in exclude:
+            continue
+        try:
+            snapshot[path] = path.stat().st_mtime_ns
+        except OSError:
+            continue
+    return snapshot
+
+
+def watch_and_flatten(entry_file: Path, output_path: Path, preload_paths: list[Path], interval: float = 0.2,
+                      hardcoded_statement=None):
+    """
+    Flatten the entry point, then keep rebuilding the output whenever a file under SRC_DIR changes.
+
+    The dependency state stays in memory between rebuilds: only the changed files and the
+    files importing them are processed again. Stops on Ctrl+C.
+
+    Args:
+        entry_file (Path): The path of the main entry file.
+        output_path (Path): Path to write the flattened output file.
+        preload_paths (list[Path]): List of files whose defs should be written first.
+        interval (float): Polling interval in seconds.
+        hardcoded_statement (str, optional): Additional code to insert at the top of the file.
+
+    Example:
+        watch_and_flatten(Path("main.py"), Path("workato_prod_main.py"), [])
+    """
+    exclude = {output_path}
+
+    state = DependencyState(entry_file, preload_paths)
+    state.build()
+    imports, defs, global_vars = state.merged()
+    write_flattened_script(imports, defs, output_path, preload_paths=preload_paths, global_vars=global_vars,
+                           hardcoded_statement=hardcoded_statement, **write_options())
+    if parse_cache:
+        parse_cache.flush()
+    log(f"👀 Watching {SRC_DIR} for changes (Ctrl+C to stop)")
+
+    snapshot = scan_source_files(exclude)
+    try:
+        while True:
+            time.sleep(interval)
+            current = scan_source_files(exclude)
+            changed = {path for path in current.keys() | snapshot.keys() if current.get(path) != snapshot.get(path)}
+            snapshot = current
+            if not changed:
+                continue
+
+            start = time.perf_counter()
+            try:
+                touched = state.update(changed)
+            except Exception as e:
+                log(f"🚨 Error while updating dependencies: {e}")
+                continue
+            if not touched:
+                continue  # The change does not affect this entry point
+            if not state.order:
+                log(f"🚨 Error: The entry file '{entry_file}' does not exist.")
+                continue
+            imports, defs, global_vars = state.merged()
+            write_flattened_script(imports, defs, output_path, preload_paths=preload_paths, global_vars=global_vars,
+                                   hardcoded_statement=hardcoded_statement, **write_options())
+            if parse_cache:
+                parse_cache.flush()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            log(f"[🔁] Rebuilt {output_path} in {elapsed_ms:.1f} ms ({len(touched)} file(s) reprocessed)")
+    except KeyboardInterrupt:
+        log("👋 Watch mode stopped")
 
 
 def collect_non_source_imports(imports):
@@ -401,7 +1378,7 @@ def collect_non_source_imports(imports):
         if isinstance(imp, ast.ImportFrom):
             # Check if the module is outside of the source directory
 
-            if not is_within_project(imp.module) and check_not_from_black_list(imp):
+            if imp.level == 0 and not is_within_project(imp.module) and check_not_from_black_list(imp):
                 non_source_imports[imp.module].update(alias.name for alias in imp.names)
         elif isinstance(imp, ast.Import):
             for alias in imp.names:
@@ -425,23 +1402,19 @@ def is_within_project(module_name):
     Example:
         is_within_project("my_package.utils")  # True if in SRC_DIR
     """
-    try:
-        # Check if the module is inside the project directory (SRC_DIR)
-        spec = importlib.util.find_spec(module_name)
-        if spec and spec.origin:
-            return SRC_DIR in Path(spec.origin).parents
-    except ModuleNotFoundError as e:
-        return False
-    return False
+    return bool(module_name) and get_module_index().classify(module_name) == "project"
 
 
-def write_dynamic_imports(imports, output_file):
+def write_dynamic_imports(imports, output_file, used_names=None, exclude=None):
     """
     Write non-source (external) imports to the output file.
 
     Args:
         imports (list): List of AST import nodes.
         output_file (file-like): File object opened for writing.
+        used_names (set, optional): Names used by the emitted code. When given,
+            imports binding none of these names are dropped.
+        exclude (dict, optional): Mapping of module -> names not to write (e.g. imported lazily).
 
     Example:
         with open("output.py", "w") as f:
@@ -449,7 +1422,13 @@ def write_dynamic_imports(imports, output_file):
     """
     # Collect non-source imports and merge/deduplicate them
     non_source_imports = collect_non_source_imports(imports)
-    print(non_source_imports)
+    if used_names is not None:
+        non_source_imports = prune_unused_imports(non_source_imports, used_names)
+    for module, names in (exclude or {}).items():
+        non_source_imports[module] -= names
+        if not non_source_imports[module]:
+            del non_source_imports[module]
+    profile_count("external_imports", sum(len(names) for names in non_source_imports.values()))
 
     if non_source_imports:
         # Clean up the imports before writing
@@ -482,8 +1461,9 @@ def clean_up_imports(non_source_imports):
     for module, names in non_source_imports.items():
         if '*' in names:
             clean_imports.append(f"import {module}")
-        else:
-            sorted_names = sorted(names)  # Sort the names alphabetically
+        # A module can be both imported and imported from
+        sorted_names = sorted(name for name in names if name != '*')  # Sort the names alphabetically
+        if sorted_names:
             clean_imports.append(f"from {module} import {', '.join(sorted_names)}")
 
     # Sort the import statements alphabetically
@@ -492,163 +1472,3224 @@ def clean_up_imports(non_source_imports):
     return clean_imports
 
 
-def remove_unused_imports(file_path: str):
+def prune_unused_imports(non_source_imports, used_names):
     """
-    Removes unused imports and variables from a Python file using autoflake.
+    Drop imported names that the emitted code never uses.
+
+    Star imports are always kept since the names they bind are unknown.
 
     Args:
-        file_path (str): Path to the Python file to be cleaned.
+        non_source_imports (dict): Mapping of module -> set of names (see collect_non_source_imports).
+        used_names (set): Names used by the emitted code.
 
-    Raises:
-        FileNotFoundError: If the given file path does not exist.
-        RuntimeError: If autoflake fails to process the file.
+    Returns:
+        defaultdict: The same mapping without unused names (modules left empty are removed).
+
+    Example:
+        prune_unused_imports({'os': {'*'}, 'typing': {'List', 'Dict'}}, {'os', 'List'})
+        # {'os': {'*'}, 'typing': {'List'}}
     """
-    path = Path(file_path)
-    if not path.is_file():
-        raise FileNotFoundError(f"🚨🚩🚨 No such file: {file_path}")
+    pruned = defaultdict(set)
+    for module, names in non_source_imports.items():
+        for name in names:
+            if name == '*':
+                # 'import a.b' binds 'a'
+                if module.split('.')[0] in used_names:
+                    pruned[module].add(name)
+            elif name in used_names:
+                pruned[module].add(name)
+    return pruned
 
-    try:
-        subprocess.run([
-            "autoflake",
+
+def prune_dead_assignments(node):
+    """
+    Remove assignments to local variables that are never read, inside every function of a definition.
+
+    Mirrors autoflake's --remove-unused-variables: `x = 1` is dropped and `x = compute()` becomes
+    `compute()` so side effects are kept. Only single-name targets are considered, and functions
+    calling locals()/vars()/eval()/exec() are left untouched. The given node is never mutated.
+
+    The result is cached per node (see pruned_cache), so unchanged definitions are not
+    analyzed and copied again on the next rebuild.
+
+    Args:
+        node (ast.AST): A function or class definition.
+
+    Returns:
+        ast.AST: The node itself when nothing is dead, otherwise a pruned copy.
+
+    Example:
+        node = prune_dead_assignments(node)
+    """
+    if node in pruned_cache:
+        return pruned_cache[node] or node
+
+    def dead_assignments(function):
+        read = set()
+        for child in ast.walk(function):
+            if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Store):
+                read.add(child.id)
+            elif isinstance(child, ast.AugAssign) and isinstance(child.target, ast.Name):
+                read.add(child.target.id)  # 'x += 1' reads x (its target only has a Store context)
+            elif isinstance(child, (ast.Global, ast.Nonlocal)):
+                read.update(child.names)
+        if read & {"locals", "vars", "eval", "exec"}:
+            return set()
+
+        dead = set()
+        for child in walk_function_body(function):
+            if (isinstance(child, ast.Assign) and len(child.targets) == 1
+                    and isinstance(child.targets[0], ast.Name) and child.targets[0].id not in read):
+                dead.add(id(child))
+        return dead
+
+    def has_dead(current):
+        return any(dead_assignments(child) for child in ast.walk(current)
+                   if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)))
+
+    if not has_dead(node):
+        pruned_cache[node] = None
+        return node
+
+    pruned = forget_source_span(copy.deepcopy(node))
+    for function in [child for child in ast.walk(pruned) if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))]:
+        dead = dead_assignments(function)
+        if dead:
+            DeadAssignmentRemover(dead).visit(function)
+    pruned_cache[node] = ast.fix_missing_locations(pruned)
+    return pruned
+
+
+def walk_function_body(function):
+    """Yield the statements of a function body, descending into blocks but not into nested scopes."""
+    stack = list(function.body)
+    while stack:
+        stmt = stack.pop()
+        yield stmt
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        for field in ("body", "orelse", "finalbody"):
+            stack.extend(getattr(stmt, field, []))
+        for handler in getattr(stmt, "handlers", []):
+            stack.extend(handler.body)
+        for case in getattr(stmt, "cases", []):
+            stack.extend(case.body)
+
+
+def scope_bindings(function) -> tuple[set, set]:
+    """
+    Return the names a function binds in its own scope, and the names declared global or
+    nonlocal in it or any nested scope.
+
+    Nested functions, lambdas, classes and comprehensions have their own scope: only their name
+    (for definitions) and the walrus targets of comprehensions bind in the function.
+
+    Example:
+        scope_bindings(ast.parse("def f():\\n    x = 1\\n    def g(): y = 2").body[0])  # ({'x', 'g'}, set())
+    """
+    bound, declared = set(), set()
+    for child in ast.walk(function):
+        if isinstance(child, (ast.Global, ast.Nonlocal)):
+            declared.update(child.names)
+    stack = list(ast.iter_child_nodes(function))
+    while stack:
+        child = stack.pop()
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(child.name)
+            # Decorators, defaults and bases are evaluated in this scope
+            stack.extend(child.decorator_list + getattr(child, "bases", []))
+            if not isinstance(child, ast.ClassDef):
+                stack.extend(child.args.defaults + [default for default in child.args.kw_defaults if default])
+            continue
+        if isinstance(child, ast.Lambda):
+            stack.extend(child.args.defaults + [default for default in child.args.kw_defaults if default])
+            continue
+        if isinstance(child, (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            bound.update(named.target.id for named in ast.walk(child) if isinstance(named, ast.NamedExpr))
+            stack.append(child.generators[0].iter)  # The first iterable is evaluated in this scope
+            continue
+        if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+            bound.add(child.id)
+        elif isinstance(child, ast.ExceptHandler) and child.name:
+            bound.add(child.name)
+        stack.extend(ast.iter_child_nodes(child))
+    return bound, declared
+
+
+class DeadAssignmentRemover(ast.NodeTransformer):
+    """Replace the given assignment nodes (by id) with their value, or drop them when the value is trivial."""
+
+    def __init__(self, dead_ids):
+        self.dead_ids = dead_ids
+
+    def visit_Assign(self, node):
+        if id(node) not in self.dead_ids:
+            return node
+        if isinstance(node.value, (ast.Constant, ast.Name)):
+            return None
+        return ast.copy_location(ast.Expr(value=node.value), node)
+
+    def generic_visit(self, node):
+        super().generic_visit(node)
+        # Keep blocks syntactically valid when every statement was removed
+        if isinstance(getattr(node, "body", None), list) and not node.body:
+            node.body.append(ast.Pass())
+        return node
+
+
+LAZY_MODULE_SOURCE = """
+import importlib as _importlib
+
+
+class _LazyModule:
+
+    def __init__(self, *module_names):
+        self._lazy_module_names = module_names
+        self._lazy_module = None
+
+    def __getattr__(self, attribute):
+        if self._lazy_module is None:
+            for module_name in self._lazy_module_names:
+                _importlib.import_module(module_name)
+            self._lazy_module = _importlib.import_module(self._lazy_module_names[0].split('.')[0])
+        return getattr(self._lazy_module, attribute)
+"""
+
+
+def module_level_names(node) -> set:
+    """
+    Return the names a top-level definition uses when it is defined (not when it is called).
+
+    That is decorators, default values, annotations, class bases and keywords, and class body
+    statements other than methods. Names used there can't be imported lazily.
+
+    Args:
+        node (ast.AST): A top-level function or class definition.
+
+    Returns:
+        set: The names used at definition time.
+
+    Example:
+        module_level_names(ast.parse("@cache\ndef f(x: np.ndarray = None): pass").body[0])  # {'cache', 'np'}
+    """
+    names = set()
+    parts = list(node.decorator_list)
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        arguments = node.args
+        parts += arguments.defaults + [default for default in arguments.kw_defaults if default]
+        for arg in arguments.posonlyargs + arguments.args + arguments.kwonlyargs + [arguments.vararg, arguments.kwarg]:
+            if arg is not None and arg.annotation:
+                parts.append(arg.annotation)
+        if node.returns:
+            parts.append(node.returns)
+    elif isinstance(node, ast.ClassDef):
+        parts += node.bases + [keyword.value for keyword in node.keywords]
+        for statement in node.body:
+            if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                names.update(module_level_names(statement))
+            else:
+                parts.append(statement)
+    for part in parts:
+        names.update(find_used_names(part))
+    return names
+
+
+def plan_lazy_imports(imports, emitted_defs, global_vars=None, extra_names=None, used_names=None,
+                      eager=()) -> dict:
+    """
+    Decide which external imports of the output can be deferred until they are used.
+
+    Only third-party modules are deferred (stdlib and modules listed in `eager` stay at the top).
+    `import module` becomes a _LazyModule proxy importing the module on first attribute access;
+    `from module import name` is moved into the functions using `name`, unless a name imported
+    from that module is used at definition time (decorators, annotations, defaults, class
+    bodies, globals): the module is then imported at load time anyway, so all its names stay eager.
+
+    Args:
+        imports (set): Set of AST import nodes used in the project.
+        emitted_defs (list): Definitions written to the output.
+        global_vars (list, optional): Global assignment nodes written to the output.
+        extra_names (set, optional): Other names used at module level (e.g. by hardcoded statements).
+        used_names (set, optional): Names used by the output, to drop unused imports first.
+        eager (iterable[str]): Top-level modules that must stay eager.
+
+    Returns:
+        dict: {"proxies": bound name -> list of modules, "local": name -> module,
+               "excluded": module -> set of names not to write at the top}
+
+    Example:
+        plan = plan_lazy_imports(imports, emitted_defs, eager=["requests"])
+    """
+    non_source_imports = collect_non_source_imports(imports)
+    if used_names is not None:
+        non_source_imports = prune_unused_imports(non_source_imports, used_names)
+
+    eager_names = set(extra_names or [])
+    for node in global_vars or []:
+        eager_names.update(find_used_names(node))
+    for node in emitted_defs:
+        eager_names.update(module_level_names(node))
+
+    index = get_module_index()
+    plan = {"proxies": defaultdict(list), "local": {}, "excluded": defaultdict(set)}
+    for module, names in non_source_imports.items():
+        if module.split('.')[0] in eager or index.classify(module) != "third-party":
+            continue
+        if any(name != '*' and name in eager_names for name in names):
+            continue
+        for name in names:
+            if name == '*':
+                plan["proxies"][module.split('.')[0]].append(module)
+                plan["excluded"][module].add(name)
+            else:
+                plan["local"][name] = module
+                plan["excluded"][module].add(name)
+    return plan
+
+
+def inject_local_imports(node, local_imports: dict):
+    """
+    Add `from module import name` at the start of every function (and method) using one of the given names.
+
+    Names bound by the function itself (parameters, assignments) are left alone. The given
+    node is never mutated.
+
+    Args:
+        node (ast.AST): A top-level function or class definition.
+        local_imports (dict): Mapping of name -> module to import inside the functions.
+
+    Returns:
+        ast.AST: The node itself when no function uses the names, otherwise a rewritten copy.
+
+    Example:
+        node = inject_local_imports(node, {"DataFrame": "pandas"})
+    """
+    def needed_imports(function):
+        arguments = function.args
+        bound = {arg.arg for arg in arguments.posonlyargs + arguments.args + arguments.kwonlyargs}
+        bound.update(arg.arg for arg in (arguments.vararg, arguments.kwarg) if arg is not None)
+        loaded = set()
+        for statement in function.body:
+            for child in ast.walk(statement):
+                if isinstance(child, ast.Name):
+                    if isinstance(child.ctx, ast.Load):
+                        loaded.add(child.id)
+                    else:
+                        bound.add(child.id)
+        needed = defaultdict(set)
+        for name in loaded - bound:
+            if name in local_imports:
+                needed[local_imports[name]].add(name)
+        return needed
+
+    def functions(current):
+        if isinstance(current, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return [current]
+        if isinstance(current, ast.ClassDef):
+            return [function for statement in current.body for function in functions(statement)]
+        return []
+
+    if not local_imports or not any(needed_imports(function) for function in functions(node)):
+        return node
+
+    node = forget_source_span(copy.deepcopy(node))
+    for function in functions(node):
+        needed = needed_imports(function)
+        statements = [
+            ast.ImportFrom(module=module, names=[ast.alias(name=name) for name in sorted(names)], level=0)
+            for module, names in sorted(needed.items())
+        ]
+        function.body[:0] = statements
+    return ast.fix_missing_locations(node)
+
+
+def write_lazy_modules(output_file, proxies: dict):
+    """
+    Write the _LazyModule helper and one proxy per lazily imported module.
+
+    Args:
+        output_file (file-like): File object opened for writing.
+        proxies (dict): Mapping of bound name -> list of modules to import on first use.
+    """
+    if not proxies:
+        return
+    output_file.write(LAZY_MODULE_SOURCE.strip() + "\n\n\n")
+    for bound_name, modules in sorted(proxies.items()):
+        arguments = ", ".join(repr(module) for module in sorted(modules))
+        output_file.write(f"{bound_name} = _LazyModule({arguments})\n")
+
+
+def remove_unused_imports(file_path: str):
+    """
+    Removes unused imports and variables from a Python file using autoflake.
+
+    Args:
+        file_path (str): Path to the Python file to be cleaned.
+
+    Raises:
+        FileNotFoundError: If the given file path does not exist.
+        RuntimeError: If autoflake fails to process the file.
+    """
+    path = Path(file_path)
+    if not path.is_file():
+        raise FileNotFoundError(f"🚨🚩🚨 No such file: {file_path}")
+
+    try:
+        subprocess.run([
+            "autoflake",
             "--in-place",
             "--remove-unused-variables",
             "--remove-all-unused-imports",
             "--expand-star-imports",
             str(path)
         ], check=True)
-        print(f"Cleaned unused imports in: {file_path}")
+        log(f"Cleaned unused imports in: {file_path}")
     except subprocess.CalledProcessError as e:
         raise RuntimeError(f"Failed to process file with autoflake: {e}")
 
 
-def write_flattened_script(imports, defs, output_path, preload_paths=None, global_vars=None, hardcoded_statement=None):
+class Symbol:
+    """
+    A top-level definition (function/class) or global assignment of the flattened script.
+
+    Attributes:
+        names (tuple[str]): Names bound by the symbol (several for `a = b = 1`).
+        node (ast.AST): The definition or assignment node.
+        file_path (Path): The file defining it.
+        position (int): Rank in the preferred emission order (see SymbolGraph).
+        has_call (bool): Whether executing it may have side effects (see has_load_time_effects).
+        references (set[str]): Every name the symbol uses, bodies included.
+        load_references (set[str]): Names used while the definition itself executes
+            (decorators, defaults, annotations, bases, class bodies, assigned values).
+        called (set[str]): Names called while the definition executes.
+        edges (tuple[int]): Positions of the symbols that must be emitted before this one.
+        source_index (int or None): Index of the statement in its module body (streaming mode).
+    """
+    __slots__ = ("names", "node", "file_path", "position", "is_global", "has_call", "references",
+                 "load_references", "called", "edges", "source_index")
+
+    def __init__(self, names, node, file_path, position, source_index=None):
+        self.names = names
+        self.node = node
+        self.file_path = file_path
+        self.position = position
+        self.is_global = isinstance(node, ast.Assign)
+        self.references = cached_used_names(node)
+        load_names = load_names_cache.get(node)
+        if load_names is None:  # Computed once per node, see load_names_cache
+            load_names = load_names_cache[node] = (has_load_time_effects(node), *load_time_names(node))
+        self.has_call, self.load_references, self.called = load_names
+        self.edges = ()
+        self.source_index = source_index
+
+    def release(self):
+        """Drop the node, keeping only what the graph needs (see stream_flatten)."""
+        self.node = None
+
+
+def has_load_time_effects(node) -> bool:
+    """
+    Tell whether executing a top-level statement may have side effects, so that tree shaking
+    keeps it even when nothing references it: a global whose value calls something, a decorated
+    function or class (a decorator can register it somewhere, e.g. in a handler table), or a
+    class whose bases or body call something.
+
+    Example:
+        has_load_time_effects(ast.parse("@register\ndef handle(): ...").body[0])  # True
+    """
+    if getattr(node, "decorator_list", None):
+        return True
+    if isinstance(node, ast.ClassDef):
+        expressions = node.bases + [keyword.value for keyword in node.keywords]
+        for statement in node.body:
+            if isinstance(statement, ast.ClassDef):
+                if has_load_time_effects(statement):
+                    return True
+            elif isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                expressions.extend(statement.decorator_list)  # Plain method decorators (property, ...) are harmless
+            else:
+                expressions.append(statement)
+    else:
+        expressions = [node.value] if isinstance(node, ast.Assign) else []
+    return any(isinstance(child, ast.Call) for expression in expressions for child in ast.walk(expression))
+
+
+def load_time_names(node):
+    """
+    Return the names a top-level statement uses, and the names it calls, while it executes.
+
+    Function bodies only run when called, so for a function this is its decorators, defaults
+    and annotations; a class also runs its bases, keywords and body (except method bodies).
+
+    Args:
+        node (ast.AST): A function, class or assignment node.
+
+    Returns:
+        tuple: (used names, called names), both sets.
+
+    Example:
+        load_time_names(ast.parse("X = build(DEFAULTS)").body[0])  # ({'build', 'DEFAULTS'}, {'build'})
+    """
+    expressions = []
+    decorators = []
+    pending = [node]
+    while pending:
+        current = pending.pop()
+        if isinstance(current, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            decorators.extend(current.decorator_list)
+            arguments = current.args
+            expressions.extend(arguments.defaults + [d for d in arguments.kw_defaults if d is not None])
+            expressions.extend(arg.annotation for arg in arguments.posonlyargs + arguments.args + arguments.kwonlyargs
+                               + [arguments.vararg, arguments.kwarg] if arg is not None and arg.annotation)
+            if current.returns:
+                expressions.append(current.returns)
+        elif isinstance(current, ast.ClassDef):
+            decorators.extend(current.decorator_list)
+            expressions.extend(current.bases + [keyword.value for keyword in current.keywords])
+            pending.extend(current.body)
+        else:
+            expressions.append(current)
+
+    used, called = set(), set()
+    for expression in expressions + decorators:
+        used.update(find_used_names(expression))
+    for expression in decorators + [child.func for expression in expressions + decorators
+                                    for child in ast.walk(expression) if isinstance(child, ast.Call)]:
+        while isinstance(expression, (ast.Attribute, ast.Call)):
+            expression = expression.value if isinstance(expression, ast.Attribute) else expression.func
+        if isinstance(expression, ast.Name):
+            called.add(expression.id)
+    return used, called
+
+
+class SymbolGraph:
+    """
+    Dependency graph of the top-level symbols of a flattened script, built once per write.
+
+    Every global assignment and definition becomes a Symbol, indexed in per-module symbol
+    tables. The preferred emission order is globals, then the definitions of the preload
+    files (in list order), then the other definitions as collected; ordered() only moves a
+    symbol earlier when something executed at load time needs it (a base class, a decorator,
+    a global calling a function and everything that function uses, ...).
+
+    Args:
+        defs (dict): Mapping from name to (node, file_path) for all definitions.
+        global_vars (list): List of AST assignment nodes for globals.
+        preload_paths (list[Path], optional): Files whose definitions come first.
+
+    Example:
+        graph = SymbolGraph(defs, global_vars)
+        graph.shake()
+        for symbol in graph.ordered():
+            print(symbol.names, symbol.file_path)
+    """
+
+    def __init__(self, defs, global_vars, preload_paths=None):
+        preload_rank = {Path(path).resolve(): rank for rank, path in enumerate(preload_paths or [])}
+        file_rank = {}  # Resolving paths is slow: once per file
+        entries = []
+        seen_nodes = set()
+        for node in global_vars or []:
+            if id(node) not in seen_nodes:  # Assignments are listed once per target
+                seen_nodes.add(id(node))
+                names = tuple(target.id for target in node.targets if isinstance(target, ast.Name))
+                entries.append((names, node, getattr(node, "flatten_file", None)))
+        def rank(item):
+            file_path = item[1][1]
+            if file_path not in file_rank:
+                file_rank[file_path] = preload_rank.get(Path(file_path).resolve(), len(preload_rank)) if preload_rank else 0
+            return file_rank[file_path]
+
+        ranked = sorted(defs.items(), key=rank)
+        entries.extend(((name,), node, file_path) for name, (node, file_path) in ranked)
+
+        self.symbols = [Symbol(names, node, file_path, position)
+                        for position, (names, node, file_path) in enumerate(entries)]
+        self.cycles = []
+        self._index()
+
+    @classmethod
+    def from_symbols(cls, symbols: list):
+        """Build a graph from symbols already in the preferred emission order (see stream_flatten)."""
+        graph = cls.__new__(cls)
+        graph.symbols = list(symbols)
+        graph.cycles = []
+        graph._index()
+        return graph
+
+    def _index(self):
+        self.by_name = defaultdict(list)
+        self.modules = defaultdict(dict)
+        for position, symbol in enumerate(self.symbols):
+            symbol.position = position
+            for name in symbol.names:
+                self.by_name[name].append(symbol)
+                self.modules[symbol.file_path][name] = symbol
+
+    def shake(self, root_names=("main",), extra_roots=None):
+        """
+        Drop the symbols that are not reachable from the roots (see shake_tree).
+
+        Globals whose value calls something, decorated definitions and classes whose body calls
+        something are kept as roots too, since executing them may have side effects.
+        """
+        queue = list(root_names) + list(extra_roots or [])
+        for symbol in self.symbols:
+            if symbol.has_call:
+                queue.extend(symbol.names)
+
+        reachable = set()
+        kept = set()
+        while queue:
+            name = queue.pop()
+            if name in reachable:
+                continue
+            reachable.add(name)
+            for symbol in self.by_name.get(name, []):
+                if symbol.position not in kept:
+                    kept.add(symbol.position)
+                    queue.extend(symbol.references)
+
+        self.symbols = [symbol for symbol in self.symbols if symbol.position in kept]
+        self._index()
+
+    def _link(self):
+        # Edges: what a symbol uses while it executes, plus everything reachable through the
+        # functions/classes it calls (they run before the rest of the script is defined)
+        for symbol in self.symbols:
+            edges = {dependency.position for name in symbol.load_references
+                     for dependency in self.by_name.get(name, ())}
+            queue = [dependency for name in symbol.called for dependency in self.by_name.get(name, ())
+                     if not dependency.is_global]
+            visited = set()
+            while queue:
+                callee = queue.pop()
+                if callee.position in visited:
+                    continue
+                visited.add(callee.position)
+                for name in callee.references:
+                    for dependency in self.by_name.get(name, ()):
+                        edges.add(dependency.position)
+                        if not dependency.is_global:
+                            queue.append(dependency)
+            edges.discard(symbol.position)
+            symbol.edges = tuple(sorted(edges))
+
+    def ordered(self) -> list:
+        """
+        Return the symbols in emission order: a depth-first topological sort, in O(V+E) once
+        the edges are linked, that keeps the preferred order wherever dependencies allow.
+        Cycles are recorded in self.cycles (as lists of symbols) and broken arbitrarily.
+        """
+        self._link()
+        self.cycles = []
+        state = [0] * len(self.symbols)  # 0: new, 1: in progress, 2: emitted
+        order = []
+        for root in range(len(self.symbols)):
+            if state[root]:
+                continue
+            state[root] = 1
+            stack = [(root, iter(self.symbols[root].edges))]
+            while stack:
+                position, edges = stack[-1]
+                for dependency in edges:
+                    if state[dependency] == 0:
+                        state[dependency] = 1
+                        stack.append((dependency, iter(self.symbols[dependency].edges)))
+                        break
+                    if state[dependency] == 1:
+                        path = [entry[0] for entry in stack]
+                        self.cycles.append([self.symbols[p] for p in path[path.index(dependency):]])
+                else:
+                    stack.pop()
+                    state[position] = 2
+                    order.append(self.symbols[position])
+        return order
+
+    def inclusion_paths(self, root_names=("main",), extra_roots=None) -> dict:
+        """
+        Explain why each symbol is part of the graph: the chain of references leading to it
+        from a root (breadth-first, so the chain is one of the shortest).
+
+        Returns:
+            dict: Symbol position -> list of names, e.g. ['main', 'load', 'DEFAULTS']. Symbols kept
+                for their side effects start their own chain, and extra roots start with
+                '<hardcoded statements>'. Symbols reached from no root are missing.
+        """
+        parents = {}
+        queue = deque()
+        for name in root_names:
+            parents.setdefault(name, None)
+            queue.append(name)
+        for name in extra_roots or []:
+            if name not in parents:
+                parents[name] = "<hardcoded statements>"
+                queue.append(name)
+        for symbol in self.symbols:
+            if symbol.has_call:
+                for name in symbol.names:
+                    if name not in parents:
+                        parents[name] = "<side effects>"
+                        queue.append(name)
+        while queue:
+            name = queue.popleft()
+            for symbol in self.by_name.get(name, ()):
+                for reference in sorted(symbol.references):
+                    if reference not in parents and reference in self.by_name:
+                        parents[reference] = name
+                        queue.append(reference)
+
+        paths = {}
+        for symbol in self.symbols:
+            name = next((name for name in symbol.names if name in parents), None)
+            if name is None:
+                continue
+            chain = [name]
+            while parents.get(chain[-1]) is not None:
+                chain.append(parents[chain[-1]])
+            paths[symbol.position] = chain[::-1]
+        return paths
+
+    def collisions(self) -> dict:
+        """Return the names bound both by a definition and by another symbol (name -> symbols)."""
+        return {name: symbols for name, symbols in self.by_name.items()
+                if len(symbols) > 1 and any(not symbol.is_global for symbol in symbols)}
+
+    def report(self):
+        """Print the name collisions and the dependency cycles found."""
+        for name, symbols in self.collisions().items():
+            places = ", ".join(str(symbol.file_path or "a global") for symbol in symbols)
+            log(f"⚠️ Name collision: '{name}' is bound by {len(symbols)} symbols ({places})")
+        for cycle in self.cycles:
+            names = " -> ".join(symbol.names[0] if symbol.names else "?" for symbol in cycle + cycle[:1])
+            log(f"⚠️ Dependency cycle between top-level symbols: {names}")
+
+
+def shake_tree(defs, global_vars, root_names=("main",), extra_roots=None):
+    """
+    Keep only the definitions and globals reachable from the root symbols.
+
+    Starting from the roots (the 'main' function by default), references are followed
+    through function and class bodies, decorators, annotations and global assignments.
+    Globals whose value calls something, decorated definitions and classes whose body calls
+    something are kept as roots too, since executing them may have side effects (see
+    has_load_time_effects).
+
+    Args:
+        defs (dict): Mapping from name to (node, file_path) for all definitions.
+        global_vars (list): List of AST assignment nodes for globals.
+        root_names (iterable[str]): Names of the symbols to start from.
+        extra_roots (set, optional): Additional names to keep (e.g. used by hardcoded statements).
+
+    Returns:
+        tuple: (defs, global_vars) restricted to the reachable symbols, in their original order.
+
+    Example:
+        defs, global_vars = shake_tree(defs, global_vars)
+    """
+    graph = SymbolGraph(defs, global_vars)
+    graph.shake(root_names, extra_roots)
+    kept_nodes = {id(symbol.node) for symbol in graph.symbols}
+    shaken_defs = {name: value for name, value in defs.items() if id(value[0]) in kept_nodes}
+    shaken_globals = [node for node in global_vars or [] if id(node) in kept_nodes]
+    return shaken_defs, shaken_globals
+
+
+def scan_file_symbols(file_path: Path):
+    """
+    Parse a file and describe it compactly for streaming mode: its imports and its symbols,
+    released from their AST (only names, references and statement index are kept).
+
+    Args:
+        file_path (Path): The file to scan.
+
+    Returns:
+        tuple: (imports, symbols) with the ast.Import / ast.ImportFrom nodes and the released Symbols.
+
+    Example:
+        imports, symbols = scan_file_symbols(Path("utils.py"))
+    """
+    tree = ast.parse(file_path.read_bytes(), filename=str(file_path))
+    symbols = []
+    for index, node in enumerate(tree.body):
+        if isinstance(node, ast.Assign):  # Global variable assignment
+            names = tuple(target.id for target in node.targets if isinstance(target, ast.Name))
+            if names:
+                symbols.append(Symbol(names, node, file_path, 0, index))
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.AsyncFunctionDef)):
+            remove_docstrings(node)
+            symbols.append(Symbol((node.name,), node, file_path, 0, index))
+    for symbol in symbols:
+        symbol.release()
+    return extract_imports(tree), symbols
+
+
+def compact_source_span(node):
+    """Keep only the part of the file source a node's span refers to, instead of the whole file."""
+    span = getattr(node, "flatten_source", None)
+    if span is None:
+        return
+    source, ranges = span
+    offsets = [item for item in ranges if not isinstance(item, str)]
+    if not offsets:
+        return
+    start, end = min(item[0] for item in offsets), max(item[1] for item in offsets)
+    node.flatten_source = (source[start:end], [item if isinstance(item, str) else (item[0] - start, item[1] - start)
+                                               for item in ranges])
+
+
+def materialize_symbols(symbols: list):
+    """
+    Re-parse the files of released symbols (one file at a time) and give the symbols their node
+    back, with its source span, as summarize_tree would have produced it.
+
+    Raises:
+        RuntimeError: If a file changed since it was scanned.
+    """
+    by_file = defaultdict(list)
+    for symbol in symbols:
+        by_file[symbol.file_path].append(symbol)
+    for file_path, file_symbols in by_file.items():
+        source = file_path.read_bytes()
+        tree = ast.parse(source, filename=str(file_path))
+        text = decode_source(source)
+        if text is not None:
+            attach_source_spans(tree, text)
+        for symbol in file_symbols:
+            node = tree.body[symbol.source_index] if symbol.source_index < len(tree.body) else None
+            if isinstance(node, ast.Assign) != symbol.is_global or getattr(node, "name", symbol.names[0]) != symbol.names[0]:
+                raise RuntimeError(f"{file_path} changed while it was being flattened, run the generator again")
+            if not symbol.is_global:
+                remove_docstrings(node)
+            compact_source_span(node)
+            if symbol.is_global:
+                node.flatten_file = file_path
+            symbol.node = node
+
+
+def stream_flatten(entry_file: Path, output_path: Path, preload_paths: list[Path] = None, hardcoded_statement=None,
+                   **options) -> str:
+    """
+    Flatten an entry point in bounded memory.
+
+    Files are scanned one at a time into compact symbols (names, references, statement index):
+    no definition AST outlives the scan of its file, and only external imports are kept. The
+    symbol graph is shaken on these compact symbols, then only the definitions that are emitted
+    are re-parsed from disk, so the peak memory follows the size of the output rather than the
+    size of the source tree. The output is the same as with collect_dependencies.
+
+    Args:
+        entry_file (Path): The path of the main entry file.
+        output_path (Path): Path to write the flattened output file (None to only return the script).
+        preload_paths (list[Path], optional): List of files whose defs should be written first.
+        hardcoded_statement (str, optional): Additional code to insert at the top of the file.
+        **options: Forwarded to write_flattened_script (see write_options).
+
+    Returns:
+        str: The flattened script.
+
+    Example:
+        stream_flatten(Path("main.py"), Path("workato_prod_main.py"), **write_options())
+    """
+    global dependency_files
+
+    preload_paths = preload_paths or []
+    external_imports = {}
+    global_symbols = []
+    def_symbols = {}
+    seen_files = set()
+    queue = deque(dict.fromkeys(preload_paths + [entry_file]))
+    with profile_phase("collect_dependencies"):
+        while queue:
+            file_path = queue.popleft()
+            if file_path in seen_files:
+                continue
+            seen_files.add(file_path)
+            with profile_phase("process_file", file_path):
+                try:
+                    imports, symbols = scan_file_symbols(file_path)
+                except Exception as e:
+                    raise FlattenError(f"Error parsing {file_path}: {e}") from e
+                for imp in imports:
+                    if collect_non_source_imports([imp]):
+                        external_imports.setdefault(ast.dump(imp), imp)
+                for symbol in symbols:
+                    if symbol.is_global:
+                        global_symbols.append(symbol)
+                        continue
+                    previous = def_symbols.get(symbol.names[0])
+                    if previous is not None:
+                        log(f"⚠️ Name collision: '{symbol.names[0]}' is defined in {previous.file_path} and "
+                              f"{file_path}, keeping the one from {file_path}")
+                    def_symbols[symbol.names[0]] = symbol
+                profile_count("files")
+                profile_count("defs", len(symbols))
+                with profile_phase("module_resolution"):
+                    queue.extend(resolve_import_paths(imports, file_path))
+    dependency_files = sorted(seen_files)
+
+    # Same preferred order as SymbolGraph: globals, then preload files definitions, then the others
+    preload_rank = {Path(path).resolve(): rank for rank, path in enumerate(preload_paths)}
+    ranked_defs = sorted(def_symbols.values(), key=lambda symbol: preload_rank.get(symbol.file_path.resolve(),
+                                                                                   len(preload_rank)))
+    graph = SymbolGraph.from_symbols(global_symbols + ranked_defs)
+    if options.get("tree_shake", True) and "main" in def_symbols:
+        extra_roots = set()
+        if hardcoded_statement:
+            try:
+                extra_roots = find_used_names(ast.parse(hardcoded_statement))
+            except SyntaxError:
+                pass
+        graph.shake(extra_roots=extra_roots)
+
+    with profile_phase("materialize_symbols"):
+        materialize_symbols(graph.symbols)
+    defs = {symbol.names[0]: (symbol.node, symbol.file_path) for symbol in graph.symbols if not symbol.is_global}
+    global_vars = [symbol.node for symbol in graph.symbols if symbol.is_global]
+    del graph, global_symbols, def_symbols, ranked_defs
+
+    with profile_phase("write_flattened_script"):
+        return write_flattened_script(list(external_imports.values()), defs, output_path,
+                                      preload_paths=preload_paths, global_vars=global_vars,
+                                      hardcoded_statement=hardcoded_statement, **options)
+
+
+def bound_names(node) -> set:
+    """
+    Return every name a scope (function, class, lambda) or any of its nested scopes binds:
+    parameters, assignment targets, imports, global/nonlocal declarations, nested definitions,
+    exception and match capture names.
+
+    Example:
+        bound_names(ast.parse("def f(a):\\n    import re\\n    b = 1").body[0])  # {'a', 're', 'b'}
+    """
+    bound = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+            bound.add(child.id)
+        elif isinstance(child, ast.arg):
+            bound.add(child.arg)
+        elif isinstance(child, (ast.Global, ast.Nonlocal)):
+            bound.update(child.names)
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+            bound.update((alias.asname or alias.name).split(".")[0] for alias in child.names)
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and child is not node:
+            bound.add(child.name)
+        elif isinstance(child, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)) and child.name:
+            bound.add(child.name)
+        elif isinstance(child, ast.MatchMapping) and child.rest:
+            bound.add(child.rest)
+    return bound
+
+
+class ConstantFolder(ast.NodeTransformer):
+    """
+    Substitute known constants, fold constant expressions and drop the branches they make
+    unreachable (see fold_definitions).
+
+    Loads of a defined name are replaced by its value, except in scopes that bind the name
+    themselves (parameter, assignment, import, global/nonlocal declaration, ...). Folding only
+    evaluates small expressions made of constants, and boolean operators are only shortened
+    from the left, so no side effect is ever dropped.
+
+    Args:
+        defines (dict): Name -> constant value.
+
+    Example:
+        folder = ConstantFolder({"DEBUG": False})
+        node = folder.visit(copy.deepcopy(node))
+    """
+
+    FOLDABLE = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.BitAnd, ast.BitOr,
+                ast.BitXor, ast.LShift, ast.RShift)
+    MAX_CONSTANT_SIZE = 256
+
+    def __init__(self, defines: dict):
+        self.defines = defines
+        self.shadowed = set()
+        self.substitutions = 0
+        self.removed_branches = 0
+
+    # Scopes: names bound in a scope hide the defines there (and in nested scopes)
+    def _visit_scope(self, node):
+        saved = self.shadowed
+        self.shadowed = saved | (bound_names(node) & self.defines.keys())
+        node = self.generic_visit(node)
+        self.shadowed = saved
+        return node
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_Lambda = _visit_scope
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load) and node.id in self.defines and node.id not in self.shadowed:
+            self.substitutions += 1
+            return ast.copy_location(ast.Constant(self.defines[node.id]), node)
+        return node
+
+    def _small(self, value) -> bool:
+        return len(repr(value)) <= self.MAX_CONSTANT_SIZE
+
+    def _evaluate(self, node):
+        # Evaluate an expression whose operands are all constants, or return None
+        try:
+            value = eval(compile(ast.fix_missing_locations(ast.Expression(node)), "<fold>", "eval"), {"__builtins__": {}})
+        except Exception:
+            return None
+        return ast.copy_location(ast.Constant(value), node) if self._small(value) else None
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.operand, ast.Constant):
+            return self._evaluate(node) or node
+        return node
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        left, right = node.left, node.right
+        if not (isinstance(left, ast.Constant) and isinstance(right, ast.Constant) and isinstance(node.op, self.FOLDABLE)):
+            return node
+        if isinstance(node.op, (ast.Pow, ast.LShift)) and not (isinstance(right.value, int) and abs(right.value) <= 64):
+            return node  # Could build a huge number
+        if isinstance(node.op, ast.Mult) and any(isinstance(operand.value, int) and operand.value > self.MAX_CONSTANT_SIZE
+                                                 for operand in (left, right)) \
+                and any(isinstance(operand.value, (str, bytes, tuple)) for operand in (left, right)):
+            return node  # Could build a huge sequence
+        return self._evaluate(node) or node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if isinstance(node.left, ast.Constant) and all(isinstance(c, ast.Constant) for c in node.comparators):
+            return self._evaluate(node) or node
+        return node
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        values = list(node.values)
+        # `True and x` is x, `False and x` is False (and the other way around for `or`)
+        while len(values) > 1 and isinstance(values[0], ast.Constant):
+            if bool(values[0].value) == isinstance(node.op, ast.Or):
+                return values[0]
+            values.pop(0)
+        if len(values) == 1:
+            return values[0]
+        node.values = values
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            self.removed_branches += 1
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_If(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            self.removed_branches += 1
+            return (node.body if node.test.value else node.orelse) or ast.copy_location(ast.Pass(), node)
+        return node
+
+    def visit_While(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant) and not node.test.value:
+            self.removed_branches += 1
+            return node.orelse or ast.copy_location(ast.Pass(), node)
+        return node
+
+    def generic_visit(self, node):
+        super().generic_visit(node)
+        # Spliced branches can leave a Pass next to other statements, or nothing at all
+        for field in ("body", "orelse", "finalbody"):
+            block = getattr(node, field, None)
+            if isinstance(block, list) and block and isinstance(block[0], ast.stmt):
+                statements = [statement for statement in block if not isinstance(statement, ast.Pass)]
+                if len(statements) != len(block):
+                    block[:] = statements or [ast.Pass()]
+        return node
+
+
+def parse_defines(assignments: list[str]) -> dict:
+    """
+    Parse --define NAME=value assignments into name -> value source. Values are Python literals;
+    anything else is taken as a string.
+
+    Example:
+        parse_defines(["DEBUG=False", "ENV=prod"])  # {'DEBUG': 'False', 'ENV': "'prod'"}
+    """
+    defines = {}
+    for assignment in assignments:
+        name, separator, value = assignment.partition("=")
+        if not separator or not name.strip().isidentifier():
+            raise ValueError(f"Invalid --define '{assignment}', expected NAME=value")
+        try:
+            ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            value = repr(value)
+        defines[name.strip()] = value
+    return defines
+
+
+def fold_definitions(defs: dict, global_vars: list, defines: dict):
+    """
+    Apply constant folding (see ConstantFolder) to the collected definitions and globals.
+
+    Assignments of a defined global are replaced by the defined value. Only immutable values
+    (None, numbers, strings, bytes and tuples of them) are substituted where they are used;
+    other values only replace the assignment. Rewritten nodes are unparsed on emission.
+
+    Args:
+        defs (dict): Mapping from name to (node, file_path) for all definitions.
+        global_vars (list): List of AST assignment nodes for globals.
+        defines (dict): Name -> value source, as returned by parse_defines.
+
+    Returns:
+        tuple: (defs, global_vars) with the folded nodes.
+
+    Example:
+        defs, global_vars = fold_definitions(defs, global_vars, {"DEBUG": "False"})
+    """
+    values = {name: ast.literal_eval(source) for name, source in defines.items()}
+
+    def immutable(value):
+        if isinstance(value, tuple):
+            return all(immutable(item) for item in value)
+        return value is None or isinstance(value, (bool, int, float, complex, str, bytes))
+
+    folder = ConstantFolder({name: value for name, value in values.items() if immutable(value)})
+
+    def fold(node):
+        before = ast.dump(node)
+        folded = folder.visit(copy.deepcopy(node))
+        if ast.dump(folded) == before:
+            return node
+        return forget_source_span(ast.fix_missing_locations(folded))
+
+    folded_globals = {}
+    for node in global_vars or []:
+        if id(node) in folded_globals:
+            continue
+        names = [target.id for target in node.targets if isinstance(target, ast.Name)]
+        if len(node.targets) == 1 and names and names[0] in values:
+            replacement = forget_source_span(copy.deepcopy(node))
+            replacement.value = ast.parse(defines[names[0]], mode="eval").body
+            folded_globals[id(node)] = ast.fix_missing_locations(replacement)
+        else:
+            folded_globals[id(node)] = fold(node)
+    defs = {name: (fold(node), file_path) for name, (node, file_path) in defs.items()}
+    global_vars = [folded_globals[id(node)] for node in global_vars or []]
+
+    log(f"[🧮] Constant folding: {folder.substitutions} substitution(s), "
+          f"{folder.removed_branches} branch(es) removed")
+    return defs, global_vars
+
+
+INSTRUMENTATION_SOURCE = """
+import functools as _flatten_functools
+import inspect as _flatten_inspect
+import time as _flatten_time
+
+_flatten_timings = {}
+
+
+def _flatten_timed(function):
+    if _flatten_inspect.isgeneratorfunction(function) or _flatten_inspect.isasyncgenfunction(function):
+        return function  # Only the creation of the generator could be timed
+    stats = _flatten_timings.setdefault(function.__qualname__, [0, 0.0, 0.0])
+    clock = _flatten_time.perf_counter
+
+    def record(elapsed):
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+
+    if _flatten_inspect.iscoroutinefunction(function):
+        @_flatten_functools.wraps(function)
+        async def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                record(clock() - start)
+        return timed
+
+    @_flatten_functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(clock() - start)
+    return timed
+
+
+def _flatten_timing_report():
+    rows = sorted((item for item in _flatten_timings.items() if item[1][0]), key=lambda item: -item[1][1])
+    lines = [f"{'function':<48} {'calls':>8} {'total ms':>10} {'mean ms':>10} {'max ms':>10}"]
+    for name, (calls, total, longest) in rows:
+        lines.append(f"{name:<48} {calls:>8} {total * 1000:>10.3f} {total / calls * 1000:>10.3f} "
+                     f"{longest * 1000:>10.3f}")
+    return "\\n".join(lines)
+
+
+def _flatten_main(function):
+    timed = _flatten_timed(function)
+
+    @_flatten_functools.wraps(function)
+    def main(*args, **kwargs):
+        for stats in _flatten_timings.values():
+            stats[:] = [0, 0.0, 0.0]
+        try:
+            return timed(*args, **kwargs)
+        finally:
+            print(_flatten_timing_report())
+    return main
+"""
+
+
+def instrument_definition(node):
+    """
+    Wrap an emitted function, or every method of an emitted class, with the timer and call
+    counter of INSTRUMENTATION_SOURCE.
+
+    The wrapper is added as the innermost decorator, so it times the function itself and
+    still works under staticmethod, classmethod, property or registering decorators. The
+    top-level main also prints the timing table (calls, total/mean/max time per function)
+    when it returns; _flatten_timing_report() returns the same table as a string.
+
+    Args:
+        node (ast.AST): A top-level definition.
+
+    Returns:
+        ast.AST: An instrumented copy of the node (unparsed on emission), or the node itself
+            when there is nothing to time.
+
+    Example:
+        node = instrument_definition(ast.parse("def f(): pass").body[0])
+        # @_flatten_timed
+        # def f(): ...
+    """
+    if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return node
+    node = forget_source_span(copy.deepcopy(node))
+
+    def wrap(definition, decorator):
+        definition.decorator_list.append(ast.Name(id=decorator, ctx=ast.Load()))
+
+    def wrap_methods(class_node):
+        for statement in class_node.body:
+            if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                wrap(statement, "_flatten_timed")
+            elif isinstance(statement, ast.ClassDef):
+                wrap_methods(statement)
+
+    if isinstance(node, ast.ClassDef):
+        wrap_methods(node)
+    else:
+        wrap(node, "_flatten_main" if node.name == "main" else "_flatten_timed")
+    return ast.fix_missing_locations(node)
+
+
+DEFERRED_SOURCE = """
+import threading as _flatten_threading
+
+_FLATTEN_DEFERRED = {}
+_flatten_deferred_lock = _flatten_threading.Lock()
+
+
+def _flatten_compile_deferred(name):
+    namespace = globals()
+    with _flatten_deferred_lock:
+        source = _FLATTEN_DEFERRED.pop(name, None)
+        if source is not None:
+            exec(compile(source, "<deferred " + name + ">", "exec"), namespace)
+    return namespace[name]
+
+
+def _flatten_deferred(name, source):
+    def stub(*args, **kwargs):
+        return _flatten_compile_deferred(name)(*args, **kwargs)
+
+    _FLATTEN_DEFERRED[name] = source
+    stub.__name__ = stub.__qualname__ = name
+    return stub
+"""
+
+# Comment marking a function to defer, on its def line or the line above
+DEFER_MARKER = "# flatten: defer"
+
+
+def is_deferrable(node, file_path: Path, text: str, threshold: int = 0) -> bool:
+    """
+    Tell whether a definition can and should be emitted behind a deferred compilation stub.
+
+    Only undecorated top-level functions (other than main) whose defaults are constants are
+    deferred, so that nothing observable happens at definition time. They are deferred when
+    marked with DEFER_MARKER in the sources, or when their emitted text is larger than `threshold`
+    bytes (0 = marked functions only).
+
+    Args:
+        node (ast.AST): The emitted definition.
+        file_path (Path): The file it comes from.
+        text (str): Its emitted source.
+        threshold (int, optional): Size in bytes above which functions are deferred.
+
+    Returns:
+        bool: True to emit it with deferred_stub.
+
+    Example:
+        is_deferrable(node, Path("backfill.py"), node_source(node), threshold=4096)
+    """
+    if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) or node.decorator_list or node.name == "main":
+        return False
+    defaults = node.args.defaults + [default for default in node.args.kw_defaults if default is not None]
+    if not all(isinstance(default, ast.Constant) for default in defaults):
+        return False
+    if threshold and len(text.encode()) > threshold:
+        return True
+    if not file_path:
+        return False
+    linecache.checkcache(str(file_path))  # The file may have changed since the last build (watch, daemon)
+    lines = [linecache.getline(str(file_path), number) for number in (node.lineno - 1, node.lineno)]
+    return any(DEFER_MARKER in line for line in lines)
+
+
+def deferred_stub(name: str, text: str) -> str:
+    """
+    Return the deferred form of a function: a stub made at runtime from its source string, which
+    compiles it and binds the real function on first call (see DEFERRED_SOURCE). The stub costs
+    one call expression and a string constant to compile.
+
+    Example:
+        deferred_stub("backfill", "def backfill(rows):\\n    ...")
+        # backfill = _flatten_deferred('backfill', 'def backfill(rows):\\n    ...')
+    """
+    return f"{name} = _flatten_deferred({name!r}, {text!r})"
+
+
+# re functions taking a pattern first: the position of their flags argument (None: re.compile)
+REGEX_FUNCTIONS = {"compile": 1, "match": 2, "search": 2, "fullmatch": 2, "findall": 2, "finditer": 2, "split": 3,
+                   "sub": 4, "subn": 4}
+
+# Smallest number of constants in a dict/list/set literal worth hoisting
+HOIST_MIN_ITEMS = 3
+
+# Calls and methods that only read the literal passed to them
+READ_ONLY_CALLS = {"len", "list", "tuple", "set", "frozenset", "dict", "sorted", "sum", "min", "max", "any", "all",
+                   "enumerate", "zip", "iter", "reversed"}
+READ_ONLY_METHODS = {"get", "keys", "values", "items", "copy", "count", "index"}
+
+
+def own_nodes(function):
+    """Yield the nodes of a function that run in its own scope (not in nested functions, lambdas or classes)."""
+    pending = list(ast.iter_child_nodes(function))
+    while pending:
+        node = pending.pop()
+        yield node
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+            pending.extend(ast.iter_child_nodes(node))
+
+
+class ConstantHoister:
+    """
+    Hoist the constant regex compilations and the constant container literals of emitted
+    functions into module-level constants, identical ones being shared across files.
+
+    - `re.compile(PATTERN, FLAGS)` becomes a `_FLATTEN_RE_<n>` constant, and
+      `re.match(PATTERN, text, FLAGS)` (search, sub, split, ...) becomes `_FLATTEN_RE_<n>.match(text)`,
+      when the pattern is a literal and the flags are literals or `re.` flags.
+    - dict/list/set literals of at least HOIST_MIN_ITEMS immutable constants become a
+      `_FLATTEN_CONST_<n>` constant when they are provably only read: used in place by a
+      subscript, comparison, loop, unpacking, READ_ONLY_CALLS or READ_ONLY_METHODS, or
+      assigned once to a local only used that way.
+
+    Constant strings, tuples and frozensets are left alone: they already are constants of the
+    code objects, and reading a module global would be slower.
+
+    Args:
+        imports (iterable): The import nodes of the output, to know the names bound to `re`.
+
+    Example:
+        hoister = ConstantHoister(imports)
+        emitted_defs = [hoister.hoist(node) for node in emitted_defs]
+        statements = hoister.statements()  # [_FLATTEN_RE_0 = re.compile('\\\\d+'), ...]
+    """
+
+    def __init__(self, imports):
+        self.regex_modules = {alias.asname or alias.name for node in imports if isinstance(node, ast.Import)
+                              for alias in node.names if alias.name == "re"}
+        self.hoisted = {}  # ast.dump of the value -> (name, value)
+        self.uses = 0
+
+    def _constant_name(self, prefix: str, value) -> str:
+        key = ast.dump(value)
+        if key not in self.hoisted:
+            count = sum(name.startswith(prefix) for name, _ in self.hoisted.values())
+            self.hoisted[key] = (f"{prefix}{count}", value)
+        self.uses += 1
+        return self.hoisted[key][0]
+
+    def statements(self) -> list:
+        """Return the module-level assignments of the hoisted constants."""
+        return [ast.fix_missing_locations(ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=value))
+                for name, value in self.hoisted.values()]
+
+    # Regexes
+    def _static_flags(self, node, module: str) -> bool:
+        if isinstance(node, ast.Constant):
+            return isinstance(node.value, int)
+        if isinstance(node, ast.Attribute):
+            return isinstance(node.value, ast.Name) and node.value.id == module and node.attr.isupper()
+        return isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr) and \
+            self._static_flags(node.left, module) and self._static_flags(node.right, module)
+
+    def _regex_replacement(self, call, shadowed: set):
+        function = call.func
+        if not (isinstance(function, ast.Attribute) and isinstance(function.value, ast.Name)
+                and function.value.id in self.regex_modules and function.value.id not in shadowed
+                and function.attr in REGEX_FUNCTIONS):
+            return None
+        module, flags_position = function.value.id, REGEX_FUNCTIONS[function.attr]
+        args, keywords = list(call.args), [keyword for keyword in call.keywords if keyword.arg != "flags"]
+        if not args or any(isinstance(arg, ast.Starred) for arg in args) or any(k.arg is None for k in keywords):
+            return None
+        if not (isinstance(args[0], ast.Constant) and isinstance(args[0].value, (str, bytes))):
+            return None
+        if len(args) > flags_position + 1:
+            return None
+        flags = [keyword.value for keyword in call.keywords if keyword.arg == "flags"]
+        if len(args) == flags_position + 1:
+            flags.append(args.pop())
+        if len(flags) > 1 or not all(self._static_flags(flag, module) for flag in flags):
+            return None
+        if function.attr == "compile" and keywords:
+            return None
+        compiled = ast.Call(func=ast.Attribute(value=ast.Name(id=module, ctx=ast.Load()), attr="compile",
+                                               ctx=ast.Load()),
+                            args=[copy.deepcopy(args[0])] + [copy.deepcopy(flag) for flag in flags], keywords=[])
+        try:  # An invalid pattern must keep failing when it is used, not when the script loads
+            eval(compile(ast.fix_missing_locations(ast.Expression(copy.deepcopy(compiled))), "<hoist>", "eval"),
+                 {module: re})
+        except Exception:
+            return None
+        name = ast.Name(id=self._constant_name("_FLATTEN_RE_", compiled), ctx=ast.Load())
+        if function.attr == "compile":
+            return name
+        return ast.Call(func=ast.Attribute(value=name, attr=function.attr, ctx=ast.Load()), args=args[1:],
+                        keywords=keywords)
+
+    # Literals
+    @staticmethod
+    def _immutable_constant(node) -> bool:
+        if isinstance(node, ast.Tuple):
+            return all(ConstantHoister._immutable_constant(element) for element in node.elts)
+        return isinstance(node, ast.Constant)
+
+    def _hoistable_literal(self, node) -> bool:
+        if isinstance(node, (ast.List, ast.Set)):
+            items = node.elts
+        elif isinstance(node, ast.Dict):
+            if None in node.keys:
+                return False
+            items = node.keys + node.values
+        else:
+            return False
+        return len(items) >= HOIST_MIN_ITEMS and all(self._immutable_constant(item) for item in items)
+
+    @staticmethod
+    def _read_only(node, parents: dict) -> bool:
+        parent = parents.get(node)
+        if isinstance(parent, ast.Subscript):
+            return parent.value is node and isinstance(parent.ctx, ast.Load)
+        if isinstance(parent, ast.Compare):
+            return not any(isinstance(op, (ast.Is, ast.IsNot)) for op in parent.ops)
+        if isinstance(parent, (ast.For, ast.AsyncFor, ast.comprehension)):
+            return parent.iter is node
+        if isinstance(parent, ast.Starred):
+            return isinstance(parents.get(parent), (ast.Call, ast.List, ast.Tuple, ast.Set))
+        if isinstance(parent, ast.Dict):
+            return any(key is None and value is node for key, value in zip(parent.keys, parent.values))
+        if isinstance(parent, ast.Attribute):
+            call = parents.get(parent)
+            return parent.attr in READ_ONLY_METHODS and isinstance(call, ast.Call) and call.func is parent
+        if isinstance(parent, ast.Call):
+            return node in parent.args and isinstance(parent.func, ast.Name) and parent.func.id in READ_ONLY_CALLS
+        return False
+
+    def _literal_replacements(self, function, parents: dict) -> dict:
+        replacements = {}
+        names = defaultdict(list)
+        declared = set()
+        for node in ast.walk(function):
+            if isinstance(node, ast.Name):
+                names[node.id].append(node)
+            elif isinstance(node, ast.arg):
+                declared.add(node.arg)
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                declared.update(node.names)
+        for node in own_nodes(function):
+            if not self._hoistable_literal(node):
+                continue
+            parent = parents.get(node)
+            if not self._read_only(node, parents):
+                # Else it must be assigned once to a local only read in place
+                if not (isinstance(parent, ast.Assign) and parent.value is node and len(parent.targets) == 1
+                        and isinstance(parent.targets[0], ast.Name) and parent.targets[0].id not in declared):
+                    continue
+                target = parent.targets[0]
+                if not all(use is target or isinstance(use.ctx, ast.Load) and self._read_only(use, parents)
+                           for use in names[target.id]):
+                    continue
+            name = self._constant_name("_FLATTEN_CONST_", copy.deepcopy(node))
+            replacements[id(node)] = ast.Name(id=name, ctx=ast.Load())
+        return replacements
+
+    def hoist(self, node):
+        """
+        Return a copy of a top-level definition with its constants replaced by hoisted names
+        (unparsed on emission), or the node itself when nothing was hoisted.
+        """
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            return node
+        original, node = node, copy.deepcopy(node)
+        parents = {child: parent for parent in ast.walk(node) for child in ast.iter_child_nodes(parent)}
+        replacements = {}
+        functions = [item for item in ast.walk(node) if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        for function in functions:
+            shadowed = bound_names(function) & self.regex_modules
+            replacements.update(self._literal_replacements(function, parents))
+            for item in own_nodes(function):
+                if isinstance(item, ast.Call):
+                    replacement = self._regex_replacement(item, shadowed)
+                    if replacement is not None:
+                        replacements[id(item)] = replacement
+        if not replacements:
+            return original
+
+        class Replace(ast.NodeTransformer):
+            def visit(self, item):
+                if id(item) in replacements:
+                    # The arguments kept by a rewritten regex call can hold other hoisted parts
+                    return self.generic_visit(ast.copy_location(replacements[id(item)], item))
+                return super().visit(item)
+
+        return forget_source_span(ast.fix_missing_locations(Replace().visit(node)))
+
+
+def strip_annotations(function):
+    """
+    Remove the type annotations of a function (in place) where they have no runtime effect.
+
+    Argument and return annotations are dropped unless the function is decorated (a decorator
+    may introspect them, e.g. functools.singledispatch), and annotated assignments in the body
+    become plain assignments (or disappear when they have no value). Class-level annotations
+    are kept since dataclasses and similar rely on them.
+
+    Args:
+        function (ast.FunctionDef or ast.AsyncFunctionDef): The function to strip.
+    """
+    if not function.decorator_list:
+        arguments = function.args
+        for arg in arguments.posonlyargs + arguments.args + arguments.kwonlyargs + [arguments.vararg, arguments.kwarg]:
+            if arg is not None:
+                arg.annotation = None
+        function.returns = None
+
+    class AnnotationRemover(ast.NodeTransformer):
+        def visit_AnnAssign(self, node):
+            if node.value is None:
+                return None
+            return ast.copy_location(ast.Assign(targets=[node.target], value=node.value), node)
+
+        def visit_FunctionDef(self, node):
+            if node is function:
+                return self.generic_visit(node)
+            return node  # Nested functions are stripped on their own
+
+        visit_AsyncFunctionDef = visit_FunctionDef
+
+        def visit_ClassDef(self, node):
+            return node
+
+        def generic_visit(self, node):
+            super().generic_visit(node)
+            if isinstance(getattr(node, "body", None), list) and not node.body:
+                node.body.append(ast.Pass())
+            return node
+
+    AnnotationRemover().visit(function)
+
+
+def shorten_local_names(function, reserved: set):
+    """
+    Rename the local variables of a function (in place) to short names.
+
+    Only names bound in the function's own scope are renamed (see scope_bindings), never a name
+    declared global or nonlocal anywhere in it. Parameters are never renamed (callers may pass
+    them by keyword), and functions using locals()/vars()/eval()/exec(), match statements or
+    nested classes (whose attributes would be renamed too) are left untouched. Nested scopes
+    are renamed consistently with the function, so closures keep working.
+
+    Args:
+        function (ast.FunctionDef or ast.AsyncFunctionDef): The function to rename locals of.
+        reserved (set): Names that must not be used as new names (module-level names).
+    """
+    names_in_scope = set()
+    arg_names = set()
+    bound = set()
+    for child in ast.walk(function):
+        if isinstance(child, (ast.Match, ast.ClassDef)):
+            return
+        if isinstance(child, ast.Name):
+            names_in_scope.add(child.id)
+            if not isinstance(child.ctx, ast.Load):
+                bound.add(child.id)
+        elif isinstance(child, ast.arg):
+            arg_names.add(child.arg)
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+            arg_names.update((alias.asname or alias.name).split('.')[0] for alias in child.names)
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and child is not function:
+            arg_names.add(child.name)
+        elif isinstance(child, ast.ExceptHandler) and child.name:
+            bound.add(child.name)
+            names_in_scope.add(child.name)
+    if names_in_scope & {"locals", "vars", "eval", "exec"}:
+        return
+
+    # Only rename names bound directly in this function (not only in a nested scope)
+    own, declared = scope_bindings(function)
+    candidates = sorted((own & bound) - arg_names - declared)
+
+    taken = names_in_scope | arg_names | reserved | set(dir(builtins))
+    renames = {}
+    counter = 0
+    for name in candidates:
+        while True:
+            short = f"_{counter}"
+            counter += 1
+            if short not in taken:
+                break
+        if len(short) < len(name):
+            renames[name] = short
+    if not renames:
+        return
+
+    for child in ast.walk(function):
+        if isinstance(child, ast.Name) and child.id in renames:
+            child.id = renames[child.id]
+        elif isinstance(child, ast.ExceptHandler) and child.name in renames:
+            child.name = renames[child.name]
+
+
+def collapse_blank_lines(source: str) -> str:
+    """
+    Remove blank lines from Python source, except inside string literals.
+
+    Example:
+        collapse_blank_lines("x = 1\n\n\ny = 2\n")  # 'x = 1\ny = 2\n'
+    """
+    blank_lines = set()
+    for token in tokenize.generate_tokens(io.StringIO(source).readline):
+        if token.type == tokenize.NL and not token.line.strip():
+            blank_lines.add(token.start[0])
+    return "".join(line for number, line in enumerate(source.splitlines(keepends=True), 1)
+                   if number not in blank_lines)
+
+
+def minify_source(source: str, shorten_names: bool = False) -> str:
+    """
+    Minify Python source: drop comments, runtime-free type annotations and blank lines, and
+    optionally shorten local variable names (see strip_annotations and shorten_local_names).
+
+    Args:
+        source (str): The source to minify.
+        shorten_names (bool, optional): Also rename function locals to short names.
+
+    Returns:
+        str: The minified source.
+
+    Example:
+        small = minify_source(open("workato_prod_main.py").read(), shorten_names=True)
+    """
+    tree = ast.parse(source)
+    reserved = find_used_names(tree)
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            strip_annotations(node)
+    if shorten_names:
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                shorten_local_names(node, reserved)
+    return collapse_blank_lines(ast.unparse(ast.fix_missing_locations(tree)) + "\n")
+
+
+def measure_compile_time(source: str, repeat: int = 5) -> float:
+    """Return the best time (seconds) to compile the given source, out of `repeat` runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compile(source, "<flattened>", "exec")
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+PACK_MODES = ["none", "auto", "zlib", "marshal"]
+
+PACKED_BOOTSTRAP = {
+    "zlib": """
+import base64 as _flatten_base64
+import zlib as _flatten_zlib
+
+_FLATTENED_BODY = (
+{body}
+)
+
+exec(compile(_flatten_zlib.decompress(_flatten_base64.b64decode(_FLATTENED_BODY)), "<flattened>", "exec"))
+del _FLATTENED_BODY
+""",
+    "marshal": """
+import base64 as _flatten_base64
+import marshal as _flatten_marshal
+import sys as _flatten_sys
+import zlib as _flatten_zlib
+
+if _flatten_sys.version_info[:2] != {version}:
+    raise RuntimeError("This packed script was built for Python {version_name}, "
+                       "regenerate it for Python " + _flatten_sys.version.split()[0])
+
+_FLATTENED_BODY = (
+{body}
+)
+
+exec(_flatten_marshal.loads(_flatten_zlib.decompress(_flatten_base64.b64decode(_FLATTENED_BODY))))
+del _FLATTENED_BODY
+""",
+}
+
+
+def pack_script(script: str, mode: str = "zlib") -> str:
+    """
+    Pack a flattened script into a small bootstrap that decompresses and executes its body.
+
+    The body (everything after the top file comment) is zlib-compressed and base64-encoded.
+    With "marshal" it is compiled first and the code object is marshalled: nothing is compiled
+    at startup, but the output only runs on the Python version of the generator (checked by
+    the bootstrap).
+
+    Args:
+        script (str): The flattened script.
+        mode (str): "zlib" or "marshal".
+
+    Returns:
+        str: The packed script, with the same top file comment.
+
+    Example:
+        packed = pack_script(script, "marshal")
+    """
+    header = ON_TOP_FILE_COMMENT.strip() + "\n"
+    body = script[len(header):] if script.startswith(header) else script
+    payload = body.encode() if mode == "zlib" else marshal.dumps(compile(body, "<flattened>", "exec"))
+    encoded = base64.b64encode(zlib.compress(payload, 9)).decode()
+    lines = "\n".join(f'    "{encoded[start:start + 96]}"' for start in range(0, len(encoded), 96))
+    version = tuple(sys.version_info[:2])
+    bootstrap = PACKED_BOOTSTRAP[mode].format(body=lines, version=version, version_name="%d.%d" % version)
+    return header + bootstrap
+
+
+def measure_packed_startup(packed: str, repeat: int = 5) -> float:
+    """
+    Return the best time (seconds) for a packed script to get its body ready to run, out of
+    `repeat` runs: compiling the bootstrap, then decoding, decompressing and compiling (or
+    unmarshalling) the body. The body itself is not executed.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        exec(compile(packed, "<flattened>", "exec"), {"__name__": "__flatten_measure__", "exec": lambda code: None})
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def pack_output(script: str, mode: str, threshold: int) -> str:
+    """
+    Apply the packed output mode, after measuring packed against plain output.
+
+    The paste size and the startup time (compile time, see measure_packed_startup) of both are printed. "auto" packs
+    with zlib when the plain script is larger than `threshold` bytes and packing makes it smaller;
+    "zlib" and "marshal" always pack, with a warning when it does not pay off.
+
+    Args:
+        script (str): The flattened script.
+        mode (str): "none", "auto", "zlib" or "marshal".
+        threshold (int): Size in bytes above which "auto" packs.
+
+    Returns:
+        str: The script to write (packed or not).
+
+    Example:
+        script = pack_output(script, "auto", 256 * 1024)
+    """
+    if mode == "none":
+        return script
+    packed = pack_script(script, "zlib" if mode == "auto" else mode)
+    plain_bytes, packed_bytes = len(script.encode()), len(packed.encode())
+    plain_startup, packed_startup = measure_compile_time(script), measure_packed_startup(packed)
+    log(f"[📦] Packed ({'zlib' if mode == 'auto' else mode}): {plain_bytes / 1024:.1f} KiB -> "
+          f"{packed_bytes / 1024:.1f} KiB, startup {plain_startup * 1000:.2f} ms -> {packed_startup * 1000:.2f} ms")
+
+    if mode == "auto":
+        if plain_bytes <= threshold or packed_bytes >= plain_bytes:
+            log(f"[📦] Kept the plain output ({plain_bytes / 1024:.1f} KiB, packing above "
+                  f"{threshold / 1024:.0f} KiB when it makes it smaller)")
+            return script
+        return packed
+    if packed_bytes >= plain_bytes:
+        log("⚠️ Warning: The packed output is not smaller than the plain one.")
+    if packed_startup > plain_startup * 1.5:
+        log("⚠️ Warning: The packed output is noticeably slower to start than the plain one.")
+    if mode == "marshal":
+        log(f"⚠️ Warning: The marshalled output only runs on Python {sys.version_info[0]}.{sys.version_info[1]}.")
+    return packed
+
+
+def bundle_item(kind: str, name: str, text: str, file_path: Path = None, reason: list = None) -> dict:
+    """Describe one part of a flattened script for the bundle analyzer (see analyze_bundle)."""
+    try:
+        compile_ms = measure_compile_time(text, repeat=3) * 1000
+    except SyntaxError:  # E.g. a method-less fragment; its cost is counted with the whole script
+        compile_ms = None
+    return {
+        "kind": kind,
+        "name": name,
+        "file": relative_source_path(file_path) if file_path else None,
+        "bytes": len(text.encode()),
+        "compile_ms": compile_ms,
+        "reason": " -> ".join(reason) if reason else None,
+    }
+
+
+BUNDLE_SORT_KEYS = {
+    "size": lambda item: -item["bytes"],
+    "compile": lambda item: -(item["compile_ms"] or 0),
+    "file": lambda item: (item["file"] or "", -item["bytes"]),
+    "name": lambda item: item["name"],
+}
+
+
+def analyze_bundle(items: list, script: str, sort: str = "size") -> dict:
+    """
+    Build the bundle report of a flattened script from its parts.
+
+    Args:
+        items (list[dict]): Parts of the script (see bundle_item).
+        script (str): The script as written (its size can differ from the sum of the parts
+            when it is minified).
+        sort (str): "size" (default), "compile", "file" or "name".
+
+    Returns:
+        dict: {"total_bytes", "script_bytes", "compile_ms", "items", "files"}, files holding
+            the bytes, compile time and number of items contributed by each source file.
+
+    Example:
+        report = analyze_bundle(items, script, sort="compile")
+    """
+    files = defaultdict(lambda: {"bytes": 0, "compile_ms": 0.0, "items": 0})
+    for item in items:
+        origin = files[item["file"] or "<generated>"]
+        origin["bytes"] += item["bytes"]
+        origin["compile_ms"] += item["compile_ms"] or 0
+        origin["items"] += 1
+    return {
+        "total_bytes": sum(item["bytes"] for item in items),
+        "script_bytes": len(script.encode()),
+        "compile_ms": measure_compile_time(script, repeat=3) * 1000,
+        "items": sorted(items, key=BUNDLE_SORT_KEYS[sort]),
+        "files": dict(sorted(files.items(), key=lambda entry: -entry[1]["bytes"])),
+    }
+
+
+def format_bundle_report(report: dict, limit: int = None) -> str:
+    """
+    Format a bundle report as text: the size per source file, then every item in report order.
+
+    Args:
+        report (dict): See analyze_bundle.
+        limit (int, optional): Maximum number of items listed.
+    """
+    lines = [f"📦 Bundle: {report['script_bytes'] / 1024:.1f} KiB, compile {report['compile_ms']:.2f} ms",
+             "", f"{'bytes':>9} {'share':>6} {'compile':>9} {'items':>6}  file"]
+    for file_name, origin in report["files"].items():
+        share = origin["bytes"] / max(report["total_bytes"], 1)
+        lines.append(f"{origin['bytes']:>9} {share:>6.1%} {origin['compile_ms']:>7.2f}ms {origin['items']:>6}  {file_name}")
+    lines += ["", f"{'bytes':>9} {'compile':>9}  {'kind':<10} {'name':<40} {'file':<30} reached from"]
+    for item in report["items"][:limit]:
+        compile_ms = f"{item['compile_ms']:.2f}ms" if item["compile_ms"] is not None else "-"
+        lines.append(f"{item['bytes']:>9} {compile_ms:>9}  {item['kind']:<10} {item['name'][:40]:<40} "
+                     f"{(item['file'] or '-')[:30]:<30} {item['reason'] or '-'}")
+    if limit is not None and len(report["items"]) > limit:
+        lines.append(f"... {len(report['items']) - limit} more item(s)")
+    return "\n".join(lines)
+
+
+def write_bundle_report(report: dict, output_path: Path):
+    """Write a bundle report next to an output (<output>.bundle.json and <output>.bundle.txt) and print its top."""
+    output_path = Path(output_path)
+    json_path = output_path.with_name(output_path.name + ".bundle.json")
+    json_path.write_text(json.dumps(report, indent=2) + "\n")
+    output_path.with_name(output_path.name + ".bundle.txt").write_text(format_bundle_report(report) + "\n")
+    log(format_bundle_report(report, limit=15))
+    log(f"[📦] Bundle report written to: {json_path}")
+
+
+def write_flattened_script(imports, defs, output_path, preload_paths=None, global_vars=None, hardcoded_statement=None,
+                           import_cleanup="builtin", tree_shake=True, emit_mode="source", lazy_imports=False,
+                           eager_modules=(), minify=False, minify_names=False, analyze=False, analyze_sort="size",
+                           defines=None, instrument=False, pack="none", pack_threshold=256 * 1024,
+                           defer=False, defer_threshold=0, hoist=False):
     """
     Write a flattened script to the output file, including imports, global variables,
-    and all required definitions in the proper order. Removes unused imports at the end.
+    and all required definitions in the proper order. Removes unused imports and variables.
+
+    Globals and definitions are emitted in the topological order of their SymbolGraph, so
+    a symbol always comes after what it needs when it is defined; name collisions and
+    dependency cycles are reported.
+
+    The script is built in memory and written to disk once. With the default "builtin"
+    cleanup, dead local assignments are pruned from the AST and unused imports are dropped
+    before writing; "autoflake" keeps the former behavior of running autoflake on the
+    written file, and "none" disables the cleanup.
 
     Args:
         imports (set): Set of AST import nodes used in the project.
         defs (dict): Mapping from name to (node, file_path) for all definitions.
-        output_path (str or Path): Path to write the flattened output file.
-        preload_paths (list[Path], optional): List of files whose defs should be written first.
+        output_path (str or Path): Path to write the flattened output file (None to only return the script).
+        preload_paths (list[Path], optional): List of files whose defs should be written first
+            when their dependencies allow it (the order is computed by SymbolGraph).
         global_vars (list, optional): List of AST assignment nodes for globals.
         hardcoded_statement (str, optional): Additional code to insert at the top of the file.
+        import_cleanup (str, optional): "builtin" (default), "autoflake" or "none".
+        tree_shake (bool, optional): Only emit what is reachable from the 'main' function (default True).
+        emit_mode (str, optional): "source" (default) copies each definition's original source
+            (docstrings cut out), "unparse" regenerates it with ast.unparse. Rewritten nodes are
+            always unparsed.
+        lazy_imports (bool, optional): Defer third-party imports until they are used (see plan_lazy_imports).
+        eager_modules (iterable[str], optional): Top-level modules kept eager in lazy_imports mode.
+        minify (bool, optional): Minify everything after the top file comment (see minify_source)
+            and print the size and compile time before/after.
+        minify_names (bool, optional): Also shorten local variable names when minifying.
+        analyze (bool, optional): Build a bundle report (size, origin, inclusion reason and compile
+            cost of every emitted part, see analyze_bundle) into bundle_report, and write it next
+            to the output.
+        analyze_sort (str, optional): Order of the bundle report items ("size", "compile", "file", "name").
+        defines (dict, optional): Globals fixed at generation time (name -> value source). They are
+            substituted and folded and the dead branches removed before tree shaking, so definitions
+            only used by those branches are dropped too (see fold_definitions).
+        instrument (bool, optional): Time every emitted function and method and print a timing
+            table when main returns (see instrument_definition). Instrumented definitions are unparsed.
+        pack (str, optional): "none" (default), or write a bootstrap executing the compressed body:
+            "zlib", "marshal" (precompiled, for the generator's Python version only) or "auto"
+            (zlib above pack_threshold when smaller). Packed and plain output are measured (see pack_output).
+        pack_threshold (int, optional): Size in bytes above which "auto" packs.
+        defer (bool, optional): Emit the functions marked with DEFER_MARKER, or larger than
+            defer_threshold bytes, as source strings behind a stub compiling them on first call
+            (see is_deferrable and deferred_stub). With instrument, deferred functions are timed
+            once compiled.
+        defer_threshold (int, optional): Size in bytes above which functions are deferred (0 = marked only).
+        hoist (bool, optional): Move constant regex compilations and read-only container literals
+            of the functions to module-level constants, shared across files (see ConstantHoister).
+
+    Returns:
+        str: The flattened script, as written.
 
     Example:
         write_flattened_script(imports, defs, "flattened.py", [Path("utils.py")])
     """
-    preload_paths = preload_paths or []
-    preload_paths = [Path(p).resolve() for p in preload_paths]
+    global bundle_report
 
-    # Group by file
-    from collections import defaultdict
-    file_to_defs = defaultdict(list)
-    for name, (node, file_path) in defs.items():
-        file_to_defs[file_path].append(node)
+    if defines:
+        with profile_phase("fold_constants"):
+            defs, global_vars = fold_definitions(defs, global_vars, defines)
 
-    with open(output_path, 'w') as out:
-        # Write Top file comment
-        out.write(ON_TOP_FILE_COMMENT.strip())
-        out.write("\n")
+    with profile_phase("symbol_graph"):
+        graph = SymbolGraph(defs, global_vars, preload_paths)
+        extra_roots = set()
+        if hardcoded_statement:
+            try:
+                extra_roots = find_used_names(ast.parse(hardcoded_statement))
+            except SyntaxError:
+                pass
+        if tree_shake and "main" in defs:
+            graph.shake(extra_roots=extra_roots)
+        ordered = graph.ordered()
+    graph.report()
+    inclusion_paths = graph.inclusion_paths(extra_roots=extra_roots) if analyze else {}
+    bundle_items = []
+
+    emitted_defs = [symbol.node for symbol in ordered if not symbol.is_global]
+    global_vars = [symbol.node for symbol in ordered if symbol.is_global]
+    original_defs = list(emitted_defs)
+
+    hoisted = []
+    if hoist:
+        with profile_phase("hoist_constants"):
+            hoister = ConstantHoister(imports)
+            emitted_defs = [hoister.hoist(node) for node in emitted_defs]
+            hoisted = hoister.statements()
+        if hoisted:
+            log(f"[📌] Hoisted {len(hoisted)} constant(s) used in {hoister.uses} place(s)")
+
+    used_names = None
+    if import_cleanup == "builtin":
+        with profile_phase("remove_unused_imports"):
+            # Remove unused variables, then keep only the imports the remaining code uses
+            emitted_defs = [prune_dead_assignments(node) for node in emitted_defs]
+            used_names = set()
+            for node in emitted_defs + list(global_vars or []) + hoisted:
+                used_names.update(cached_used_names(node))
+            if hardcoded_statement:
+                try:
+                    used_names.update(find_used_names(ast.parse(hardcoded_statement)))
+                except SyntaxError:
+                    used_names = None  # Can't tell what the statements use: keep every import
+    profile_count("emitted_defs", len(emitted_defs))
+
+    lazy_plan = None
+    if lazy_imports:
+        hardcoded_names = set()
+        if hardcoded_statement:
+            try:
+                hardcoded_names = find_used_names(ast.parse(hardcoded_statement))
+            except SyntaxError:
+                hardcoded_names = None
+        if hardcoded_names is not None:
+            lazy_plan = plan_lazy_imports(imports, emitted_defs, list(global_vars or []) + hoisted, hardcoded_names,
+                                          used_names, eager_modules)
+            emitted_defs = [inject_local_imports(node, lazy_plan["local"]) for node in emitted_defs]
+
+    # Deferral is decided before instrumentation decorates every function (deferred functions are
+    # compiled instrumented on their first call)
+    deferred_nodes = set()
+    if defer:
+        file_paths = {id(symbol.node): symbol.file_path for symbol in ordered if not symbol.is_global}
+        for original, node in zip(original_defs, emitted_defs):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and \
+                    is_deferrable(node, file_paths[id(original)], node_source(node, emit_mode), defer_threshold):
+                deferred_nodes.add(id(original))
+
+    if instrument:
+        emitted_defs = [instrument_definition(node) for node in emitted_defs]
+
+    out = io.StringIO()
+
+    def write_section(text):
+        # Top-level blocks are separated by two blank lines
+        if text.strip():
+            out.write("\n\n" if out.tell() else "")
+            out.write(text.strip() + "\n")
+
+    # Write Top file comment
+    write_section(ON_TOP_FILE_COMMENT)
+
+    # Write dynamic imports at the top
+    section = io.StringIO()
+    write_dynamic_imports(imports, section, used_names, exclude=lazy_plan["excluded"] if lazy_plan else None)
+    import_lines = section.getvalue().splitlines()
+    write_section(section.getvalue())
+
+    # Write the proxies of lazily imported modules
+    if lazy_plan:
+        section = io.StringIO()
+        write_lazy_modules(section, lazy_plan["proxies"])
+        write_section(section.getvalue())
+        if analyze and section.getvalue():
+            bundle_items.append(bundle_item("lazy", "lazy module proxies", section.getvalue()))
+
+    # Write the timing helpers, before the definitions they decorate
+    if instrument:
+        write_section(INSTRUMENTATION_SOURCE)
+        if analyze:
+            bundle_items.append(bundle_item("instrumentation", "timing helpers", INSTRUMENTATION_SOURCE.strip()))
+
+    # Write the specific statements
+    if hardcoded_statement:
+        write_section(hardcoded_statement)
+        if analyze and hardcoded_statement.strip():
+            bundle_items.append(bundle_item("hardcoded", "HARDCODED_STATEMENTS", hardcoded_statement.strip()))
+
+    # Write the hoisted constants, before the definitions using them
+    if hoisted:
+        section = "\n".join(ast.unparse(node) for node in hoisted)
+        write_section(section)
+        if analyze:
+            bundle_items.append(bundle_item("hoisted", "hoisted constants", section))
+
+    # Write global variables and definitions, each after the symbols it needs at load time
+    rewritten = {id(node): new_node for node, new_node in zip(original_defs, emitted_defs)}
+    deferred_offset, deferred_texts, stubs = out.tell(), [], []
+    written_globals = set()
+    after_definition = True  # The sections above are separated like definitions
+    for symbol in ordered:
+        start = out.tell()
+        if symbol.is_global:
+            glob = node_source(symbol.node, emit_mode)
+            if glob in written_globals:  # remove duplicates
+                continue
+            written_globals.add(glob)
+            out.write("\n" * 2 if after_definition else "")  # Separate it from the definition above
+            out.write(glob)  # Write global variable assignment
+            out.write("\n" * 1)
+            after_definition = False
+        else:
+            node = rewritten[id(symbol.node)]
+            out.write("\n" * 2)  # Two newlines before each node
+            if id(symbol.node) in deferred_nodes:
+                text = node_source(node, emit_mode)
+                deferred_texts.append(text)
+                text = deferred_stub(node.name, minify_source(text, minify_names) if minify else text)
+                stubs.append(text)
+                out.write(text)
+            else:
+                write_node(out, node, emit_mode)  # Write the node (class, function, etc.)
+            out.write("\n" * 1)  # One newline after each node
+            after_definition = True
+        if analyze:
+            kind = "global" if symbol.is_global else "class" if isinstance(symbol.node, ast.ClassDef) else "function"
+            bundle_items.append(bundle_item(kind, ", ".join(symbol.names), out.getvalue()[start:].strip("\n"),
+                                            symbol.file_path, inclusion_paths.get(symbol.position)))
+
+    if analyze:
+        # An import is there for the first emitted symbol using one of the names it binds
+        for line in import_lines:
+            bound = {(alias.asname or alias.name).split(".")[0] for alias in ast.parse(line).body[0].names}
+            user = next((symbol for symbol in ordered if symbol.references & bound), None)
+            reason = inclusion_paths.get(user.position, [user.names[0]]) if user else None
+            bundle_items.append(bundle_item("import", line, line, reason=reason))
+
+    script = out.getvalue()
+    if deferred_texts:
+        # The stubs need the deferred compilation helpers, written before the first definition
+        script = script[:deferred_offset] + "\n\n" + DEFERRED_SOURCE.strip() + "\n" + script[deferred_offset:]
+        eager_compile = measure_compile_time("\n\n\n".join(deferred_texts))
+        stub_compile = measure_compile_time("\n\n\n".join(stubs))
+        log(f"[⏳] Deferred {len(deferred_texts)} definition(s) "
+              f"({sum(len(text.encode()) for text in deferred_texts) / 1024:.1f} KiB), compile "
+              f"{eager_compile * 1000:.2f} ms -> {stub_compile * 1000:.2f} ms until first call")
+        if stub_compile >= eager_compile:
+            log("⚠️ Warning: The deferred definitions are too small to pay off, raise --deferThreshold.")
+        if analyze:
+            bundle_items.append(bundle_item("deferred", "deferred compilation helpers", DEFERRED_SOURCE.strip()))
+
+    if minify:
+        header = ON_TOP_FILE_COMMENT.strip() + "\n"
+        minified = header + minify_source(script[len(header):], minify_names)
+        before_bytes, after_bytes = len(script.encode()), len(minified.encode())
+        before_compile, after_compile = measure_compile_time(script), measure_compile_time(minified)
+        log(f"[🗜️] Minified: {before_bytes / 1024:.1f} KiB -> {after_bytes / 1024:.1f} KiB "
+              f"({(after_bytes - before_bytes) / max(before_bytes, 1):+.0%}), compile "
+              f"{before_compile * 1000:.2f} ms -> {after_compile * 1000:.2f} ms")
+        script = minified
+
+    if analyze:
+        bundle_report = analyze_bundle(bundle_items, script, analyze_sort)
+
+    if import_cleanup != "autoflake":
+        with profile_phase("pack_output"):
+            script = pack_output(script, pack, pack_threshold)
+
+    if output_path is None:
+        if import_cleanup == "autoflake":
+            raise ValueError("The autoflake import cleanup needs an output path")
+        profile_count("output_bytes", len(script))
+        return script
+
+    if analyze:
+        write_bundle_report(bundle_report, output_path)
+
+    with open(output_path, 'w') as f:
+        profile_count("output_bytes", f.write(script))
+
+    if import_cleanup == "autoflake":
+        # Remove unused import and other variables
+        with profile_phase("remove_unused_imports"):
+            remove_unused_imports(output_path)
+        with open(output_path) as f:
+            script = f.read()
+        if pack != "none":
+            with profile_phase("pack_output"):
+                script = pack_output(script, pack, pack_threshold)
+            with open(output_path, 'w') as f:
+                f.write(script)
+    return script
+
+
+def load_manifest(manifest_path: Path) -> list[dict]:
+    """
+    Load a batch manifest listing the entry points to flatten.
 
-        # Write dynamic imports at the top
-        write_dynamic_imports(imports, out)
-        out.write("\n")  # Separate dynamic imports and other code
+    The manifest is a JSON file, either a list of actions or an object with an "actions" list.
+    Each action has an "entryFile", an "outputPath" and optionally its own "preload" list.
+    Relative paths are resolved against the manifest directory.
+
+    Args:
+        manifest_path (Path): Path to the JSON manifest.
+
+    Returns:
+        list[dict]: Actions with resolved "entry_file", "output_path" and "preload_paths" (None = default).
+
+    Example:
+        [{"entryFile": "main_sync.py", "outputPath": "build/sync.py"},
+         {"entryFile": "main_push.py", "outputPath": "build/push.py", "preload": ["utils.py"]}]
+    """
+    manifest = json.loads(Path(manifest_path).read_text())
+    if isinstance(manifest, dict):
+        manifest = manifest.get("actions", [])
+
+    base_dir = Path(manifest_path).resolve().parent
+    actions = []
+    for action in manifest:
+        preload = action.get("preload")
+        actions.append({
+            "entry_file": (base_dir / action["entryFile"]).resolve(),
+            "output_path": (base_dir / action["outputPath"]).resolve(),
+            "preload_paths": [SRC_DIR / p for p in preload] if preload is not None else None,
+        })
+    return actions
+
+
+def preanalyze_files(root_paths: list[Path], workers: int = 1) -> dict:
+    """
+    Analyze every file reachable from the given roots exactly once.
+
+    Files are discovered level by level: each frontier of newly imported modules is
+    analyzed before the next one is resolved. With several workers, the files of a
+    frontier that are not in the parse cache are read and parsed concurrently in a
+    process pool, and only their extracted summaries are sent back.
+
+    Args:
+        root_paths (list[Path]): Entry points and preload files of every action.
+        workers (int, optional): Number of parser processes (1 = parse in this process).
+
+    Returns:
+        dict: Mapping from file path to its summary (see summarize_tree).
+
+    Example:
+        summaries = preanalyze_files([Path("main_sync.py"), Path("main_push.py")], workers=4)
+    """
+    summaries = {}
+    frontier = list(dict.fromkeys(root_paths))
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while frontier:
+            to_parse = []
+            for file_path in frontier:
+                try:
+                    if executor is None:
+                        summaries[file_path] = analyze_file(file_path, parse_cache)
+                        continue
+                    summary = parse_cache.get(parse_cache.digest(file_path)) if parse_cache else None
+                except Exception as e:
+                    raise FlattenError(f"Error parsing {file_path}: {e}") from e
+                if summary is None:
+                    to_parse.append(file_path)
+                else:
+                    summaries[file_path] = summary
+
+            futures = [executor.submit(_summarize_path, file_path) for file_path in to_parse]
+            for file_path, future in zip(to_parse, futures):
+                try:
+                    digest, summaries[file_path] = future.result()
+                except Exception as e:
+                    raise FlattenError(f"Error parsing {file_path}: {e}") from e
+                if parse_cache:
+                    parse_cache.put(digest, summaries[file_path])
+                    parse_cache.remember(file_path, digest)
+
+            # Next frontier: modules imported by this one and not analyzed yet
+            next_frontier = {}  # Ordered set
+            for file_path in frontier:
+                for module_path in resolve_import_paths(summaries[file_path]["imports"], file_path):
+                    if module_path not in summaries:
+                        next_frontier[module_path] = None
+            frontier = list(next_frontier)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return summaries
+
+
+# Generator options: option name -> (module global holding it, whether it is a keyword argument of
+# write_flattened_script). New options are added here only (see get_generator_options).
+GENERATOR_OPTIONS = {
+    "ignore_imports": ("ignore_imports", False),
+    "import_cleanup": ("import_cleanup_mode", True),
+    "tree_shake": ("tree_shake_enabled", True),
+    "parse_workers": ("parse_workers", False),
+    "emit_mode": ("emit_mode", True),
+    "lazy_imports": ("lazy_imports_enabled", True),
+    "eager_modules": ("eager_modules", True),
+    "minify": ("minify_enabled", True),
+    "minify_names": ("minify_names_enabled", True),
+    "streaming": ("streaming_enabled", False),
+    "analyze": ("analyze_enabled", True),
+    "analyze_sort": ("analyze_sort", True),
+    "defines": ("defines", True),
+    "instrument": ("instrument_enabled", True),
+    "pack": ("pack_mode", True),
+    "pack_threshold": ("pack_threshold", True),
+    "defer": ("defer_enabled", True),
+    "defer_threshold": ("defer_threshold", True),
+    "hoist": ("hoist_enabled", True),
+}
+
+
+def get_generator_options() -> dict:
+    """
+    Return the generator options set from the command line, as a picklable dict (see GENERATOR_OPTIONS).
+
+    Example:
+        options = get_generator_options()  # {'ignore_imports': [], 'import_cleanup': 'builtin', ...}
+    """
+    module_state = globals()
+    return {name: copy.copy(module_state[variable]) for name, (variable, _) in GENERATOR_OPTIONS.items()}
+
+
+def set_generator_options(options: dict):
+    """
+    Apply generator options returned by get_generator_options (e.g. in a worker process).
+
+    Example:
+        set_generator_options({**get_generator_options(), 'import_cleanup': 'none', 'tree_shake': False})
+    """
+    unknown = options.keys() - GENERATOR_OPTIONS.keys()
+    if unknown:
+        raise ValueError(f"Unknown generator option(s): {', '.join(sorted(unknown))}")
+    globals().update({variable: options[name] for name, (variable, _) in GENERATOR_OPTIONS.items()})
 
-        # Write the specific statements
-        if hardcoded_statement:
-            out.write(hardcoded_statement.strip() + "\n\n")
-
-        # Write global variables at the top after imports
-        if global_vars:
-            # remove duplicates
-            unique_globals = set([ast.unparse(var) for var in global_vars])
-            for glob in unique_globals:
-                out.write(glob)  # Write global variable assignment
-                out.write("\n" * 1)
-
-        # Write definitions from preload paths first, in list order
-        print(f'🛣️PRELOADED PATH: {preload_paths}')
-        for preload_path in preload_paths:
-            preload_path = preload_path.resolve()
-            for node in file_to_defs.get(preload_path, []):
-                out.write("\n" * 2)  # Two newlines before each node
-                out.write(ast.unparse(node))  # Write the node (class, function, etc.)
-                out.write("\n" * 1)  # One newline after each node
-
-        # Write remaining defs (not in preload list)
-        written = set()
-        for preload_path in preload_paths:
-            written.update(file_to_defs.get(preload_path.resolve(), []))
-
-        for file_path, nodes in file_to_defs.items():
-            print(f'🏗️ {file_path} - {nodes}')
-            if file_path.resolve() not in preload_paths and len(nodes) == 1:
-                for node in nodes:
-                    out.write("\n" * 2)  # Two newlines before each node
-                    out.write(ast.unparse(node))  # Write the node (class, function, etc.)
-                    out.write("\n" * 1)  # One newline after each node
-
-    # Remove unused import and other variables
-    remove_unused_imports(output_path)
+
+def write_options() -> dict:
+    """
+    Return the keyword arguments of write_flattened_script matching the current generator options.
+
+    Example:
+        write_flattened_script(imports, defs, "flattened.py", **write_options())
+    """
+    module_state = globals()
+    return {name: module_state[variable] for name, (variable, argument) in GENERATOR_OPTIONS.items() if argument}
+
+
+def _init_batch_worker(summaries: dict, options: dict, project_root: Path, src_dir: Path, hardcoded_statements: str):
+    # Spawned workers import this module afresh: install the parent's project state, not the defaults
+    global shared_summaries, parse_cache, PROJECT_ROOT, SRC_DIR, HARDCODED_STATEMENTS, module_index
+    PROJECT_ROOT, SRC_DIR, HARDCODED_STATEMENTS = project_root, src_dir, hardcoded_statements
+    module_index = None
+    shared_summaries = summaries
+    set_generator_options(dict(options, parse_workers=1))
+    parse_cache = None  # Everything needed was analyzed by the parent process
+
+
+def build_manifest_path(output_path: Path) -> Path:
+    """Return the path of the build manifest of an output (next to it, e.g. main.py.manifest.json)."""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + ".manifest.json")
+
+
+def file_digest(file_path: Path) -> str:
+    """Return the sha256 of a file content (cached while its size and modification time are unchanged)."""
+    stat = os.stat(file_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = digest_cache.get(file_path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    digest = hashlib.sha256(Path(file_path).read_bytes()).hexdigest()
+    digest_cache[file_path] = (key, digest)
+    return digest
+
+
+def relative_source_path(file_path: Path) -> str:
+    """Return a file path relative to SRC_DIR (posix style), as stored in build manifests."""
+    key = (SRC_DIR, file_path)
+    if key not in relative_paths:
+        relative_paths[key] = Path(os.path.relpath(file_path, SRC_DIR)).as_posix()
+    return relative_paths[key]
+
+
+def build_fingerprint(entry_file: Path, preload_paths: list[Path]) -> dict:
+    """
+    Return everything besides the dependency files that shapes the output of an entry point:
+    the generator itself, its options, the hardcoded statements, and the set of project modules
+    (a new module can change how imports resolve). Generated outputs, recognized by their
+    build manifest, are not counted as project modules.
+
+    Example:
+        fingerprint = build_fingerprint(Path("main.py"), [])
+    """
+    return {
+        "version": BUILD_MANIFEST_VERSION,
+        "generator": file_digest(Path(__file__)),
+        "entry_file": relative_source_path(entry_file),
+        "preload": [relative_source_path(path) for path in preload_paths],
+        "ignore_imports": sorted(ignore_imports),
+        "options": write_options(),
+        "hardcoded_statements": hashlib.sha256(HARDCODED_STATEMENTS.encode()).hexdigest(),
+        "modules": project_modules_digest(),
+    }
+
+
+def project_modules_digest() -> str:
+    """Return the hash of the set of project modules (name and path), generated outputs excluded."""
+    index = get_module_index()
+    modules = "\n".join(sorted(f"{name}={relative_source_path(path)}" for name, path in index.modules.items()
+                               if not build_manifest_path(path).exists()))
+    return hashlib.sha256(modules.encode()).hexdigest()
+
+
+def write_build_manifest(entry_file: Path, output_path: Path, preload_paths: list[Path], files: list[Path]):
+    """
+    Write the build manifest of an output: its fingerprint, the content hash of every file
+    of the dependency closure and the hash of the output itself.
+
+    Args:
+        entry_file (Path): The path of the main entry file.
+        output_path (Path): The flattened output file.
+        preload_paths (list[Path]): List of files whose defs should be written first.
+        files (list[Path]): Files of the dependency closure (see collect_dependencies).
+
+    Example:
+        write_build_manifest(Path("main.py"), Path("workato_prod_main.py"), [], dependency_files)
+    """
+    manifest = {
+        "fingerprint": build_fingerprint(entry_file, preload_paths),
+        "files": {relative_source_path(path): file_digest(path) for path in sorted(files)},
+        "output": file_digest(output_path),
+    }
+    build_manifest_path(output_path).write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+
+
+def is_up_to_date(entry_file: Path, output_path: Path, preload_paths: list[Path]) -> bool:
+    """
+    Tell whether an output can be kept as is: its build manifest matches the current
+    fingerprint, every recorded dependency file is unchanged and the output was not modified.
+
+    Example:
+        if not is_up_to_date(Path("main.py"), Path("workato_prod_main.py"), []):
+            flatten_entry_point(Path("main.py"), Path("workato_prod_main.py"), [])
+    """
+    try:
+        manifest = json.loads(build_manifest_path(output_path).read_text())
+        if manifest["fingerprint"] != json.loads(json.dumps(build_fingerprint(entry_file, preload_paths))):
+            return False
+        if file_digest(output_path) != manifest["output"]:
+            return False
+        return all(file_digest(SRC_DIR / path) == digest for path, digest in manifest["files"].items())
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def dependency_closure(action: dict):
+    """
+    Return the files an action's output was built from: the dependency closure recorded in
+    its build manifest (see write_build_manifest), its entry file and its preload files.
+
+    Returns:
+        set[Path] or None: The resolved files, None when the output has no build manifest yet.
+
+    Example:
+        dependency_closure({"entry_file": Path("main.py"), "output_path": Path("workato_prod_main.py"),
+                            "preload_paths": []})  # {Path('/project/main.py'), Path('/project/utils.py'), ...}
+    """
+    try:
+        manifest = json.loads(build_manifest_path(action["output_path"]).read_text())
+        files = {(SRC_DIR / path).resolve() for path in manifest["files"]}
+    except (OSError, ValueError, KeyError):
+        return None
+    return files | {Path(action["entry_file"]).resolve()} | {Path(path).resolve() for path in action["preload_paths"]}
+
+
+def built_modules_digest(output_path: Path):
+    """Return the project modules digest an output was built with (see build_fingerprint), None without manifest."""
+    try:
+        return json.loads(build_manifest_path(output_path).read_text())["fingerprint"]["modules"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def changed_files_since(revision: str) -> tuple[set, bool]:
+    """
+    List the files changed in a git revision range ("main..HEAD"), or between a revision and
+    the working tree ("origin/main"), plus the untracked files (they are new).
+
+    Args:
+        revision (str): Anything `git diff` accepts.
+
+    Returns:
+        tuple: (set of resolved changed paths, whether a project module was added, removed or renamed).
+            A new or removed module can change how imports resolve, so it affects every action.
+
+    Example:
+        changed, modules_changed = changed_files_since("origin/main...HEAD")
+    """
+    top_level = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=SRC_DIR, capture_output=True,
+                               text=True, check=True).stdout.strip()
+    diff = subprocess.run(["git", "diff", "--name-status", revision], cwd=top_level, capture_output=True,
+                          text=True, check=True).stdout
+    # Files of the project git does not track yet are new (generated outputs aside)
+    untracked = subprocess.run(["git", "ls-files", "--others", "--exclude-standard", "--", str(SRC_DIR)],
+                               cwd=top_level, capture_output=True, text=True, check=True).stdout
+    new_files = [path for path in untracked.splitlines() if not build_manifest_path(Path(top_level) / path).exists()]
+    changed, modules_changed = set(), False
+    for line in diff.splitlines() + [f"A\t{path}" for path in new_files]:
+        status, *paths = line.split("\t")
+        paths = [(Path(top_level) / path).resolve() for path in paths]
+        changed.update(paths)
+        if status[0] in "ADR" and any(path.suffix == ".py" and path.is_relative_to(SRC_DIR) for path in paths):
+            modules_changed = True
+    return changed, modules_changed
+
+
+def select_affected_actions(actions: list[dict], changed_files, modules_changed: bool = False) -> list[dict]:
+    """
+    Keep the actions whose output depends on one of the changed files.
+
+    An action is affected when a changed file is in its dependency closure (see dependency_closure),
+    when it was never built, or when the generator itself or the set of project modules changed
+    (modules_changed, or a module added or removed since the action was built, e.g. a new file
+    passed to --changed).
+
+    Args:
+        actions (list[dict]): Actions with "entry_file", "output_path" and "preload_paths".
+        changed_files (iterable[Path]): The changed files.
+        modules_changed (bool, optional): A project module was added, removed or renamed.
+
+    Returns:
+        list[dict]: The affected actions, in the given order.
+
+    Example:
+        actions = select_affected_actions(actions, [Path("utils/http.py")])
+    """
+    changed_files = {Path(path).resolve() for path in changed_files}
+    if modules_changed or Path(__file__).resolve() in changed_files:
+        return list(actions)
+    modules = project_modules_digest()
+    affected = []
+    for action in actions:
+        closure = dependency_closure(action)
+        if closure is None or closure & changed_files or built_modules_digest(action["output_path"]) != modules:
+            affected.append(action)
+        else:
+            log(f"[⏭️] Not affected: {action['output_path']}")
+    return affected
+
+
+def flatten_entry_point(entry_file: Path, output_path: Path, preload_paths: list[Path]) -> Path:
+    """
+    Collect the dependencies of one entry point, write its flattened script and its build manifest.
+
+    Args:
+        entry_file (Path): The path of the main entry file.
+        output_path (Path): Path to write the flattened output file.
+        preload_paths (list[Path]): List of files whose defs should be written first.
+
+    Returns:
+        Path: The output path.
+
+    Example:
+        flatten_entry_point(Path("main.py"), Path("workato_prod_main.py"), [Path("utils.py")])
+    """
+    global MAIN_ENTRY_POINTS
+
+    MAIN_ENTRY_POINTS = [entry_file]
+    if streaming_enabled:
+        stream_flatten(entry_file, output_path, preload_paths, HARDCODED_STATEMENTS, **write_options())
+        write_build_manifest(entry_file, output_path, preload_paths, dependency_files)
+        return output_path
+    with profile_phase("collect_dependencies"):
+        imports, defs, global_vars = collect_dependencies(entry_file, preload_paths=preload_paths,
+                                                          workers=1 if shared_summaries else parse_workers)
+    with profile_phase("write_flattened_script"):
+        write_flattened_script(
+            imports, defs, output_path, preload_paths=preload_paths, global_vars=global_vars,
+            hardcoded_statement=HARDCODED_STATEMENTS, **write_options()
+        )
+    write_build_manifest(entry_file, output_path, preload_paths, dependency_files)
+    return output_path
+
+
+def run_batch(actions: list[dict], workers: int = None, force: bool = False):
+    """
+    Flatten several entry points in one run.
+
+    Shared modules are parsed once in this process, then the per-entry-point collection
+    and writing are spread across a process pool.
+
+    Args:
+        actions (list[dict]): Actions with "entry_file", "output_path" and "preload_paths".
+        workers (int, optional): Number of worker processes (defaults to the CPU count).
+            With 1 worker everything runs in this process.
+        force (bool, optional): Regenerate outputs even when their build manifest says they are up to date.
+
+    Example:
+        run_batch(load_manifest(Path("actions.json")), workers=4)
+    """
+    global shared_summaries
+
+    if not force:
+        stale_actions = []
+        for action in actions:
+            if is_up_to_date(action["entry_file"], action["output_path"], action["preload_paths"]):
+                log(f"[⏭️] Up to date: {action['output_path']}")
+            else:
+                stale_actions.append(action)
+        actions = stale_actions
+        if not actions:
+            return
+
+    roots = []
+    for action in actions:
+        roots.extend(action["preload_paths"])
+        roots.append(action["entry_file"])
+    if not streaming_enabled:  # Summaries of every file are what streaming mode avoids keeping
+        with profile_phase("preanalyze_files"):
+            shared_summaries = preanalyze_files(roots, parse_workers)
+        if parse_cache:
+            parse_cache.flush()
+        log(f"📦 Analyzed {len(shared_summaries)} file(s) for {len(actions)} entry point(s)")
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(actions)))
+    if workers == 1:
+        for action in actions:
+            output_path = flatten_entry_point(action["entry_file"], action["output_path"], action["preload_paths"])
+            log(f"[✅] Flattened script written to: {output_path}")
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(shared_summaries, get_generator_options(), PROJECT_ROOT, SRC_DIR,
+                                       HARDCODED_STATEMENTS)) as executor:
+        futures = [
+            executor.submit(flatten_entry_point, action["entry_file"], action["output_path"],
+                            action["preload_paths"])
+            for action in actions
+        ]
+        for future in futures:
+            log(f"[✅] Flattened script written to: {future.result()}")
+
+
+# Module state a Flattener installs while it runs (see Flattener.activate)
+FLATTENER_STATE = ["PROJECT_ROOT", "SRC_DIR", "MAIN_ENTRY_POINTS", "HARDCODED_STATEMENTS", "main_function_ast",
+                   "module_index", "parse_cache", "shared_summaries", "dependency_files", "log_stream"]
+
+# Generator options before any command line or Flattener changes them
+DEFAULT_GENERATOR_OPTIONS = get_generator_options()
+
+# The generator works on module state: Flatteners take turns
+_flattener_lock = threading.RLock()
+
+
+class FlattenResult:
+    """
+    Result of Flattener.flatten.
+
+    Attributes:
+        script (str): The flattened script.
+        output_path (Path or None): Where it was written (None when it was only returned).
+        files (list[Path]): Files of the dependency closure of the entry point.
+        skipped (bool): True when the output was up to date and left untouched.
+        log (list[str]): Messages printed by the generator (warnings, minify report, ...).
+        milliseconds (float): Time spent.
+    """
+    __slots__ = ("script", "output_path", "files", "skipped", "log", "milliseconds")
+
+    def __init__(self, script, output_path, files, skipped, log, milliseconds):
+        self.script = script
+        self.output_path = output_path
+        self.files = files
+        self.skipped = skipped
+        self.log = log
+        self.milliseconds = milliseconds
+
+
+class Flattener:
+    """
+    Embeddable flattener owning its configuration, caches and module resolver.
+
+    Importing this module has no side effect, and each Flattener keeps its own project root,
+    options, module index, parse cache and per-entry-point dependency state, so one process can
+    flatten several projects, several times, with warm caches and without a subprocess. Between
+    calls only the files whose modification time changed are re-analyzed.
+
+    Instances are serialized: the generator functions work on module state, so a Flattener
+    installs its own while it runs and restores the previous state afterwards, under one
+    process-wide lock. Two Flatteners (or threads sharing one) never run at the same time; use
+    processes (see run_batch) for parallel builds. Calling the generator functions directly
+    uses the module state, not a Flattener's. Parse errors raise FlattenError. The generator
+    messages of a call are returned in FlattenResult.log (see log): sys.stdout is left alone.
+
+    Args:
+        project_root (Path): Root of the project sources (module names are resolved from it).
+        options (dict, optional): Generator options overriding DEFAULT_GENERATOR_OPTIONS
+            (see get_generator_options).
+        hardcoded_statements (str, optional): Code inserted at the top of every output.
+        cache_dir (Path, optional): Directory of an on-disk parse cache shared across processes.
+        parse_cache (ParseCache, optional): An already opened parse cache, used instead of cache_dir.
+
+    Example:
+        flattener = Flattener(Path("my_project"), options={"lazy_imports": True})
+        result = flattener.flatten(Path("my_project/main.py"))
+        print(result.script)
+        flattener.flatten(Path("my_project/main.py"), Path("build/workato_prod_main.py"))
+    """
+
+    def __init__(self, project_root: Path, options: dict = None, hardcoded_statements: str = HARDCODED_STATEMENTS,
+                 cache_dir: Path = None, parse_cache: ParseCache = None):
+        self.project_root = Path(project_root).resolve()
+        self.options = {**DEFAULT_GENERATOR_OPTIONS, **(options or {})}
+        self.hardcoded_statements = hardcoded_statements
+        self.parse_cache = parse_cache or (ParseCache(Path(cache_dir)) if cache_dir else None)
+        self.module_index = None
+        self.states = {}
+        self.pending_changes = {}
+        self.outputs = set()
+        self.snapshot = None
+        self.calls = 0
+
+    @contextlib.contextmanager
+    def activate(self, options: dict = None, log_output=None):
+        """
+        Install this flattener state (and options, overridden by `options`) as the module state,
+        restoring the previous one on exit. The generator messages go to `log_output` (a text
+        stream, stdout by default).
+        """
+        with _flattener_lock:
+            module_state = globals()
+            saved_state = {name: module_state[name] for name in FLATTENER_STATE}
+            saved_options = get_generator_options()
+            try:
+                module_state.update({
+                    "PROJECT_ROOT": self.project_root,
+                    "SRC_DIR": self.project_root,
+                    "MAIN_ENTRY_POINTS": [],
+                    "HARDCODED_STATEMENTS": self.hardcoded_statements,
+                    "main_function_ast": None,
+                    "module_index": self.module_index,
+                    "parse_cache": self.parse_cache,
+                    "shared_summaries": {},
+                    "dependency_files": [],
+                    "log_stream": log_output,
+                })
+                set_generator_options({**self.options, **(options or {})})
+                if profiler is not None:
+                    profiler.parse_cache = self.parse_cache
+                yield
+            finally:
+                self.module_index = module_state["module_index"]
+                module_state.update(saved_state)
+                set_generator_options(saved_options)
+
+    def refresh(self):
+        """Record the files changed since the last call for every known entry point."""
+        current = scan_source_files(self.outputs)
+        if self.snapshot is not None:
+            changed = {path for path in current.keys() | self.snapshot.keys()
+                       if current.get(path) != self.snapshot.get(path)}
+            for key in self.states:
+                self.pending_changes[key].update(changed)
+        self.snapshot = current
+
+    def flatten(self, entry_file: Path, output_path: Path = None, preload_paths: list[Path] = None,
+                options: dict = None, force: bool = False) -> FlattenResult:
+        """
+        Flatten an entry point.
+
+        Args:
+            entry_file (Path): The path of the main entry file.
+            output_path (Path, optional): Where to write the script and its build manifest. When
+                omitted, the script is only returned.
+            preload_paths (list[Path], optional): Files whose defs should be written first.
+            options (dict, optional): Generator options for this call only.
+            force (bool, optional): Regenerate even when the build manifest says the output is up to date.
+
+        Returns:
+            FlattenResult: The script and what it was built from.
+
+        Example:
+            script = Flattener(Path("my_project")).flatten(Path("my_project/main.py")).script
+        """
+        global MAIN_ENTRY_POINTS
+
+        start = time.perf_counter()
+        entry_file = Path(entry_file).resolve()
+        output_path = Path(output_path).resolve() if output_path is not None else None
+        preload_paths = [Path(path).resolve() for path in preload_paths or []]
+        if not entry_file.exists():
+            raise FileNotFoundError(f"The entry file '{entry_file}' does not exist.")
+        self.calls += 1
+        if output_path is not None:
+            self.outputs.add(output_path)
+
+        log_output = io.StringIO()
+        with self.activate(options, log_output):
+            self.refresh()
+            key = (entry_file, tuple(preload_paths))
+            if output_path is not None and not force and is_up_to_date(entry_file, output_path, preload_paths):
+                state = self.states.get(key)
+                files = state.order if state else []
+                script = output_path.read_text()
+                skipped = True
+            elif streaming_enabled:
+                script = stream_flatten(entry_file, output_path, preload_paths, self.hardcoded_statements,
+                                        **write_options())
+                if output_path is not None:
+                    write_build_manifest(entry_file, output_path, preload_paths, dependency_files)
+                files = dependency_files
+                skipped = False
+            else:
+                with profile_phase("collect_dependencies"):
+                    state = self._dependency_state(key)
+                MAIN_ENTRY_POINTS = [entry_file]
+                imports, defs, global_vars = state.merged()
+                with profile_phase("write_flattened_script"):
+                    script = write_flattened_script(
+                        imports, defs, output_path, preload_paths=preload_paths, global_vars=global_vars,
+                        hardcoded_statement=self.hardcoded_statements, **write_options()
+                    )
+                if output_path is not None:
+                    write_build_manifest(entry_file, output_path, preload_paths, state.order)
+                files = state.order
+                skipped = False
+            if self.parse_cache:
+                self.parse_cache.flush()
+
+        return FlattenResult(script, output_path, list(files), skipped, log_output.getvalue().splitlines(),
+                             (time.perf_counter() - start) * 1000)
+
+    def _dependency_state(self, key):
+        # The warm dependency state of an entry point, brought up to date with the changed files
+        global shared_summaries
+
+        state = self.states.get(key)
+        if state is None:
+            entry_file, preload_paths = key
+            state = DependencyState(entry_file, list(preload_paths))
+            if parse_workers > 1:
+                shared_summaries = preanalyze_files(state.roots, parse_workers)
+            state.build()
+            shared_summaries = {}
+            self.states[key] = state
+            self.pending_changes[key] = set()
+        elif self.pending_changes[key]:
+            state.update(self.pending_changes[key])
+            self.pending_changes[key] = set()
+        return state
+
+    def stats(self) -> dict:
+        """Return the statistics of the warm caches."""
+        summaries = {path for state in self.states.values() for path in state.summaries}
+        return {
+            "calls": self.calls,
+            "entry_points": len(self.states),
+            "summaries": len(summaries),
+            "indexed_modules": len(self.module_index.modules) if self.module_index else 0,
+            "unparsed_definitions": len(unparse_cache),
+            "parse_cache": {"hits": self.parse_cache.hits, "misses": self.parse_cache.misses}
+            if self.parse_cache else None,
+        }
+
+
+class FlattenDaemon:
+    """
+    Long-running flattener answering JSON requests, one per line, with warm state.
+
+    Requests are served by one Flattener: the module index, the dependency state of every
+    entry point seen so far (file summaries and resolved imports, see DependencyState) and the
+    unparsed definitions stay in memory between requests, and before each request only the
+    files whose modification time changed are re-analyzed.
+
+    Requests:
+        {"entryFile": "main.py", "outputPath": "out.py", "preload": [...], "options": {...}, "force": false}
+            Flatten an entry point. Paths are relative to the daemon working directory, preload
+            paths to the project root, and options override the daemon options (see get_generator_options).
+        {"command": "stats"}: Report the cache statistics.
+        {"command": "shutdown"}: Stop the daemon.
+
+    Every response is one JSON line with "ok" (and "error" when false); flatten responses also
+    hold the "outputPath", whether it was "skipped" as up to date, the "milliseconds" spent and
+    the generator messages ("log").
+
+    Args:
+        flattener (Flattener): The flattener serving the requests.
+
+    Example:
+        daemon = FlattenDaemon(Flattener(SRC_DIR))
+        daemon.handle({"entryFile": "main.py", "outputPath": "workato_prod_main.py"})
+        daemon.serve_stdin()
+    """
+
+    def __init__(self, flattener: Flattener):
+        self.flattener = flattener
+        self.requests = 0
+        self.running = True
+
+    def flatten(self, request: dict) -> dict:
+        result = self.flattener.flatten(
+            Path(request["entryFile"]), Path(request["outputPath"]),
+            [self.flattener.project_root / preload for preload in request.get("preload", [])],
+            options=request.get("options"), force=request.get("force", False),
+        )
+        response = {"outputPath": str(result.output_path), "skipped": result.skipped}
+        if result.log:
+            response["log"] = result.log
+        return response
+
+    def stats(self) -> dict:
+        """Return the statistics of the warm caches."""
+        return {"requests": self.requests, **self.flattener.stats()}
+
+    def handle(self, request: dict) -> dict:
+        """
+        Answer one request (see the class docstring) and return the response.
+
+        Example:
+            daemon.handle({"command": "stats"})
+        """
+        self.requests += 1
+        command = request.get("command", "flatten")
+        start = time.perf_counter()
+        try:
+            if command == "flatten":
+                response = self.flatten(request)
+            elif command == "stats":
+                response = {"stats": self.stats()}
+            elif command == "shutdown":
+                self.running = False
+                response = {}
+            else:
+                raise ValueError(f"Unknown command '{command}'")
+            response = {"ok": True, **response}
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        response["milliseconds"] = round((time.perf_counter() - start) * 1000, 3)
+        return response
+
+    def handle_line(self, line: str) -> str:
+        """Answer one JSON request line with one JSON response line."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object")
+        except ValueError as e:
+            return json.dumps({"ok": False, "error": f"Invalid request: {e}"}) + "\n"
+        return json.dumps(self.handle(request)) + "\n"
+
+    def serve_stdin(self):
+        """Answer JSON-lines requests from stdin on stdout until EOF or a shutdown request."""
+        print("👂 Flatten daemon reading requests from stdin", file=sys.stderr)
+        for line in sys.stdin:
+            if line.strip():
+                sys.stdout.write(self.handle_line(line))
+                sys.stdout.flush()
+            if not self.running:
+                break
+
+    def serve_socket(self, socket_path: Path):
+        """Answer JSON-lines requests on a Unix socket (one client at a time) until a shutdown request."""
+        daemon = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if line.strip():
+                        self.wfile.write(daemon.handle_line(line.decode("utf-8")).encode("utf-8"))
+                        self.wfile.flush()
+                    if not daemon.running:
+                        break
+
+        socket_path = Path(socket_path)
+        socket_path.unlink(missing_ok=True)
+        with socketserver.UnixStreamServer(str(socket_path), RequestHandler) as server:
+            print(f"👂 Flatten daemon listening on {socket_path}")
+            try:
+                while self.running:
+                    server.handle_request()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                socket_path.unlink(missing_ok=True)
+        print("👋 Flatten daemon stopped")
 
 
 def generate_main_prod_script():
-    global ignore_imports
+    global PROJECT_ROOT, SRC_DIR, MAIN_ENTRY_POINTS, parse_cache, profiler
 
     # Default values for preload and ignoreImport
-    default_preload = ['helpers/math_tools.py', 'utils.py']
-    #default_preload = []
+    default_preload = []
     default_ignore = []
 
     # Argument parser setup
     parser = argparse.ArgumentParser()
 
+    # Adding argument for the project root (optional)
+    parser.add_argument('--projectRoot', default=str(PROJECT_ROOT),
+                        help='Root of the project sources (default: the sample project)')
+
     # Adding argument for preload files (optional)
-    parser.add_argument('--preload', nargs='*', help='Files to load first, in order', default=default_preload)
+    parser.add_argument('--preload', nargs='*', help='Files whose definitions come first when dependencies allow it, in order',
+                        default=default_preload)
 
     # Adding argument for objects to ignore in imports (optional)
     parser.add_argument('--ignoreImport', nargs='*', help='Ignore import for given Objects', default=default_ignore)
 
     # Adding mandatory arguments for entry file and output path
-    parser.add_argument('--entryFile', nargs='*', default="../sample_project/main.py",
-                        help='Path to the entry file to process (e.g., workato_main_sync_data.py)')
-    parser.add_argument('--outputPath', nargs='*', default="../sample_project/workato_prod_main.py",
-                        help='Path to the output file for the flattened script')
+    parser.add_argument('--entryFile', nargs='*', default=None,
+                        help='Path(s) to the entry file(s) to process (default: <projectRoot>/main.py)')
+    parser.add_argument('--outputPath', nargs='*', default=None,
+                        help='Path(s) to the output file(s) for the flattened script, one per entry file '
+                             '(default: <projectRoot>/workato_prod_main.py)')
+
+    # Adding argument for the unused imports/variables cleanup (optional)
+    parser.add_argument('--importCleanup', choices=['builtin', 'autoflake', 'none'], default='builtin',
+                        help='Remove unused imports/variables in-process (builtin) or with the autoflake CLI')
+
+    # Adding argument to disable tree shaking (optional)
+    parser.add_argument('--noTreeShake', action='store_true',
+                        help="Emit every collected definition instead of only those reachable from 'main'")
+
+    # Adding argument for the emission mode (optional)
+    parser.add_argument('--emit', choices=['source', 'unparse'], default='source',
+                        help='Copy definitions from their original source (default) or regenerate them with ast.unparse')
+
+    # Adding arguments for lazy third-party imports in the output (optional)
+    parser.add_argument('--lazyImports', action='store_true',
+                        help='Defer third-party imports of the output until the code using them runs')
+    parser.add_argument('--eagerImports', nargs='*', default=[],
+                        help='Top-level modules that stay imported at the top in --lazyImports mode')
+
+    # Adding arguments for minified output (optional)
+    parser.add_argument('--minify', action='store_true',
+                        help='Strip comments, runtime-free annotations and blank lines from the output')
+    parser.add_argument('--minifyNames', action='store_true', help='With --minify, also shorten local variable names')
+
+    # Adding arguments for the bundle size analyzer (optional)
+    parser.add_argument('--analyze', action='store_true',
+                        help='Report the size, origin, inclusion reason and compile cost of every emitted part '
+                             '(<outputPath>.bundle.json / .bundle.txt); always regenerates the output')
+    parser.add_argument('--analyzeSort', choices=sorted(BUNDLE_SORT_KEYS), default='size',
+                        help='Order of the bundle report items')
+
+    # Adding argument for timing instrumentation (optional)
+    parser.add_argument('--instrument', action='store_true',
+                        help='Time every emitted function and method and print a timing table when main returns '
+                             '(for diagnosis builds: do not deploy it to production)')
+
+    # Adding arguments for packed output (optional)
+    parser.add_argument('--pack', choices=PACK_MODES, default='none',
+                        help='Write a bootstrap executing the zlib-compressed body ("marshal": precompiled, for this '
+                             'Python version only; "auto": zlib above --packThreshold when smaller)')
+    parser.add_argument('--packThreshold', type=int, default=256,
+                        help='Size in KiB above which --pack auto packs the output')
+
+    # Adding arguments for deferred compilation (optional)
+    parser.add_argument('--defer', action='store_true',
+                        help=f'Emit the functions marked with "{DEFER_MARKER}" as source strings compiled on first call')
+    parser.add_argument('--deferThreshold', type=int, default=0,
+                        help='With --defer, also defer the functions larger than this many bytes (0 = marked only)')
+
+    # Adding argument for constant hoisting (optional)
+    parser.add_argument('--hoistConstants', action='store_true',
+                        help='Move constant regex compilations and read-only dict/list/set literals of the functions '
+                             'to module-level constants, shared across files')
+
+    # Adding argument for generation-time constants (optional)
+    parser.add_argument('--define', nargs='+', default=[], metavar='NAME=value',
+                        help='Fix a global at generation time (Python literal, else a string): its uses are '
+                             'substituted, constant expressions folded and dead branches removed')
+
+    # Adding argument for bounded-memory collection (optional)
+    parser.add_argument('--streaming', action='store_true',
+                        help='Keep only compact per-file summaries in memory and re-read the emitted definitions '
+                             'from disk (lower peak memory on very large trees, no warm state)')
+
+    # Adding argument for parallel parsing (optional)
+    parser.add_argument('--parseWorkers', type=int, default=1,
+                        help='Number of processes parsing each frontier of the import graph (default: 1, serial)')
+
+    # Adding argument for profiling (optional)
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='REPORT_PATH',
+                        help='Record time and peak memory per phase into a JSON report '
+                             '(default: <outputPath>.profile.json) and print a summary. In batch mode with '
+                             'several workers, only the work done in the main process is recorded')
+
+    # Adding arguments for batch mode (optional)
+    parser.add_argument('--manifest', help='JSON manifest of entry points to flatten in one run')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes in batch mode (default: CPU count)')
+
+    # Adding arguments for the on-disk parse cache (optional)
+    parser.add_argument('--cacheDir', default=None,
+                        help='Directory of the on-disk parse cache (default: <projectRoot>/.flatten_cache)')
+    parser.add_argument('--noCache', action='store_true', help='Disable the on-disk parse cache')
+
+    # Adding arguments to only regenerate the actions affected by a change (optional)
+    parser.add_argument('--changed', nargs='+', default=None,
+                        help='Only regenerate the actions whose dependency closure contains one of these files')
+    parser.add_argument('--since',
+                        help='Only regenerate the actions affected by the files changed in this git revision range '
+                             '(e.g. origin/main...HEAD, or a revision compared with the working tree)')
+
+    # Adding argument to ignore the build manifests (optional)
+    parser.add_argument('--force', action='store_true',
+                        help='Regenerate the outputs even when nothing changed since their last build')
+
+    # Adding arguments for watch mode (optional)
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and rebuild the output whenever a source file changes')
+    parser.add_argument('--watchInterval', type=float, default=0.2, help='Watch mode polling interval in seconds')
+
+    # Adding arguments for daemon mode (optional)
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running and answer JSON-lines flatten requests (stdin, or --socket)')
+    parser.add_argument('--socket', help='With --daemon, listen on this Unix socket instead of stdin')
 
     # Parsing the arguments
     args = parser.parse_args()
 
-    # Set the global ignore imports list
-    ignore_imports = args.ignoreImport
-
-    # Preload paths
-    preload_paths = [SRC_DIR / preload for preload in args.preload]
+    PROJECT_ROOT = SRC_DIR = Path(args.projectRoot).resolve()
+    MAIN_ENTRY_POINTS = [SRC_DIR / "main.py"]
+    # In daemon mode stdout only carries JSON-lines responses
+    print(f"Project source: {PROJECT_ROOT}", file=sys.stderr if args.daemon else sys.stdout)
+    entry_files = args.entryFile or [SRC_DIR / "main.py"]
+    output_paths = args.outputPath or [SRC_DIR / "workato_prod_main.py"]
 
-    # Entry file and output path
-    entry_file = Path(args.entryFile).resolve()  # Resolve to an absolute path
-    output_path = Path(args.outputPath).resolve()  # Resolve to an absolute path
+    try:
+        generation_defines = parse_defines(args.define)
+    except ValueError as error:
+        print(f"🚨 Error: {error}")
+        return
 
-    # Ensure entry_file exists
-    if not entry_file.exists():
-        print(f"🚨 Error: The entry file '{entry_file}' does not exist.")
+    # Set the global ignore imports list and output options
+    set_generator_options({
+        "ignore_imports": args.ignoreImport,
+        "import_cleanup": args.importCleanup,
+        "tree_shake": not args.noTreeShake,
+        "parse_workers": max(1, args.parseWorkers),
+        "emit_mode": args.emit,
+        "lazy_imports": args.lazyImports,
+        "eager_modules": args.eagerImports,
+        "minify": args.minify or args.minifyNames,
+        "minify_names": args.minifyNames,
+        "streaming": args.streaming,
+        "analyze": args.analyze,
+        "analyze_sort": args.analyzeSort,
+        "defines": generation_defines,
+        "instrument": args.instrument,
+        "pack": args.pack,
+        "pack_threshold": args.packThreshold * 1024,
+        "defer": args.defer or args.deferThreshold > 0,
+        "defer_threshold": args.deferThreshold,
+        "hoist": args.hoistConstants,
+    })
+
+    # The parse cache, so unchanged files are not parsed again
+    cache_dir = None if args.noCache else Path(args.cacheDir) if args.cacheDir else SRC_DIR / CACHE_DIR_NAME
+
+    if args.daemon:
+        if args.socket and not hasattr(socketserver, "UnixStreamServer"):
+            print("🚨 Error: Unix sockets are not available on this platform, use stdin instead.")
+            return
+        daemon = FlattenDaemon(Flattener(SRC_DIR, get_generator_options(), cache_dir=cache_dir))
+        if args.socket:
+            daemon.serve_socket(Path(args.socket))
+        else:
+            daemon.serve_stdin()
         return
 
-    # Ensure the directory for output_path exists
-    if not output_path.parent.exists():
-        print(f"🚨 Error: The directory for output path '{output_path.parent}' does not exist.")
+    # Preload paths
+    preload_paths = [SRC_DIR / preload for preload in args.preload]
+
+    # Entry files and output paths
+    if args.manifest:
+        actions = load_manifest(Path(args.manifest))
+    else:
+        if len(entry_files) != len(output_paths):
+            print("🚨 Error: --entryFile and --outputPath must be given the same number of paths.")
+            return
+        actions = [
+            {"entry_file": Path(entry).resolve(), "output_path": Path(output).resolve(), "preload_paths": None}
+            for entry, output in zip(entry_files, output_paths)
+        ]
+    for action in actions:
+        if action["preload_paths"] is None:
+            action["preload_paths"] = preload_paths
+
+        # Ensure entry_file exists
+        if not action["entry_file"].exists():
+            print(f"🚨 Error: The entry file '{action['entry_file']}' does not exist.")
+            return
+
+        # Ensure the directory for output_path exists
+        if not action["output_path"].parent.exists():
+            print(f"🚨 Error: The directory for output path '{action['output_path'].parent}' does not exist.")
+            return
+
+    # Keep the actions affected by the change (the closures come from the build manifests)
+    if args.changed is not None or args.since:
+        changed_files, modules_changed = {Path(path) for path in args.changed or []}, False
+        if args.since:
+            try:
+                since_files, modules_changed = changed_files_since(args.since)
+            except (OSError, subprocess.CalledProcessError) as error:
+                print(f"🚨 Error: Could not list the files changed since '{args.since}': {error}")
+                return
+            changed_files |= since_files
+        total = len(actions)
+        actions = select_affected_actions(actions, changed_files, modules_changed)
+        print(f"[🎯] {len(actions)}/{total} action(s) affected by {len(changed_files)} changed file(s)")
+        if not actions:
+            return
+
+    parse_cache = ParseCache(cache_dir) if cache_dir else None
+
+    if args.watch:
+        if len(actions) > 1:
+            print("🚨 Error: --watch handles a single entry file.")
+            return
+        watch_and_flatten(actions[0]["entry_file"], actions[0]["output_path"], actions[0]["preload_paths"],
+                          interval=args.watchInterval, hardcoded_statement=HARDCODED_STATEMENTS)
         return
 
-    # Collect dependencies and generate the flattened script
-    imports, defs, global_vars = collect_dependencies(entry_file, preload_paths=preload_paths)
-    write_flattened_script(
-        imports, defs, output_path, preload_paths=preload_paths, global_vars=global_vars,
-        hardcoded_statement=HARDCODED_STATEMENTS
-    )
+    if args.profile is not None:
+        profiler = Profiler()
+
+    if len(actions) > 1:
+        run_batch(actions, workers=args.workers, force=args.force or args.analyze)
+    else:
+        entry_file = actions[0]["entry_file"]
+        output_path = actions[0]["output_path"]
+        preload_paths = actions[0]["preload_paths"]
+
+        # Collect dependencies and generate the flattened script (skipped when nothing changed)
+        flattener = Flattener(SRC_DIR, get_generator_options(), parse_cache=parse_cache)
+        result = flattener.flatten(entry_file, output_path, preload_paths, force=args.force or args.analyze)
+        for line in result.log:
+            print(line)
+
+        # Inform the user that the script was generated
+        if result.skipped:
+            print(f"[⏭️] Up to date: {output_path}")
+        else:
+            print(f"[✅] Flattened script written to: {output_path}")
 
-    # Inform the user that the script was generated
-    print(f"[✅] Flattened script written to: {output_path}")
+    if profiler is not None:
+        output_path = actions[0]["output_path"]
+        report_path = Path(args.profile) if args.profile else output_path.with_name(output_path.name + ".profile.json")
+        report_path.write_text(json.dumps(profiler.report(), indent=2))
+        print(profiler.summary())
+        print(f"[📊] Profile report written to: {report_path}")
+        profiler.stop()
 
 
 if __name__ == '__main__':
-    generate_main_prod_script()
+    try:
+        generate_main_prod_script()
+    except FlattenError as error:
+        sys.exit(f"🚨 {error}")
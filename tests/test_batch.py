@@ -0,0 +1,43 @@
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+FLATTEN_FILE = Path(__file__).resolve().parent.parent / "src" / "flatten_file.py"
+
+# Runs the command line with the "spawn" start method (the macOS/Windows default), where
+# workers import the module afresh instead of inheriting the parent's state
+SPAWN_RUNNER = textwrap.dedent("""
+    import multiprocessing, runpy, sys
+    if __name__ == "__main__":
+        multiprocessing.set_start_method("spawn")
+        sys.argv = [sys.argv[1]] + sys.argv[2:]
+        runpy.run_path(sys.argv[0], run_name="__main__")
+""")
+
+
+def make_project(root: Path):
+    (root / "pkg" / "sub").mkdir(parents=True)
+    (root / "pkg" / "__init__.py").write_text("")
+    (root / "pkg" / "sub" / "__init__.py").write_text("")
+    (root / "pkg" / "sub" / "mod.py").write_text("def helper():\n    return 42\n")
+    for name in ("main1.py", "main2.py"):
+        (root / name).write_text("from pkg.sub.mod import helper\n\n\ndef main():\n    return helper()\n")
+    (root / "actions.json").write_text(json.dumps([{"entryFile": "main1.py", "outputPath": "o1.py"},
+                                                   {"entryFile": "main2.py", "outputPath": "o2.py"}]))
+
+
+def test_spawned_batch_workers_use_the_project_root(tmp_path):
+    make_project(tmp_path)
+    runner = tmp_path / "spawn_runner.py"
+    runner.write_text(SPAWN_RUNNER)
+    subprocess.run([sys.executable, str(runner), str(FLATTEN_FILE), "--projectRoot", str(tmp_path),
+                    "--manifest", str(tmp_path / "actions.json"), "--workers", "2", "--noCache"],
+                   check=True, capture_output=True)
+    for output in ("o1.py", "o2.py"):
+        namespace = {}
+        exec((tmp_path / output).read_text(), namespace)
+        assert namespace["main"]() == 42
+        manifest = json.loads((tmp_path / (output + ".manifest.json")).read_text())
+        assert sorted(manifest["files"]) == [output.replace("o", "main"), "pkg/sub/mod.py"]
@@ -0,0 +1,49 @@
+import json
+from pathlib import Path
+
+from flatten_file import Flattener, analyze_bundle, format_bundle_report
+
+
+def make_project(root: Path) -> Path:
+    (root / "helpers.py").write_text(
+        "import json\n\n\nLIMIT = 3\n\n\n"
+        "def dump(value):\n    return json.dumps(value)[:LIMIT]\n\n\n"
+        "def big():\n" + "".join(f"    value_{i} = {i}\n" for i in range(50))
+        + "    return [" + ", ".join(f"value_{i}" for i in range(50)) + "]\n"
+    )
+    entry = root / "main.py"
+    entry.write_text("from helpers import dump, big\n\n\ndef main(input=None):\n    return dump(big())\n")
+    return entry
+
+
+def test_bundle_report_is_written_next_to_the_output(tmp_path):
+    entry = make_project(tmp_path)
+    output_path = tmp_path / "out.py"
+    result = Flattener(tmp_path, {"analyze": True}).flatten(entry, output_path)
+    report = json.loads((tmp_path / "out.py.bundle.json").read_text())
+    assert report["script_bytes"] == len(output_path.read_bytes())
+    items = {item["name"]: item for item in report["items"]}
+    assert items["big"]["file"] == "helpers.py"
+    assert items["big"]["reason"] == "main -> big"
+    assert items["LIMIT"]["reason"] == "main -> dump -> LIMIT"
+    assert items["import json"]["reason"] == "main -> dump"
+    assert report["items"][0]["name"] == "big"  # Sorted by size
+    assert report["files"]["helpers.py"]["items"] == 3
+    assert (tmp_path / "out.py.bundle.txt").read_text().startswith("📦 Bundle: ")
+    assert any(line.startswith("[📦] Bundle report written to: ") for line in result.log)
+
+
+def test_bundle_items_can_be_sorted_and_listed_partially():
+    items = [
+        {"kind": "function", "name": "b", "file": "x.py", "bytes": 10, "compile_ms": 0.5, "reason": "main -> b"},
+        {"kind": "function", "name": "a", "file": "y.py", "bytes": 30, "compile_ms": 0.1, "reason": None},
+        {"kind": "import", "name": "import os", "file": None, "bytes": 9, "compile_ms": None, "reason": None},
+    ]
+    report = analyze_bundle(items, "import os\n", sort="compile")
+    assert [item["name"] for item in report["items"]] == ["b", "a", "import os"]
+    assert [item["name"] for item in analyze_bundle(items, "", sort="name")["items"]] == ["a", "b", "import os"]
+    assert list(report["files"]) == ["y.py", "x.py", "<generated>"]
+    assert report["total_bytes"] == 49
+    text = format_bundle_report(report, limit=2)
+    assert text.endswith("... 1 more item(s)")
+    assert "main -> b" in text
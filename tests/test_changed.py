@@ -0,0 +1,67 @@
+import subprocess
+from pathlib import Path
+
+from flatten_file import Flattener, changed_files_since, select_affected_actions
+
+
+def make_project(root: Path) -> list[dict]:
+    project = root / "project"
+    project.mkdir()
+    (project / "helpers.py").write_text("def double(value):\n    return value * 2\n")
+    (project / "other.py").write_text("def triple(value):\n    return value * 3\n")
+    (project / "main_a.py").write_text("from helpers import double\n\n\ndef main(input=None):\n    return double(1)\n")
+    (project / "main_b.py").write_text("from other import triple\n\n\ndef main(input=None):\n    return triple(1)\n")
+    (root / "build").mkdir()
+    actions = [{"entry_file": project / f"main_{name}.py", "output_path": root / "build" / f"{name}.py",
+                "preload_paths": []} for name in "ab"]
+    flattener = Flattener(project)
+    for action in actions:
+        flattener.flatten(action["entry_file"], action["output_path"])
+    return actions
+
+
+def select(root: Path, actions: list[dict], changed: list[Path], modules_changed: bool = False) -> list[str]:
+    # A fresh flattener indexes the project modules as they are now, like a new CLI run
+    with Flattener(root / "project").activate():
+        return [action["output_path"].name for action in select_affected_actions(actions, changed, modules_changed)]
+
+
+def test_only_actions_depending_on_a_changed_file_are_selected(tmp_path):
+    actions = make_project(tmp_path)
+    assert select(tmp_path, actions, [tmp_path / "project" / "helpers.py"]) == ["a.py"]
+    assert select(tmp_path, actions, [tmp_path / "project" / "README.md"]) == []
+    assert select(tmp_path, actions, [], modules_changed=True) == ["a.py", "b.py"]
+
+
+def test_actions_never_built_are_selected(tmp_path):
+    actions = make_project(tmp_path)
+    actions[1]["output_path"] = tmp_path / "build" / "c.py"
+    assert select(tmp_path, actions, [tmp_path / "project" / "helpers.py"]) == ["a.py", "c.py"]
+
+
+def test_new_module_selects_every_action(tmp_path):
+    actions = make_project(tmp_path)
+    new_module = tmp_path / "project" / "double.py"  # Could shadow what an import resolves to
+    new_module.write_text("VALUE = 1\n")
+    assert select(tmp_path, actions, [new_module]) == ["a.py", "b.py"]
+
+
+def test_changed_files_since_lists_edits_and_untracked_modules(tmp_path):
+    make_project(tmp_path)
+    project = tmp_path / "project"
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(git + ["init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run(git + ["add", "project"], cwd=tmp_path, check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "project"], cwd=tmp_path, check=True)
+
+    (project / "helpers.py").write_text("def double(value):\n    return value + value\n")
+    with Flattener(project).activate():
+        changed, modules_changed = changed_files_since("HEAD")
+    assert changed == {(project / "helpers.py").resolve()}
+    assert not modules_changed
+
+    (project / "new_module.py").write_text("VALUE = 1\n")
+    with Flattener(project).activate():
+        changed, modules_changed = changed_files_since("HEAD")
+    assert (project / "new_module.py").resolve() in changed
+    assert modules_changed
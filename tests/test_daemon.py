@@ -0,0 +1,21 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+FLATTEN_FILE = Path(__file__).resolve().parent.parent / "src" / "flatten_file.py"
+
+
+def test_stdin_daemon_only_writes_json_lines(tmp_path):
+    (tmp_path / "main.py").write_text("def main(input=None):\n    return 1\n")
+    requests = [
+        {"entryFile": str(tmp_path / "main.py"), "outputPath": str(tmp_path / "out.py")},
+        {"command": "stats"},
+        {"command": "shutdown"},
+    ]
+    completed = subprocess.run([sys.executable, str(FLATTEN_FILE), "--daemon", "--projectRoot", str(tmp_path),
+                                "--noCache"], input="".join(json.dumps(request) + "\n" for request in requests),
+                               capture_output=True, text=True, check=True)
+    responses = [json.loads(line) for line in completed.stdout.splitlines()]
+    assert [response["ok"] for response in responses] == [True, True, True]
+    assert (tmp_path / "out.py").exists()
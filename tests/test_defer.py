@@ -0,0 +1,40 @@
+import ast
+
+from flatten_file import DEFER_MARKER, DEFERRED_SOURCE, deferred_stub, is_deferrable
+
+
+def run(source: str) -> dict:
+    namespace = {}
+    exec(compile(source, "<test>", "exec"), namespace)
+    return namespace
+
+
+def test_is_deferrable_reads_marker_and_threshold(tmp_path):
+    source = f"def marked(rows=None):  {DEFER_MARKER}\n    return rows\n\n\ndef plain():\n    return 1\n"
+    file_path = tmp_path / "jobs.py"
+    file_path.write_text(source)
+    marked, plain = ast.parse(source).body
+    assert is_deferrable(marked, file_path, ast.unparse(marked))
+    assert not is_deferrable(plain, file_path, ast.unparse(plain))
+    assert is_deferrable(plain, file_path, ast.unparse(plain), threshold=10)
+    main = ast.parse("def main(limit=[]):\n    return 1").body[0]
+    assert not is_deferrable(main, file_path, ast.unparse(main), threshold=1)
+
+
+def test_deferred_stub_compiles_on_first_call():
+    text = "def backfill(rows):\n    return [row * 2 for row in rows]"
+    namespace = run(DEFERRED_SOURCE + "\n" + deferred_stub("backfill", text))
+    stub = namespace["backfill"]
+    assert stub.__name__ == "backfill" and "backfill" in namespace["_FLATTEN_DEFERRED"]
+    assert stub([1, 2]) == [2, 4]
+    assert namespace["backfill"] is not stub and not namespace["_FLATTEN_DEFERRED"]
+
+
+def test_is_deferrable_sees_edited_sources(tmp_path):
+    file_path = tmp_path / "jobs.py"
+    file_path.write_text("def job():\n    return 1\n")
+    node = ast.parse(file_path.read_text()).body[0]
+    assert not is_deferrable(node, file_path, ast.unparse(node))
+    file_path.write_text(f"{DEFER_MARKER}\ndef job():\n    return 1\n")
+    node = ast.parse(file_path.read_text()).body[0]
+    assert is_deferrable(node, file_path, ast.unparse(node))
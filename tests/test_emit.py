@@ -0,0 +1,74 @@
+import ast
+
+import pytest
+
+from flatten_file import Flattener, attach_source_spans, node_source
+
+
+def make_project(root):
+    (root / "helpers.py").write_text(
+        "import json\nimport re\n\nLIMIT = 3\n\n\n"
+        "# flatten: defer\n"
+        "def dump(value):\n"
+        "    return json.dumps(value) + str(re.findall(r'\\d', 'a1b2', re.I)) + str(len([1, 2, 3, LIMIT]))\n"
+    )
+    entry = root / "main.py"
+    entry.write_text("from helpers import dump\n\n\ndef main(input=None):\n    return dump(1)\n")
+    return entry
+
+
+@pytest.mark.parametrize("options", [{}, {"instrument": True}, {"defer": True, "hoist": True},
+                                     {"lazy_imports": True}, {"streaming": True}])
+@pytest.mark.parametrize("hardcoded_statements", ["", "X = 1\n"])
+def test_top_level_blocks_are_separated_by_two_blank_lines(tmp_path, options, hardcoded_statements):
+    entry = make_project(tmp_path)
+    script = Flattener(tmp_path, options, hardcoded_statements=hardcoded_statements).flatten(entry).script
+    assert "\n\n\n\n" not in script
+    assert '"""\n\n\nimport json\nimport re\n\n\n' in script
+    namespace = {}
+    exec(script, namespace)
+    assert namespace["main"]().startswith("1['1', '2']")
+
+
+def test_source_spans_keep_decorators_and_comments_and_cut_docstrings():
+    source = (
+        "import functools\n\n\n"
+        "@functools.lru_cache(maxsize=None)  # memoized\n"
+        "def square(value):\n"
+        "    \"\"\"Square a value.\"\"\"\n"
+        "    # the comment stays\n"
+        "    return value * value\n\n\n"
+        "class Empty:\n"
+        "    \"\"\"Nothing else.\"\"\"\n\n\n"
+        "LIMIT = {'a': 1,  # first\n"
+        "         'b': 2}  # trailing\n"
+        "x = 1; y = 2\n"
+    )
+    tree = ast.parse(source)
+    attach_source_spans(tree, source)
+    square, empty, limit, shared = tree.body[1:5]
+    assert node_source(square) == ("@functools.lru_cache(maxsize=None)  # memoized\n"
+                                   "def square(value):\n"
+                                   "    # the comment stays\n"
+                                   "    return value * value")
+    assert node_source(empty) == "class Empty:\n    pass"
+    assert node_source(limit) == "LIMIT = {'a': 1,  # first\n         'b': 2}"
+    assert node_source(shared) == "x = 1"  # Shares its line: unparsed
+    assert node_source(square, "unparse").startswith("@functools.lru_cache(maxsize=None)\ndef square")
+
+
+def test_crlf_sources_are_emitted_with_unix_line_endings(tmp_path):
+    (tmp_path / "helpers.py").write_bytes(
+        b"# flatten: keep comments\r\n"
+        b"def double(value):\r\n"
+        b"    # doubled\r\n"
+        b"    return value * 2\r\n"
+    )
+    entry = tmp_path / "main.py"
+    entry.write_bytes(b"from helpers import double\r\n\r\n\r\ndef main(input=None):\r\n    return double(2)\r\n")
+    script = Flattener(tmp_path).flatten(entry).script
+    assert "\r" not in script
+    assert "def double(value):\n    # doubled\n    return value * 2\n" in script
+    namespace = {}
+    exec(script, namespace)
+    assert namespace["main"]() == 4
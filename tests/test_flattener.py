@@ -0,0 +1,89 @@
+import contextlib
+import io
+import os
+from pathlib import Path
+
+import flatten_file
+import pytest
+
+from flatten_file import DEFER_MARKER, FlattenError, Flattener, ParseCache, get_generator_options
+
+
+def make_project(root: Path) -> Path:
+    (root / "helpers.py").write_text("def double(value):\n    return value * 2\n")
+    entry = root / "main.py"
+    entry.write_text("from helpers import double\n\n\ndef main(input=None):\n    return double(21)\n")
+    return entry
+
+
+def run_main(script: str):
+    namespace = {}
+    exec(script, namespace)
+    return namespace["main"]()
+
+
+@pytest.mark.parametrize("options", [{}, {"streaming": True}])
+def test_flatten_returns_a_runnable_script(tmp_path, options):
+    entry = make_project(tmp_path)
+    result = Flattener(tmp_path, options).flatten(entry)
+    assert run_main(result.script) == 42
+    assert sorted(path.name for path in result.files) == ["helpers.py", "main.py"]
+
+
+def test_warm_flattener_picks_up_changes(tmp_path):
+    entry = make_project(tmp_path)
+    flattener = Flattener(tmp_path)
+    assert run_main(flattener.flatten(entry).script) == 42
+    helpers = tmp_path / "helpers.py"
+    helpers.write_text("def double(value):\n    return value * 20\n")
+    modified = helpers.stat().st_mtime_ns + 1_000_000_000  # Changes are detected by modification time
+    os.utime(helpers, ns=(modified, modified))
+    assert run_main(flattener.flatten(entry).script) == 420
+
+
+@pytest.mark.parametrize("options", [{}, {"streaming": True}, {"parse_workers": 2}])
+def test_parse_errors_raise_instead_of_exiting(tmp_path, options):
+    entry = make_project(tmp_path)
+    (tmp_path / "helpers.py").write_text("def double(:\n")
+    with pytest.raises(FlattenError, match="helpers.py"):
+        Flattener(tmp_path, options).flatten(entry)
+
+
+def test_deferred_functions_are_instrumented(tmp_path):
+    entry = make_project(tmp_path)
+    (tmp_path / "helpers.py").write_text(f"{DEFER_MARKER}\ndef double(value):\n    return value * 2\n")
+    script = Flattener(tmp_path, {"defer": True, "instrument": True}).flatten(entry).script
+    assert "double = _flatten_deferred('double', '@_flatten_timed\\ndef double" in script
+    namespace = {}
+    exec(script, namespace)
+    with contextlib.redirect_stdout(io.StringIO()) as report:
+        assert namespace["main"]() == 42
+    assert "double" in report.getvalue()
+
+
+def test_flattener_uses_a_given_parse_cache(tmp_path):
+    entry = make_project(tmp_path)
+    cache = ParseCache(tmp_path / ".cache")
+    flattener = Flattener(tmp_path, parse_cache=cache)
+    assert flattener.parse_cache is cache
+    flattener.flatten(entry)
+    assert cache.misses == 2
+
+
+def test_messages_go_to_the_result_log_not_stdout(tmp_path, capsys):
+    entry = make_project(tmp_path)
+    (tmp_path / "other.py").write_text("def double(value):\n    return value + value\n")
+    entry.write_text("from helpers import double\nfrom other import double\n\n\ndef main(input=None):\n    return double(21)\n")
+    result = Flattener(tmp_path, {"minify": True}).flatten(entry)
+    assert any("Name collision" in line for line in result.log)
+    assert any("Minified" in line for line in result.log)
+    assert capsys.readouterr().out == ""
+
+
+def test_unknown_options_are_rejected_and_the_module_state_restored(tmp_path):
+    entry = make_project(tmp_path)
+    options = get_generator_options()
+    with pytest.raises(ValueError, match="tree_shaking"):
+        Flattener(tmp_path, {"tree_shaking": False}).flatten(entry)
+    assert get_generator_options() == options
+    assert flatten_file.PROJECT_ROOT != tmp_path.resolve()
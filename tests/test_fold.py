@@ -0,0 +1,32 @@
+import ast
+import textwrap
+
+from flatten_file import fold_definitions, parse_defines
+
+
+def parse(source: str) -> ast.Module:
+    return ast.parse(textwrap.dedent(source))
+
+
+def test_fold_definitions_substitutes_and_drops_branches():
+    module = parse("""
+        DEBUG = True
+
+        def report(value):
+            if DEBUG:
+                return "debug " + str(value * (2 + 3))
+            return str(value)
+
+        def shadowed(DEBUG):
+            return DEBUG
+    """)
+    global_vars = [module.body[0]]
+    defs = {node.name: (node, "app.py") for node in module.body[1:]}
+    defs, global_vars = fold_definitions(defs, global_vars, parse_defines(["DEBUG=False"]))
+    assert ast.unparse(global_vars[0]) == "DEBUG = False"
+    assert ast.unparse(defs["report"][0]) == "def report(value):\n    return str(value)"
+    assert ast.unparse(defs["shadowed"][0]) == "def shadowed(DEBUG):\n    return DEBUG"
+
+
+def test_parse_defines_takes_non_literals_as_strings():
+    assert parse_defines(["DEBUG=False", "ENV=prod", "LIMIT=10"]) == {"DEBUG": "False", "ENV": "'prod'", "LIMIT": "10"}
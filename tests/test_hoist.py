@@ -0,0 +1,43 @@
+import ast
+import re
+import textwrap
+
+from flatten_file import ConstantHoister
+
+
+def parse(source: str) -> ast.Module:
+    return ast.parse(textwrap.dedent(source))
+
+
+def run(source: str) -> dict:
+    namespace = {}
+    exec(compile(source, "<test>", "exec"), namespace)
+    return namespace
+
+
+def test_constant_hoister_shares_regexes_and_read_only_literals():
+    module = parse("""
+        import re
+
+        def first(text):
+            return re.search(r"\\d+", text, re.I)
+
+        def second(text):
+            allowed = {"a", "b", "c"}
+            return re.compile(r"\\d+", re.I).search(text) and text in allowed
+
+        def mutated():
+            items = [1, 2, 3]
+            items.append(4)
+            return items
+    """)
+    hoister = ConstantHoister([module.body[0]])
+    hoisted = [hoister.hoist(node) for node in module.body[1:]]
+    assert hoisted[2] is module.body[3]
+    statements = [ast.unparse(statement) for statement in hoister.statements()]
+    assert statements == ["_FLATTEN_RE_0 = re.compile('\\\\d+', re.I)", "_FLATTEN_CONST_0 = {'a', 'b', 'c'}"]
+
+    namespace = run("\n".join(["import re", *statements, *map(ast.unparse, hoisted)]))
+    assert namespace["first"]("ab 12").group() == "12"
+    assert namespace["second"]("b") is None
+    assert namespace["_FLATTEN_RE_0"].flags & re.I
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from flatten_file import Flattener
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    packages = tmp_path / "site-packages"
+    packages.mkdir()
+    (packages / "fakehttp.py").write_text("class Session:\n    pass\n\n\ndef get(url):\n    return 'got ' + url\n")
+    monkeypatch.syspath_prepend(str(packages))
+    monkeypatch.delitem(sys.modules, "fakehttp", raising=False)
+    root = tmp_path / "project"
+    root.mkdir()
+    return root
+
+
+def flatten(root: Path, main_source: str) -> str:
+    (root / "main.py").write_text(main_source)
+    return Flattener(root, {"lazy_imports": True}).flatten(root / "main.py").script
+
+
+def test_names_used_only_in_bodies_are_imported_on_first_use(project):
+    script = flatten(project, "from fakehttp import Session, get\n\n\n"
+                              "def main(input=None):\n    Session()\n    return get('x')\n")
+    assert "from fakehttp import Session, get\n" in script.split("def main")[1]
+    namespace = {}
+    exec(script, namespace)
+    assert "fakehttp" not in sys.modules
+    assert namespace["main"]() == "got x"
+
+
+def test_module_stays_eager_when_one_of_its_names_is_used_at_load_time(project):
+    script = flatten(project, "from fakehttp import Session, get\n\n\n"
+                              "class Client(Session):\n    pass\n\n\n"
+                              "def main(input=None):\n    Client()\n    return get('x')\n")
+    header, body = script.split("class Client")
+    assert "from fakehttp import Session, get" in header
+    assert "import" not in body
+
+
+def test_plain_imports_become_proxies(project):
+    script = flatten(project, "import fakehttp\n\n\ndef main(input=None):\n    return fakehttp.get('x')\n")
+    namespace = {}
+    exec(script, namespace)
+    assert "fakehttp" not in sys.modules
+    assert namespace["main"]() == "got x"
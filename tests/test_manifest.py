@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+
+from flatten_file import Flattener, is_up_to_date
+
+
+def make_project(root: Path) -> tuple[Path, Path]:
+    project = root / "project"
+    project.mkdir()
+    (project / "helpers.py").write_text("def double(value):\n    return value * 2\n")
+    (project / "unused.py").write_text("def unused():\n    return 0\n")
+    entry = project / "main.py"
+    entry.write_text("from helpers import double\n\n\ndef main(input=None):\n    return double(1)\n")
+    return entry, root / "out.py"
+
+
+def flatten(entry: Path, output_path: Path, **kwargs) -> bool:
+    # A fresh flattener per build, like separate CLI runs
+    return Flattener(entry.parent).flatten(entry, output_path, **kwargs).skipped
+
+
+def test_manifest_records_the_dependency_files(tmp_path):
+    entry, output_path = make_project(tmp_path)
+    flatten(entry, output_path)
+    manifest = json.loads((tmp_path / "out.py.manifest.json").read_text())
+    assert sorted(manifest["files"]) == ["helpers.py", "main.py"]
+    assert manifest["fingerprint"]["entry_file"] == "main.py"
+    with Flattener(entry.parent).activate():
+        assert is_up_to_date(entry, output_path, [])
+        assert not is_up_to_date(entry, output_path, [entry.parent / "helpers.py"])  # Other preload
+
+
+def test_unchanged_builds_are_skipped(tmp_path):
+    entry, output_path = make_project(tmp_path)
+    assert not flatten(entry, output_path)
+    assert flatten(entry, output_path)
+    (entry.parent / "unused.py").write_text("def unused():\n    return 1\n")  # Not a dependency
+    assert flatten(entry, output_path)
+    assert not flatten(entry, output_path, force=True)
+
+
+def test_changes_to_dependencies_options_or_output_force_a_rebuild(tmp_path):
+    entry, output_path = make_project(tmp_path)
+    flatten(entry, output_path)
+
+    (entry.parent / "helpers.py").write_text("def double(value):\n    return value + value\n")
+    assert not flatten(entry, output_path)
+    assert "value + value" in output_path.read_text()
+
+    assert not flatten(entry, output_path, options={"minify": True})
+    assert flatten(entry, output_path, options={"minify": True})
+    assert not flatten(entry, output_path)
+
+    output_path.write_text(output_path.read_text() + "# edited by hand\n")
+    assert not flatten(entry, output_path)
+    assert "# edited by hand" not in output_path.read_text()
+
+    (entry.parent / "helpers2.py").write_text("")  # A new module may change how imports resolve
+    assert not flatten(entry, output_path)
+
+    (tmp_path / "out.py.manifest.json").write_text("{not json")
+    assert not flatten(entry, output_path)
@@ -0,0 +1,87 @@
+import ast
+import textwrap
+
+from flatten_file import minify_source, scope_bindings
+
+
+def run(source: str) -> dict:
+    namespace = {}
+    exec(compile(source, "<test>", "exec"), namespace)
+    return namespace
+
+
+def test_name_bound_only_in_nested_function_is_not_renamed_in_outer():
+    source = textwrap.dedent("""
+        config = 5
+
+        def outer():
+            seen = config
+            def inner():
+                config = 2
+                return config
+            return seen, inner()
+    """)
+    minified = minify_source(source, shorten_names=True)
+    assert run(minified)["outer"]() == (5, 2)
+
+
+def test_comprehension_variable_does_not_shadow_outer_global():
+    source = textwrap.dedent("""
+        item = "global"
+
+        def outer():
+            first = item
+            values = [item for item in range(3)]
+            return first, values
+    """)
+    minified = minify_source(source, shorten_names=True)
+    assert run(minified)["outer"]() == ("global", [0, 1, 2])
+
+
+def test_names_declared_global_or_nonlocal_are_kept():
+    source = textwrap.dedent("""
+        counter = 0
+
+        def outer():
+            total = 1
+            def bump():
+                nonlocal total
+                total += 1
+            def touch():
+                global counter
+                counter = 10
+            bump()
+            touch()
+            return total
+    """)
+    minified = minify_source(source, shorten_names=True)
+    namespace = run(minified)
+    assert namespace["outer"]() == 2
+    assert namespace["counter"] == 10
+
+
+def test_locals_are_shortened_and_closures_follow():
+    source = textwrap.dedent("""
+        def outer(value):
+            accumulated_value = value * 2
+            def inner():
+                return accumulated_value + 1
+            return inner()
+    """)
+    minified = minify_source(source, shorten_names=True)
+    assert "accumulated_value" not in minified
+    assert run(minified)["outer"](3) == 7
+
+
+def test_scope_bindings_stops_at_nested_scopes():
+    function = ast.parse(textwrap.dedent("""
+        def f():
+            x = 1
+            def g():
+                y = 2
+            squares = [z * z for z in range(3) if (w := z)]
+            lambda q: (r := q)
+    """)).body[0]
+    bound, declared = scope_bindings(function)
+    assert bound == {"x", "g", "squares", "w"}
+    assert declared == set()
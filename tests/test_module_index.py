@@ -0,0 +1,61 @@
+import ast
+from pathlib import Path
+
+from flatten_file import Flattener, ModuleIndex, resolve_import_paths
+
+
+def make_project(root: Path) -> Path:
+    project = root / "project"
+    (project / "pkg" / "sub").mkdir(parents=True)
+    (project / "nspkg").mkdir()
+    (project / "pkg" / "__init__.py").write_text("")
+    (project / "pkg" / "tools.py").write_text("def helper():\n    return 1\n")
+    (project / "pkg" / "sub" / "__init__.py").write_text("")
+    (project / "pkg" / "sub" / "leaf.py").write_text("from ..tools import helper\nfrom . import sibling\n")
+    (project / "pkg" / "sub" / "sibling.py").write_text("")
+    (project / "nspkg" / "loose.py").write_text("")
+    (project / "utils.py").write_text("")
+    return project
+
+
+def test_packages_modules_and_namespace_packages_are_indexed(tmp_path):
+    project = make_project(tmp_path)
+    index = ModuleIndex(project)
+    assert index.module_path("pkg") == project / "pkg" / "__init__.py"
+    assert index.module_path("pkg.sub.leaf") == project / "pkg" / "sub" / "leaf.py"
+    assert index.module_path("nspkg.loose") == project / "nspkg" / "loose.py"
+    assert index.module_path("nspkg") is None  # Namespace package: no file, but part of the project
+    assert index.module_path("missing") is None
+    assert index.module_name(project / "pkg" / "sub" / "__init__.py") == "pkg.sub"
+    assert index.module_name(tmp_path / "elsewhere.py") is None
+
+
+def test_modules_are_classified(tmp_path):
+    index = ModuleIndex(make_project(tmp_path))
+    assert index.classify("utils") == "project"
+    assert index.classify("nspkg") == "project"
+    assert index.classify("pkg.not_a_file") == "project"
+    assert index.classify("json") == "stdlib"
+    assert index.classify("sys") == "stdlib"
+    assert index.classify("pandas") == "third-party"
+
+
+def test_relative_imports_are_resolved(tmp_path):
+    project = make_project(tmp_path)
+    index = ModuleIndex(project)
+    leaf = project / "pkg" / "sub" / "leaf.py"
+    assert index.resolve_relative(leaf, "tools", 2) == "pkg.tools"
+    assert index.resolve_relative(leaf, None, 1) == "pkg.sub"
+    assert index.resolve_relative(project / "pkg" / "__init__.py", "tools", 1) == "pkg.tools"
+    assert index.resolve_relative(leaf, "x", 5) is None
+
+
+def test_imports_resolve_to_project_files(tmp_path):
+    project = make_project(tmp_path)
+    leaf = project / "pkg" / "sub" / "leaf.py"
+    source = "import json\nimport utils\nfrom pkg import tools\nimport pandas\n"
+    with Flattener(project).activate():
+        assert resolve_import_paths(ast.parse(source).body) == [project / "utils.py", project / "pkg" / "__init__.py",
+                                                               project / "pkg" / "tools.py"]
+        assert resolve_import_paths(ast.parse(leaf.read_text()).body, leaf) == [
+            project / "pkg" / "tools.py", project / "pkg" / "sub" / "__init__.py", project / "pkg" / "sub" / "sibling.py"]
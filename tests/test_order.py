@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from flatten_file import Flattener
+
+
+def flatten(root: Path, files: dict, preload_paths=()) -> str:
+    for name, source in files.items():
+        (root / name).write_text(source)
+    result = Flattener(root).flatten(root / "main.py", preload_paths=[root / path for path in preload_paths])
+    return result.script
+
+
+def run(script: str):
+    namespace = {}
+    exec(script, namespace)
+    return namespace["main"]()
+
+
+def test_globals_calling_functions_come_after_what_they_use(tmp_path):
+    script = flatten(tmp_path, {
+        "registry.py": "from handlers import HANDLERS, make\n\n\nREGISTRY = build()\n\n\n"
+                       "def build():\n    return {name: make(name) for name in HANDLERS}\n",
+        "handlers.py": "def make(name):\n    return PREFIX + name\n\n\nPREFIX = '>'\nHANDLERS = ['a', 'b']\n",
+        "main.py": "from registry import REGISTRY\n\n\ndef main(input=None):\n    return REGISTRY\n",
+    })
+    # Everything build() reaches at load time is defined before the call, wherever its file comes
+    for needed in ("def build", "def make", "PREFIX = ", "HANDLERS = "):
+        assert script.index(needed) < script.index("REGISTRY = build()")
+    assert run(script) == {"a": ">a", "b": ">b"}
+
+
+def test_base_classes_come_before_their_subclasses(tmp_path):
+    script = flatten(tmp_path, {
+        "models.py": "from base import Base\n\n\nclass Child(Base):\n    kind = Base.kind + '!'\n",
+        "base.py": "from mixins import Mixin\n\n\nclass Base(Mixin):\n    kind = 'base'\n",
+        "mixins.py": "class Mixin:\n    def describe(self):\n        return self.kind\n",
+        "main.py": "from models import Child\n\n\ndef main(input=None):\n    return Child().describe()\n",
+    })
+    assert script.index("class Mixin") < script.index("class Base") < script.index("class Child")
+    assert run(script) == "base!"
+
+
+def test_preloaded_definitions_come_first_when_dependencies_allow_it(tmp_path):
+    files = {
+        "late.py": "def late():\n    return 'late'\n",
+        "early.py": "from late import late\n\n\ndef early():\n    return 'early'\n\n\nEARLY = late()\n",
+        "main.py": "from early import early, EARLY\nfrom late import late\n\n\n"
+                   "def main(input=None):\n    return early() + late() + EARLY\n",
+    }
+    script = flatten(tmp_path, files)
+    assert script.index("def late") < script.index("EARLY = late()") < script.index("def main") < script.index("def early")
+    script = flatten(tmp_path, files, preload_paths=["early.py"])
+    assert script.index("def late") < script.index("EARLY = late()") < script.index("def early") < script.index("def main")
+    assert run(script) == "earlylatelate"
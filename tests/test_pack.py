@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from flatten_file import ON_TOP_FILE_COMMENT, Flattener, pack_output, pack_script
+
+
+def make_project(root: Path) -> Path:
+    (root / "helpers.py").write_text(
+        "import json\n\n\nclass Codec:\n    name = 'json'\n\n    def encode(self, value):\n"
+        "        return json.dumps(value)\n\n\ndef encode(value):\n    return Codec().encode(value)\n"
+    )
+    entry = root / "main.py"
+    entry.write_text("from helpers import encode\n\n\ndef main(input=None):\n    return encode({'a': [1, 2]})\n")
+    return entry
+
+
+def run(script: str):
+    namespace = {}
+    exec(script, namespace)
+    return namespace["main"]()
+
+
+@pytest.mark.parametrize("mode", ["zlib", "marshal"])
+def test_packed_output_runs_like_the_plain_one(tmp_path, mode):
+    entry = make_project(tmp_path)
+    plain = Flattener(tmp_path).flatten(entry).script
+    result = Flattener(tmp_path, {"pack": mode}).flatten(entry, tmp_path / "out.py")
+    packed = (tmp_path / "out.py").read_text()
+    assert packed == result.script
+    assert packed.startswith(ON_TOP_FILE_COMMENT.strip() + "\n")
+    assert "def encode" not in packed
+    assert run(packed) == run(plain) == '{"a": [1, 2]}'
+    assert any(line.startswith(f"[📦] Packed ({mode}): ") for line in result.log)
+
+
+def test_marshalled_output_refuses_other_python_versions():
+    packed = pack_script(ON_TOP_FILE_COMMENT.strip() + "\ndef main(input=None):\n    return 1\n", "marshal")
+    assert run(packed) == 1
+    other = packed.replace(str(tuple(sys.version_info[:2])), "(2, 7)")
+    with pytest.raises(RuntimeError, match="built for Python"):
+        run(other)
+
+
+def test_auto_packs_only_large_outputs_that_shrink():
+    script = ON_TOP_FILE_COMMENT.strip() + "\n" + "".join(f"VALUE_{i} = {i}\n" for i in range(2000))
+    assert pack_output(script, "auto", len(script.encode())) == script
+    packed = pack_output(script, "auto", 1024)
+    assert len(packed) < len(script)
+    namespace = {}
+    exec(packed, namespace)
+    assert namespace["VALUE_1999"] == 1999
+    assert pack_output(script, "none", 0) == script
@@ -0,0 +1,65 @@
+import os
+from pathlib import Path
+
+from flatten_file import ParseCache, analyze_file
+
+
+def touch(path: Path, text: str):
+    path.write_text(text)
+    modified = path.stat().st_mtime_ns + 1_000_000_000  # Unchanged files are recognized by mtime and size
+    os.utime(path, ns=(modified, modified))
+
+
+def def_names(summary: dict) -> list[str]:
+    return [node.name for node in summary["defs"]]
+
+
+def test_unchanged_files_are_served_from_the_cache(tmp_path):
+    source = tmp_path / "helpers.py"
+    source.write_text("import json\n\n\ndef double(value):\n    return value * 2\n")
+    cache = ParseCache(tmp_path / "cache")
+    summary = analyze_file(source, cache)
+    cache.flush()
+
+    reopened = ParseCache(tmp_path / "cache")
+    cached = analyze_file(source, reopened)
+    assert (reopened.hits, reopened.misses) == (1, 0)
+    assert def_names(cached) == def_names(summary) == ["double"]
+
+
+def test_edited_files_are_analyzed_again(tmp_path):
+    source = tmp_path / "helpers.py"
+    source.write_text("def double(value):\n    return value * 2\n")
+    cache = ParseCache(tmp_path / "cache")
+    analyze_file(source, cache)
+    touch(source, "def triple(value):\n    return value * 3\n")
+    assert def_names(analyze_file(source, cache)) == ["triple"]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    touch(source, "def double(value):\n    return value * 2\n")  # Content seen before: a hit
+    assert def_names(analyze_file(source, cache)) == ["double"]
+    assert cache.hits == 1
+
+
+def test_cache_is_dropped_when_its_version_changes(tmp_path):
+    source = tmp_path / "helpers.py"
+    source.write_text("def double(value):\n    return value * 2\n")
+    cache = ParseCache(tmp_path / "cache")
+    analyze_file(source, cache)
+    cache.flush()
+    meta = tmp_path / "cache" / "meta.json"
+    meta.write_text(meta.read_text().replace(cache.version, "0-py0.0"))
+
+    reopened = ParseCache(tmp_path / "cache")
+    analyze_file(source, reopened)
+    assert (reopened.hits, reopened.misses) == (0, 1)
+
+
+def test_eviction_keeps_the_most_recently_used_entries(tmp_path):
+    cache = ParseCache(tmp_path / "cache", max_entries=2)
+    for index in range(4):
+        source = tmp_path / f"module_{index}.py"
+        source.write_text(f"VALUE = {index}\n")
+        analyze_file(source, cache)
+    cache.flush()
+    assert len(list((tmp_path / "cache" / "entries").iterdir())) == 2
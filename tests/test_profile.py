@@ -0,0 +1,56 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import flatten_file
+from flatten_file import Flattener, Profiler
+
+FLATTEN_FILE = Path(__file__).resolve().parent.parent / "src" / "flatten_file.py"
+
+
+def make_project(root: Path) -> Path:
+    (root / "helpers.py").write_text("def double(value):\n    return value * 2\n")
+    entry = root / "main.py"
+    entry.write_text("from helpers import double\n\n\ndef main(input=None):\n    return double(1)\n")
+    return entry
+
+
+def test_phases_and_counters_are_recorded(tmp_path, monkeypatch):
+    entry = make_project(tmp_path)
+    profiler = Profiler()
+    monkeypatch.setattr(flatten_file, "profiler", profiler)
+    try:
+        Flattener(tmp_path).flatten(entry)
+        with profiler.phase("outer"):
+            with profiler.phase("inner", tmp_path / "a.py"):
+                data = [0] * 100_000
+        report = profiler.report()
+    finally:
+        profiler.stop()
+    assert {"collect_dependencies", "process_file", "write_flattened_script"} <= set(report["phases"])
+    assert report["counters"]["files"] == 2
+    assert report["counters"]["emitted_defs"] == 2
+    assert report["counters"]["output_bytes"] > 0
+    assert report["phases"]["outer"]["peak_bytes"] >= report["phases"]["inner"]["peak_bytes"] >= len(data) * 8
+    assert str(tmp_path / "a.py") in report["files"]
+    json.dumps(report)
+    assert profiler.summary().startswith("⏱️ Generated in ")
+
+
+def test_profile_phase_is_a_no_op_without_profiler():
+    assert flatten_file.profiler is None
+    with flatten_file.profile_phase("anything"):
+        flatten_file.profile_count("anything")
+
+
+def test_cli_writes_the_report_next_to_the_output(tmp_path):
+    make_project(tmp_path)
+    output_path = tmp_path / "out.py"
+    result = subprocess.run([sys.executable, str(FLATTEN_FILE), "--projectRoot", str(tmp_path),
+                             "--outputPath", str(output_path), "--profile", "--noCache"],
+                            check=True, capture_output=True, text=True)
+    report = json.loads((tmp_path / "out.py.profile.json").read_text())
+    assert report["counters"]["files"] == 2
+    assert "collect_dependencies" in report["phases"]
+    assert "⏱️ Generated in " in result.stdout
@@ -0,0 +1,60 @@
+import ast
+import textwrap
+
+from flatten_file import prune_dead_assignments
+
+
+def parse(source: str) -> ast.Module:
+    return ast.parse(textwrap.dedent(source))
+
+
+def test_prune_dead_assignments_keeps_side_effects_and_the_original():
+    node = parse("""
+        def f(value):
+            unused = 1
+            ignored = print(value)
+            return value + 1
+    """).body[0]
+    pruned = prune_dead_assignments(node)
+    assert ast.unparse(pruned) == "def f(value):\n    print(value)\n    return value + 1"
+    assert "unused" in ast.unparse(node)
+    assert prune_dead_assignments(node) is pruned
+
+
+def test_prune_dead_assignments_leaves_dynamic_scopes_alone():
+    node = parse("""
+        def f():
+            unused = 1
+            return locals()
+    """).body[0]
+    assert prune_dead_assignments(node) is node
+
+
+def run_function(node, *args):
+    namespace = {}
+    exec(compile(ast.Module(body=[node], type_ignores=[]), "<test>", "exec"), namespace)
+    return namespace[node.name](*args)
+
+
+def test_prune_dead_assignments_keeps_augmented_assignment_targets():
+    node = parse("""
+        def count(items):
+            total = 0
+            for _ in items:
+                total += 1
+    """).body[0]
+    assert prune_dead_assignments(node) is node
+
+
+def test_prune_dead_assignments_keeps_loop_carried_variables():
+    node = parse("""
+        def last_pair(items):
+            previous = None
+            pairs = 0
+            for item in items:
+                if previous is not None:
+                    pairs += 1
+                previous = item
+            return pairs
+    """).body[0]
+    assert run_function(prune_dead_assignments(node), [1, 2, 3]) == 2
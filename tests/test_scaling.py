@@ -0,0 +1,33 @@
+import flatten_file
+import pytest
+
+from benchmarks.run_benchmarks import PHASES, benchmark
+from benchmarks.scaling import check_scaling
+
+
+def result(modules: int, seconds: float, peak_bytes: int = None) -> dict:
+    return {"modules": modules, "seconds": {phase: seconds for phase in PHASES},
+            "total_seconds": seconds * len(PHASES), "peak_bytes": peak_bytes}
+
+
+def test_check_scaling_accepts_linear_growth_and_timer_noise():
+    assert check_scaling([result(100, 0.1, 10_000_000), result(1000, 1.0, 100_000_000)]) == []
+    assert check_scaling([result(10, 0.0001), result(20, 0.005)]) == []
+
+
+def test_check_scaling_reports_super_linear_growth():
+    failures = check_scaling([result(100, 0.1), result(1000, 10.0)])
+    assert len(failures) == len(PHASES) + 1
+    assert failures[-1] == "total grew x100.0 from 100 to 1000 modules (limit x20.0)"
+
+
+@pytest.fixture
+def restore_generator_globals(monkeypatch):
+    # benchmark points the generator globals at its synthetic project
+    for name in ("PROJECT_ROOT", "SRC_DIR", "MAIN_ENTRY_POINTS", "module_index", "parse_cache", "shared_summaries"):
+        monkeypatch.setattr(flatten_file, name, getattr(flatten_file, name))
+
+
+def test_generator_scales_linearly(restore_generator_globals):
+    results = [benchmark(modules, repeat=2, memory=False) for modules in (50, 200)]
+    assert check_scaling(results) == []
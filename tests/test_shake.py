@@ -0,0 +1,61 @@
+import ast
+import textwrap
+
+from flatten_file import shake_tree
+
+
+def parse(source: str) -> ast.Module:
+    return ast.parse(textwrap.dedent(source))
+
+
+def test_shake_tree_keeps_what_main_reaches():
+    module = parse("""
+        LIMIT = 3
+        UNUSED = 4
+        SIDE_EFFECT = print
+
+        def helper():
+            return LIMIT
+
+        def dead():
+            return UNUSED
+
+        def main():
+            return helper()
+    """)
+    global_vars = module.body[:3]
+    defs = {node.name: (node, "main.py") for node in module.body[3:]}
+    defs, global_vars = shake_tree(defs, global_vars)
+    assert list(defs) == ["helper", "main"]
+    assert [node.targets[0].id for node in global_vars] == ["LIMIT"]
+
+
+def test_shake_tree_keeps_definitions_registered_by_decorators():
+    module = parse("""
+        HANDLERS = {}
+
+        def register(function):
+            HANDLERS[function.__name__] = function
+            return function
+
+        @register
+        def handle_a():
+            return "a"
+
+        class Plugin:
+            name = register(lambda: "plugin")
+
+        def unused():
+            return "unused"
+
+        def main(event="handle_a"):
+            return HANDLERS[event]()
+    """)
+    global_vars = module.body[:1]
+    defs = {node.name: (node, "main.py") for node in module.body[1:]}
+    defs, global_vars = shake_tree(defs, global_vars)
+    assert list(defs) == ["register", "handle_a", "Plugin", "main"]
+    namespace = {}
+    exec(compile(ast.Module(body=global_vars + [node for node, _ in defs.values()], type_ignores=[]), "<test>", "exec"),
+         namespace)
+    assert namespace["main"]() == "a"
@@ -0,0 +1,44 @@
+import io
+import os
+import time
+
+import pytest
+
+from flatten_file import Flattener, watch_and_flatten
+
+
+def run_main(script: str):
+    namespace = {}
+    exec(script, namespace)
+    return namespace["main"]()
+
+
+def test_watch_rebuilds_only_what_changed(tmp_path, monkeypatch):
+    (tmp_path / "helpers.py").write_text("def double(value):\n    return value * 2\n")
+    (tmp_path / "unused.py").write_text("VALUE = 1\n")
+    entry = tmp_path / "main.py"
+    entry.write_text("from helpers import double\n\n\ndef main(input=None):\n    return double(21)\n")
+    output = tmp_path / "out.py"
+    edits = [
+        (tmp_path / "helpers.py", "def double(value):\n    return value * 20\n"),
+        (tmp_path / "unused.py", "VALUE = 2\n"),  # Not a dependency: no rebuild
+    ]
+
+    def sleep(_):
+        if not edits:
+            raise KeyboardInterrupt
+        assert run_main(output.read_text()) == (42 if len(edits) == 2 else 420)
+        path, text = edits.pop(0)
+        path.write_text(text)
+        modified = time.time_ns() + 1_000_000_000
+        os.utime(path, ns=(modified, modified))
+
+    monkeypatch.setattr(time, "sleep", sleep)
+    log_output = io.StringIO()
+    with Flattener(tmp_path).activate(log_output=log_output):
+        watch_and_flatten(entry, output, [])
+
+    assert run_main(output.read_text()) == 420
+    rebuilds = [line for line in log_output.getvalue().splitlines() if "Rebuilt" in line]
+    assert len(rebuilds) == 1 and "(2 file(s) reprocessed)" in rebuilds[0]  # helpers.py and its importer
+    assert log_output.getvalue().splitlines()[-1] == "👋 Watch mode stopped"